@@ -9,6 +9,12 @@
 import os
 import sys
 import time
+import mmap
+import queue
+import struct
+import threading
+import zlib
+from hashlib import md5
 from i2cylib.crypto.iccode import Iccode
 from tqdm import tqdm
 
@@ -57,6 +63,261 @@ def trf_time(data):  # Time transformer
     return (hour, mins, sec)
 
 
+def pipeline_code(file_a, file_to, coder, encode=True, chunk_size=1048576,
+                  depth=4, progress=None):
+    """
+    streaming encode/decode pipeline, a reader thread and a writer thread
+    run concurrently with coding while a bounded pool of reusable buffers
+    is passed between them (coded in-place, no per-chunk allocation)
+
+    :param file_a: file object opened in "rb" mode
+    :param file_to: file object opened in "wb" mode
+    :param coder: Iccode, coder to use
+    :param encode: bool, encode mode
+    :param chunk_size: int, bytes per read, rounded up to coder block length
+    :param depth: int (>=2), number of buffers in flight
+    :param progress: callable(int) or None, called with bytes coded
+    :return: int, total bytes processed
+    """
+
+    block_length = coder.block_length
+    chunk_size = max(chunk_size + (-chunk_size) % block_length, block_length)
+    depth = max(depth, 2)
+
+    free = queue.Queue()
+    for i in range(depth):
+        free.put(bytearray(chunk_size))
+    read_q = queue.Queue(depth)
+    write_q = queue.Queue(depth)
+    errors = []
+
+    def reader():
+        try:
+            while not errors:
+                buf = free.get()
+                n = file_a.readinto(buf)
+                if not n:
+                    break
+                read_q.put((buf, n))
+        except Exception as err:
+            errors.append(err)
+        read_q.put(None)
+
+    def writer():
+        while True:
+            item = write_q.get()
+            if item is None:
+                break
+            buf, n = item
+            if not errors:
+                try:
+                    file_to.write(memoryview(buf)[:n])
+                except Exception as err:
+                    errors.append(err)
+            free.put(buf)
+
+    reader_thr = threading.Thread(target=reader, daemon=True)
+    writer_thr = threading.Thread(target=writer, daemon=True)
+    reader_thr.start()
+    writer_thr.start()
+
+    total = 0
+    try:
+        while True:
+            item = read_q.get()
+            if item is None:
+                break
+            buf, n = item
+            view = memoryview(buf)[:n]
+            if encode:
+                coder.encode_into(view, view)
+            else:
+                coder.decode_into(view, view)
+            write_q.put(item)
+            total += n
+            if progress is not None:
+                progress(n)
+    except Exception as err:
+        errors.append(err)
+        while item is not None:
+            item = read_q.get()
+            if item is not None:
+                free.put(item[0])
+    finally:
+        write_q.put(None)
+
+    reader_thr.join()
+    writer_thr.join()
+
+    if errors:
+        raise errors[0]
+
+    return total
+
+
+JOURNAL_MAGIC = b"ICENJ3"
+JOURNAL_HEAD = struct.Struct(">6s?B16sQQQ16s")
+JOURNAL_SECTOR = 512  # smallest unit a disk writes as a whole
+
+
+def _sector_sums(data):
+    """
+    crc32 of every JOURNAL_SECTOR bytes of data
+
+    :param data: bytes-like
+    :return: list of int
+    """
+
+    return [zlib.crc32(data[i:i + JOURNAL_SECTOR]) for i in range(0, len(data), JOURNAL_SECTOR)]
+
+
+def _write_journal(path, head, state, sums):
+    """
+    write in-place journal atomically and make sure it reaches disk
+
+    :param path: str, journal path
+    :param head: bytes, packed JOURNAL_HEAD
+    :param state: bytes, coder state before the chunk
+    :param sums: list of int, sector sums of the chunk before coding
+                 followed by the ones after coding
+    :return: None
+    """
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(head)
+        f.write(state)
+        f.write(struct.pack(">{}I".format(len(sums)), *sums))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _replay_journal(mm, coder, encode, offset, length, sums):
+    """
+    finish the chunk recorded in journal, every sector of it is either
+    still the original one (coded now) or already the coded one (decoded
+    into scratch only to move coder state forward)
+
+    :param mm: mmap.mmap, file being coded
+    :param coder: Iccode, coder in the state before the chunk
+    :param encode: bool, encode mode
+    :param offset: int, chunk offset in file
+    :param length: int, chunk length
+    :param sums: tuple of int, sector sums from journal
+    :return: None
+    """
+
+    forward, backward = (coder.encode_into, coder.decode_into) if encode else \
+        (coder.decode_into, coder.encode_into)
+    count = len(sums) // 2
+    scratch = bytearray(JOURNAL_SECTOR)
+    for i in range(count):
+        start = offset + i * JOURNAL_SECTOR
+        end = min(start + JOURNAL_SECTOR, offset + length)
+        sector = memoryview(scratch)[:end - start]
+        sector[:] = mm[start:end]
+        sector_sum = zlib.crc32(sector)
+        if sector_sum == sums[i]:
+            forward(sector, sector)
+            mm[start:end] = sector
+        elif sector_sum == sums[count + i]:
+            backward(sector, sector)
+        else:
+            raise Exception("sector at {} is partially written, can not resume".format(start))
+        sector.release()
+
+
+def inplace_code(path, coder, encode=True, chunk_size=1048576,
+                 journal=None, progress=None):
+    """
+    encode/decode a file in-place through mmap, coder state and sector
+    sums of every chunk are written to a journal before the chunk is
+    written to the file, so that an interrupted run can be resumed by
+    calling again with the same arguments (a chunk torn by the crash is
+    finished sector by sector from the state)
+
+    :param path: str, file to be coded
+    :param coder: Iccode, coder to use (in its initial state)
+    :param encode: bool, encode mode
+    :param chunk_size: int, bytes per checkpoint, rounded up to coder block length
+    :param journal: str or None, journal path (default: %path%.icen-journal)
+    :param progress: callable(int) or None, called with bytes coded
+    :return: int, total bytes processed (including resumed part)
+    """
+
+    block_length = coder.block_length
+    chunk_size = max(chunk_size + (-chunk_size) % block_length, block_length)
+    if journal is None:
+        journal = path + ".icen-journal"
+
+    file_size = os.path.getsize(path)
+    key_sum = md5(coder.base_key.tobytes() + bytes((coder.fingerprint_level,))).digest()
+    state_length = 8 + block_length
+
+    with open(path, "r+b") as f:
+        if not file_size:
+            return 0
+        mm = mmap.mmap(f.fileno(), 0)
+        try:
+            offset = 0
+            if os.path.exists(journal):
+                with open(journal, "rb") as jf:
+                    raw = jf.read()
+                if len(raw) < JOURNAL_HEAD.size + state_length:
+                    raise Exception("broken journal \"{}\"".format(journal))
+                magic, j_encode, j_level, j_key_sum, j_size, j_offset, j_length, \
+                    j_sum = JOURNAL_HEAD.unpack(raw[:JOURNAL_HEAD.size])
+                if magic != JOURNAL_MAGIC or j_encode != encode or j_key_sum != key_sum \
+                        or j_size != file_size:
+                    raise Exception("journal \"{}\" does not match this run".format(journal))
+                sums = raw[JOURNAL_HEAD.size + state_length:]
+                count = -(-j_length // JOURNAL_SECTOR)
+                if len(sums) != 8 * count or j_offset + j_length > file_size:
+                    raise Exception("broken journal \"{}\"".format(journal))
+                coder.set_state(raw[JOURNAL_HEAD.size:JOURNAL_HEAD.size + state_length])
+                _replay_journal(mm, coder, encode, j_offset, j_length,
+                                struct.unpack(">{}I".format(2 * count), sums))
+                if md5(mm[j_offset:j_offset + j_length]).digest() != j_sum:
+                    raise Exception("chunk at {} can not be recovered".format(j_offset))
+                mm.flush()
+                offset = j_offset + j_length
+                if progress is not None:
+                    progress(offset)
+
+            buf = bytearray(chunk_size)
+            view = memoryview(buf)
+            chunk = None  # nothing left when the journaled chunk was the last one
+            while offset < file_size:
+                length = min(chunk_size, file_size - offset)
+                chunk = view[:length]
+                chunk[:] = mm[offset:offset + length]
+                sums = _sector_sums(chunk)
+                state = coder.get_state()
+                if encode:
+                    coder.encode_into(chunk, chunk)
+                else:
+                    coder.decode_into(chunk, chunk)
+                sums += _sector_sums(chunk)
+                head = JOURNAL_HEAD.pack(JOURNAL_MAGIC, encode, coder.fingerprint_level, key_sum,
+                                         file_size, offset, length, md5(chunk).digest())
+                _write_journal(journal, head, state, sums)
+
+                mm[offset:offset + length] = chunk
+                mm.flush()
+                offset += length
+                if progress is not None:
+                    progress(length)
+
+            del chunk, view
+        finally:
+            mm.close()
+
+    os.remove(journal)
+
+    return file_size
+
+
 def usage():
     print("""IcCode File Encrypter (by Icy)
 
@@ -72,6 +333,12 @@ Options:
  -k --key <Key>                      - the key which is used for
                                        enctypter to encrypt
  -t --to <File_Path>                 - file to save to(default: %filename%.enc)
+ -c --chunk-size <Bytes>             - bytes per read (1048576 default)
+ -p --pipeline                       - streaming pipeline mode, overlaps
+                                       disk I/O with encoding
+ -i --in-place                       - encode/decode target file in-place
+                                       via mmap, run again to resume
+                                       an interrupted run
 
 Example:
  $ icen.py -f "test.jpg" -e -k "test" -t "res.jpg"
@@ -86,6 +353,9 @@ def main():
     KEY = None
     TO = None
     level = 3
+    chunk_size = 1048576
+    pipeline = False
+    in_place = False
     opts = get_args()
     try:
         if opts == {}:
@@ -128,6 +398,12 @@ def main():
                 TO = opts[i]
             elif i in ("-l", "--level"):
                 level = opts[i]
+            elif i in ("-c", "--chunk-size"):
+                chunk_size = opts[i]
+            elif i in ("-p", "--pipeline"):
+                pipeline = True
+            elif i in ("-i", "--in-place"):
+                in_place = True
             else:
                 print("Unhandled option: \"" + i + "\", try \"-h\" for help")
                 sys.exit(1)
@@ -137,6 +413,13 @@ def main():
                 raise Exception()
         except Exception:
             print("finger print level must be int type and bigger than 0")
+        try:
+            chunk_size = int(chunk_size)
+            if chunk_size < 1:
+                raise Exception()
+        except Exception:
+            print("chunk size must be int type and bigger than 0")
+            sys.exit(1)
 
         if KEY is None:
             KEY = input("key:")
@@ -145,7 +428,9 @@ def main():
             print("syntax error, please check your command")
             sys.exit(1)
 
-        if TO is None or not len(TO):
+        if in_place:
+            TO = FILE
+        elif TO is None or not len(TO):
             if ENCODE:
                 TO = FILE + ".enc"
             else:
@@ -161,8 +446,32 @@ def main():
             mode = "Decode"
         print("MODE       : " + mode)
         print("Level      : " + str(level))
+        print("Chunk Size : " + str(chunk_size))
+        if pipeline:
+            print("Pipeline   : on")
         print("Destination: " + TO)
         print("Key        : " + KEY)
+        if in_place:
+            print("In-place   : on")
+            coder = Iccode(KEY, fingerprint_level=level)
+            file_size = os.path.getsize(FILE)
+            pbar = tqdm(total=file_size, unit="B", leave=True, unit_scale=True)
+            st = time.time()
+            try:
+                inplace_code(FILE, coder, encode=ENCODE, chunk_size=chunk_size, progress=pbar.update)
+            except KeyboardInterrupt:
+                pbar.close()
+                print("Interrupted, run the same command again to resume")
+                sys.exit(1)
+            except Exception as err:
+                pbar.close()
+                print("Failed to process file: \"" + FILE + "\", result: " + str(err))
+                sys.exit(1)
+            pbar.close()
+            spent = time.time() - st
+            if spent > 0:
+                print("Throughput : {:.2f} MB/s".format(file_size / 1048576 / spent))
+            return
         file_a = open(FILE, "rb")
         try:
             file_to = open(TO, "wb")
@@ -176,26 +485,38 @@ def main():
         coder = Iccode(KEY, fingerprint_level=level)
         ui = ""
         pbar = tqdm(total=file_size, unit="B", leave=True, unit_scale=True)
-        while True:
-            data = file_a.read(2048)
-            #print(len(data))
-            doed = len(data)
-            if ENCODE:
-                data = coder.encode(data)
-            else:
-                data = coder.decode(data)
-            if len(data) == 0:
-                break
+        if pipeline:
             try:
-                file_to.write(data)
+                pipeline_code(file_a, file_to, coder, encode=ENCODE,
+                              chunk_size=chunk_size, progress=pbar.update)
             except Exception as err:
-                print("Failed to write data to file: \"" + TO + "\", result: " + str(err))
+                print("Failed to process file: \"" + TO + "\", result: " + str(err))
                 sys.exit(1)
+        else:
+            while True:
+                data = file_a.read(chunk_size)
+                doed = len(data)
+                if ENCODE:
+                    data = coder.encode(data)
+                else:
+                    data = coder.decode(data)
+                if len(data) == 0:
+                    break
+                try:
+                    file_to.write(data)
+                except Exception as err:
+                    print("Failed to write data to file: \"" + TO + "\", result: " + str(err))
+                    sys.exit(1)
 
-            pbar.update(doed)
+                pbar.update(doed)
+        pbar.close()
 
         file_a.close()
         file_to.close()
+
+        spent = time.time() - st
+        if spent > 0:
+            print("Throughput : {:.2f} MB/s".format(file_size / 1048576 / spent))
     except KeyboardInterrupt:
         sys.exit(1)
 
@@ -4,4 +4,5 @@
 # Filename: __init__.py
 # Created on: 2021/3/6
 
-from .iccode import *
\ No newline at end of file
+from .iccode import *
+from .seekable import *
@@ -0,0 +1,244 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Author: i2cy(i2cy@outlook.com)
+# Project: I2cylib
+# Filename: bench
+# Created on: 2026/10/17
+
+import os
+import sys
+import json
+import time
+import platform
+import tracemalloc
+import numpy as np
+from i2cylib.crypto.iccode import Iccode
+from i2cylib.utils.args import get_args
+
+DEFAULT_SIZES = (16, 256, 4096, 65536, 1048576, 16777216, 67108864)
+DEFAULT_LEVELS = (1, 2, 3, 4, 6)
+DEFAULT_STREAM_STEPS = (17, 1000, 3000, 65537)
+
+
+def _latency(samples):
+    """
+    summarize latency samples
+
+    :param samples: List(float), seconds
+    :return: dict, percentiles in microseconds
+    """
+
+    us = np.array(samples) * 1e6
+    return {"min": float(us.min()),
+            "p50": float(np.percentile(us, 50)),
+            "p90": float(np.percentile(us, 90)),
+            "p99": float(np.percentile(us, 99)),
+            "max": float(us.max())}
+
+
+def _peak_alloc(func, *args):
+    """
+    measure peak traced memory allocated during one call
+
+    :param func: callable
+    :return: int, peak allocated bytes
+    """
+
+    tracemalloc.start()
+    try:
+        func(*args)
+        ret = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return ret
+
+
+def bench_block(level, size, budget=67108864, max_iterations=1000):
+    """
+    benchmark encode/decode of one whole payload from a reset coder
+
+    :param level: int, fingerprint level
+    :param size: int, payload size in bytes
+    :param budget: int, bytes to process per operation (decides iterations)
+    :param max_iterations: int, upper limit of iterations
+    :return: List(dict), results of encode and decode
+    """
+
+    iterations = max(1, min(max_iterations, budget // size))
+    payload = os.urandom(size)
+    coder = Iccode(b"I2cylib-bench", fingerprint_level=level)
+
+    encoded = coder.encode(payload)
+    coder.reset()
+    if coder.decode(encoded) != payload:
+        raise Exception("decode result mismatch at level {} size {}".format(level, size))
+
+    ret = []
+    for op, func, data in (("encode", coder.encode, payload),
+                           ("decode", coder.decode, encoded)):
+        samples = []
+        for i in range(iterations):
+            coder.reset()
+            ts = time.perf_counter()
+            func(data)
+            samples.append(time.perf_counter() - ts)
+
+        coder.reset()
+        ret.append({"op": op,
+                    "mode": "block",
+                    "level": level,
+                    "size": size,
+                    "iterations": iterations,
+                    "mb_s": size * iterations / sum(samples) / 1048576,
+                    "latency_us": _latency(samples),
+                    "peak_alloc_bytes": _peak_alloc(func, data)})
+
+    return ret
+
+
+def bench_stream(level, step, total=262144):
+    """
+    benchmark encode/decode of a payload fed in fixed unaligned steps
+
+    :param level: int, fingerprint level
+    :param step: int, bytes per call
+    :param total: int, payload size in bytes
+    :return: List(dict), results of encode and decode
+    """
+
+    payload = os.urandom(total)
+    chunks = [payload[i:i + step] for i in range(0, total, step)]
+    coder = Iccode(b"I2cylib-bench", fingerprint_level=level)
+
+    ret = []
+    results = []
+    for op, func in (("encode", coder.encode), ("decode", coder.decode)):
+        coder.reset()
+        samples = []
+        out = []
+        for chunk in chunks:
+            ts = time.perf_counter()
+            out.append(func(chunk))
+            samples.append(time.perf_counter() - ts)
+        results.append(out)
+        ret.append({"op": op,
+                    "mode": "stream",
+                    "level": level,
+                    "size": total,
+                    "step": step,
+                    "iterations": len(chunks),
+                    "mb_s": total / sum(samples) / 1048576,
+                    "latency_us": _latency(samples),
+                    "peak_alloc_bytes": _peak_alloc(func, chunks[0])})
+        chunks = out
+
+    if b"".join(results[1]) != payload:
+        raise Exception("stream decode result mismatch at level {} step {}".format(level, step))
+
+    return ret
+
+
+def run(levels=DEFAULT_LEVELS, sizes=DEFAULT_SIZES, stream_steps=DEFAULT_STREAM_STEPS,
+        budget=67108864, stream_total=262144, echo=None):
+    """
+    run the whole benchmark suite
+
+    :param levels: List(int), fingerprint levels
+    :param sizes: List(int), payload sizes in bytes
+    :param stream_steps: List(int), step sizes of stream mode
+    :param budget: int, bytes to process per block case
+    :param stream_total: int, payload size of stream mode
+    :param echo: callable(str) or None, progress output
+    :return: dict, report
+    """
+
+    report = {"iccode_version": Iccode(b"I2cylib-bench").__version__,
+              "python": platform.python_version(),
+              "numpy": np.__version__,
+              "platform": platform.platform(),
+              "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+              "results": []}
+
+    for level in levels:
+        for size in sizes:
+            if echo is not None:
+                echo("level {} block size {}".format(level, size))
+            report["results"].extend(bench_block(level, size, budget=budget))
+        for step in stream_steps:
+            if echo is not None:
+                echo("level {} stream step {}".format(level, step))
+            report["results"].extend(bench_stream(level, step, total=stream_total))
+
+    return report
+
+
+def usage():
+    print("""IcCode Throughput Benchmark
+
+Usage: python -m i2cylib.crypto.iccode.bench [options]
+
+Options:
+ -h --help                           - display this page
+ -l --levels <1,2,3>                 - fingerprint levels (default: 1,2,3,4,6)
+ -s --sizes <16,1024>                - payload sizes in bytes
+                                       (default: 16 B to 64 MB)
+ -t --steps <17,1000>                - unaligned stream step sizes
+ -b --budget <Bytes>                 - bytes processed per case (default: 64 MB)
+ -o --output <File_Path>             - write JSON report to file (default: stdout)
+ -q --quiet                          - no progress output
+""")
+    sys.exit(1)
+
+
+def _int_list(text):
+    return [int(i) for i in text.split(",") if i.strip()]
+
+
+def main():
+    opts = get_args()
+    kwargs = {}
+    output = None
+    quiet = False
+
+    try:
+        for i in opts:
+            if i in ("-h", "--help"):
+                usage()
+            elif i in ("-l", "--levels"):
+                kwargs["levels"] = _int_list(opts[i])
+            elif i in ("-s", "--sizes"):
+                kwargs["sizes"] = _int_list(opts[i])
+            elif i in ("-t", "--steps"):
+                kwargs["stream_steps"] = _int_list(opts[i])
+            elif i in ("-b", "--budget"):
+                kwargs["budget"] = int(opts[i])
+            elif i in ("-o", "--output"):
+                output = opts[i]
+            elif i in ("-q", "--quiet"):
+                quiet = True
+            else:
+                print("Unhandled option: \"{}\", try \"-h\" for help".format(i))
+                sys.exit(1)
+    except ValueError as err:
+        print("invalid option value, {}".format(err))
+        sys.exit(1)
+
+    if not quiet:
+        kwargs["echo"] = lambda msg: print("[bench] {}".format(msg), file=sys.stderr)
+
+    report = run(**kwargs)
+    text = json.dumps(report, indent=2)
+
+    if output is None:
+        print(text)
+    else:
+        with open(output, "w") as f:
+            f.write(text)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
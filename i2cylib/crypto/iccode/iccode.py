@@ -6,18 +6,127 @@
 # Created on: 2021/9/25
 
 
-from hashlib import sha512
+from collections import OrderedDict
+from hashlib import sha256, sha512
+import threading
 import numpy as np
 
 
+class KeyCache:  # process-wide LRU cache of derived keys
+
+    def __init__(self, max_size=256):
+        """
+        LRU cache of keys derived by Iccode.generate_key, keyed by key digest
+        so that plain keys are never kept as cache index
+
+        :param max_size: int (>=0), max cached keys, 0 disables caching
+        """
+
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        self.__cache = OrderedDict()
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def _digest(key):
+        return sha256(key).digest()
+
+    def get(self, key):
+        """
+        get derived key from cache
+
+        :param key: bytes, original key
+        :return: np.ndarray (read-only) or None
+        """
+
+        digest = self._digest(key)
+        with self.__lock:
+            ret = self.__cache.get(digest)
+            if ret is None:
+                self.misses += 1
+            else:
+                self.__cache.move_to_end(digest)
+                self.hits += 1
+
+        return ret
+
+    def put(self, key, derived):
+        """
+        put derived key into cache, evicts the least recently used ones
+        when cache is full
+
+        :param key: bytes, original key
+        :param derived: np.ndarray, derived key (will be set read-only)
+        :return: None
+        """
+
+        if self.max_size <= 0:
+            return
+
+        derived.flags.writeable = False
+        digest = self._digest(key)
+        with self.__lock:
+            self.__cache[digest] = derived
+            self.__cache.move_to_end(digest)
+            while len(self.__cache) > self.max_size:
+                self.__cache.popitem(last=False)
+
+    def evict(self, key):
+        """
+        remove one key from cache
+
+        :param key: str (or bytes), original key
+        :return: bool, True if key was cached
+        """
+
+        if not isinstance(key, bytes):
+            key = key.encode()
+
+        with self.__lock:
+            return self.__cache.pop(self._digest(key), None) is not None
+
+    def resize(self, max_size):
+        """
+        change cache size, evicts the least recently used keys if needed
+
+        :param max_size: int (>=0)
+        :return: None
+        """
+
+        with self.__lock:
+            self.max_size = max_size
+            while len(self.__cache) > max(max_size, 0):
+                self.__cache.popitem(last=False)
+
+    def clear(self):
+        """
+        remove all cached keys
+
+        :return: None
+        """
+
+        with self.__lock:
+            self.__cache.clear()
+
+    def __len__(self):
+        return len(self.__cache)
+
+
+key_cache = KeyCache()
+
+
 class Iccode:  # Simple Data Encoder/Decoder
 
-    def __init__(self, base_key, fingerprint_level=3):
+    def __init__(self, base_key, fingerprint_level=3, lookup_table=True):
         """
         ICCode Simple Data Encryptor
 
         :param base_key: str (or bytes), basic key for encryptor
         :param fingerprint_level: int (>=1), encryption level, higher for more security
+        :param lookup_table: bool, sign keys with a precomputed 256-entry table,
+                             cost of signing becomes independent of fingerprint level
         """
 
         if len(base_key) <= 1:
@@ -34,8 +143,40 @@ class Iccode:  # Simple Data Encoder/Decoder
         self.buffer_key = self.base_key.copy()
         self.block_length = len(self.base_key)
         self.fingerprint_level = fingerprint_level
+        self.batch_blocks = 256
+        self.lookup_table = lookup_table
         self.step = 0
 
+        self.__sign_table = None
+        self.__sign_table_level = None
+
+    def _fingerprint(self, ret):
+        """
+        apply fingerprint polynomial of every level on given array in-place
+
+        :param ret: np.ndarray, uint8
+        :return: np.ndarray, ret itself
+        """
+
+        for i in range(1, self.fingerprint_level):
+            ret += np.power(ret, i + 1)
+
+        return ret
+
+    def _get_sign_table(self):
+        """
+        get the 256-entry lookup table of fingerprint polynomial, every byte
+        is mapped independently so the whole chain can be precomputed
+
+        :return: np.ndarray, uint8 table in shape (256,)
+        """
+
+        if self.__sign_table is None or self.__sign_table_level != self.fingerprint_level:
+            self.__sign_table = self._fingerprint(np.arange(256, dtype=np.uint8))
+            self.__sign_table_level = self.fingerprint_level
+
+        return self.__sign_table
+
     def sign_key(self, key):
         """
         generate a fingerprint from given key
@@ -44,24 +185,37 @@ class Iccode:  # Simple Data Encoder/Decoder
         :return: np.ndarray, length 1024 bytes
         """
         if isinstance(key, bytes):
-            ret = np.frombuffer(key, dtype=np.uint8)
+            ret = np.frombuffer(key, dtype=np.uint8) + self.base_key
         else:
-            ret = key.copy()
+            ret = key + self.base_key
 
-        ret += self.base_key
+        return self._sign(ret)
 
-        for i in range(1, self.fingerprint_level):
-            ret += np.power(ret, i + 1)
+    def _sign(self, ret):
+        """
+        apply fingerprint on key already summed with base key
 
-        return ret
+        :param ret: np.ndarray, uint8 (may be modified in-place)
+        :return: np.ndarray, signed key
+        """
+
+        if self.lookup_table:
+            return self._get_sign_table()[ret]
+
+        return self._fingerprint(ret)
 
     def generate_key(self, key):
         """
-        generate a sha512 key
+        generate a sha512 key, derived keys are cached in process-wide
+        LRU cache "key_cache"
 
         :param key: bytes
         :return: bytes, 1024 bytes
         """
+        ret = key_cache.get(key)
+        if ret is not None:
+            return ret
+
         ret = key
 
         for i in range(16):
@@ -70,6 +224,7 @@ class Iccode:  # Simple Data Encoder/Decoder
             ret += coder.digest()
 
         ret = np.frombuffer(ret[len(key):], dtype=np.uint8)
+        key_cache.put(key, ret)
 
         return ret
 
@@ -87,6 +242,174 @@ class Iccode:  # Simple Data Encoder/Decoder
         else:
             self.buffer_key = self.generate_key(key)
 
+    def get_state(self):
+        """
+        dump current stream state (step and buffer key)
+
+        :return: bytes, 8 bytes of step followed by buffer key
+        """
+
+        return self.step.to_bytes(8, "big", signed=False) + self.buffer_key.tobytes()
+
+    def set_state(self, state):
+        """
+        restore stream state dumped by get_state
+
+        :param state: bytes
+        :return: None
+        """
+
+        if len(state) != 8 + self.block_length:
+            raise Exception("invalid state length {}".format(len(state)))
+
+        self.step = int.from_bytes(state[:8], "big", signed=False)
+        self.buffer_key = np.frombuffer(state[8:], dtype=np.uint8).copy()
+
+    @staticmethod
+    def _as_array(data, writable=False):
+        """
+        wrap a buffer-protocol object as flat uint8 array without copying
+
+        :param data: bytes, bytearray, memoryview or np.ndarray
+        :param writable: bool, require the buffer to be writable
+        :return: np.ndarray, uint8 view of data
+        """
+
+        ret = np.frombuffer(memoryview(data).cast("B"), dtype=np.uint8)
+        if writable and not ret.flags.writeable:
+            raise Exception("output buffer must be writable")
+
+        return ret
+
+    def _encode_blocks(self, blocks, out):
+        """
+        encode whole blocks in batches, buffer key of every block is the
+        cumulative sum of all previous blocks so no per-block loop is needed
+
+        :param blocks: np.ndarray, uint8 in shape (n, block_length)
+        :param out: np.ndarray, uint8 in shape (n, block_length), output buffer
+        :return: None
+        """
+
+        for i in range(0, len(blocks), self.batch_blocks):
+            batch = blocks[i:i + self.batch_blocks]
+
+            keys = np.multiply(batch, self.base_key)
+            np.add.accumulate(keys, axis=0, out=keys)
+            next_key = self.buffer_key + keys[-1]
+
+            keys[1:] = keys[:-1]
+            keys[0] = 0
+            keys += self.buffer_key
+
+            np.add(batch, self.sign_key(keys), out=out[i:i + self.batch_blocks])
+            self.buffer_key = next_key
+
+    def _decode_blocks(self, blocks, out):
+        """
+        decode whole blocks one by one (every buffer key depends on the
+        plain text of previous block)
+
+        :param blocks: np.ndarray, uint8 in shape (n, block_length)
+        :param out: np.ndarray, uint8 in shape (n, block_length), output buffer
+        :return: None
+        """
+
+        for i in range(len(blocks)):
+            plain = out[i]
+            np.subtract(blocks[i], self.sign_key(self.buffer_key), out=plain)
+            self.buffer_key = self.buffer_key + plain * self.base_key
+
+    def _code_partial(self, src, dst, start, decode):
+        """
+        encode or decode a part of one block that starts at given position
+
+        :param src: np.ndarray, uint8 source data
+        :param dst: np.ndarray, uint8 output buffer
+        :param start: int, position of src in block
+        :param decode: bool, decode mode
+        :return: None
+        """
+
+        end = start + len(src)
+        sign = self.sign_key(self.buffer_key)[start:end]
+        buffer_key = self.buffer_key.copy()
+
+        if decode:
+            np.subtract(src, sign, out=dst)
+            buffer_key[start:end] += dst * self.base_key[start:end]
+        else:
+            buffer_key[start:end] += src * self.base_key[start:end]
+            np.add(src, sign, out=dst)
+
+        self.buffer_key = buffer_key
+
+    def _code_into(self, data, out, decode):
+        """
+        encode or decode data into output buffer, split into head part,
+        whole blocks and tail part according to current step
+
+        :param data: buffer-protocol object, source data
+        :param out: writable buffer-protocol object, output buffer
+        :param decode: bool, decode mode
+        :return: int, bytes written
+        """
+
+        src = self._as_array(data)
+        dst = self._as_array(out, writable=True)
+        length = len(src)
+        if len(dst) < length:
+            raise Exception("output buffer too small, {} bytes required".format(length))
+
+        offset = 0
+        fill_size_a = self.step % self.block_length
+        if fill_size_a and length:
+            offset = min(self.block_length - fill_size_a, length)
+            self._code_partial(src[:offset], dst[:offset], fill_size_a, decode)
+
+        whole = (length - offset) // self.block_length * self.block_length
+        if whole:
+            blocks = src[offset:offset + whole].reshape(-1, self.block_length)
+            res = dst[offset:offset + whole].reshape(-1, self.block_length)
+            if decode:
+                self._decode_blocks(blocks, res)
+            else:
+                self._encode_blocks(blocks, res)
+            offset += whole
+
+        if offset < length:
+            self._code_partial(src[offset:], dst[offset:length], 0, decode)
+
+        self.step += length
+
+        return length
+
+    def encode_into(self, data, out):
+        """
+        encode data into a pre-allocated buffer, out may be the same
+        buffer as data for in-place encoding
+
+        :param data: bytes, bytearray, memoryview or np.ndarray
+        :param out: bytearray, memoryview or np.ndarray, writable buffer
+                    not shorter than data
+        :return: int, bytes written
+        """
+
+        return self._code_into(data, out, decode=False)
+
+    def decode_into(self, data, out):
+        """
+        decode data into a pre-allocated buffer, out may be the same
+        buffer as data for in-place decoding
+
+        :param data: bytes, bytearray, memoryview or np.ndarray
+        :param out: bytearray, memoryview or np.ndarray, writable buffer
+                    not shorter than data
+        :return: int, bytes written
+        """
+
+        return self._code_into(data, out, decode=True)
+
     def encode(self, data):  # encoder
         """
         encode data with buffer and base key
@@ -95,33 +418,13 @@ class Iccode:  # Simple Data Encoder/Decoder
         :return: bytes, encoded bytes
         """
 
-        res = b""
         if not len(data):
             return b""
-        fill_size_a = self.step % 1024
-        fill_size_b = 0
-        if fill_size_a:
-            data = b"\x00" * fill_size_a + data
-        if len(data) % 1024:
-            fill_size_b = (1024 - (len(data) % 1024)) % 1024
-            data += fill_size_b * b"\x00"
-
-        for i in range(len(data) // 1024):
-            tmp = np.frombuffer(data[1024 * i: 1024 * (i + 1)], dtype=np.uint8)
-            res += (tmp + self.sign_key(self.buffer_key)).tobytes()
-
-            self.buffer_key = self.buffer_key + (tmp * self.base_key)
-
-            if self.step % 1024:
-                self.step += 1024 - fill_size_a
-            else:
-                self.step += 1024
 
-        if fill_size_a or fill_size_b:
-            res = res[fill_size_a:len(res) - fill_size_b]
-            self.step -= fill_size_b
+        res = np.empty((len(data),), dtype=np.uint8)
+        self.encode_into(data, res)
 
-        return res
+        return res.tobytes()
 
     def decode(self, data):  # decoder
         """
@@ -131,40 +434,132 @@ class Iccode:  # Simple Data Encoder/Decoder
         :return: bytes, decoded bytes
         """
 
-        res = b""
         if not len(data):
             return b""
-        fill_size_a = self.step % 1024
-        fill_size_b = 0
-        if fill_size_a:
-            data = b"\x00" * fill_size_a + data
-        if len(data) % 1024:
-            fill_size_b = (1024 - (len(data) % 1024)) % 1024
-            data += fill_size_b * b"\x00"
-
-        for i in range(len(data) // 1024):
-            tmp = np.frombuffer(data[1024 * i: 1024 * (i + 1)], dtype=np.uint8)
-
-            tmp = tmp - self.sign_key(self.buffer_key)
-            res += tmp.tobytes()
-
-            if self.step % 1024:
-                self.buffer_key = self.buffer_key + \
-                                  np.concatenate((np.zeros((fill_size_a,), dtype=np.uint8),
-                                                  (tmp * self.base_key)[fill_size_a:]))
-                self.step += 1024 - fill_size_a
-            else:
-                self.buffer_key = self.buffer_key + (tmp * self.base_key)
-                self.step += 1024
 
-        if fill_size_a or fill_size_b:
-            res = res[fill_size_a:len(res) - fill_size_b]
-            self.step -= fill_size_b
-            self.buffer_key = self.buffer_key - \
-                              np.concatenate((np.zeros((1024 - fill_size_b,), dtype=np.uint8),
-                                              (tmp * self.base_key)[1024 - fill_size_b:]))
+        res = np.empty((len(data),), dtype=np.uint8)
+        self.decode_into(data, res)
+
+        return res.tobytes()
+
+
+def _stack_batch(coders, messages):
+    """
+    stack messages of independent coders into zero padded blocks, every
+    message is placed at the current position of its coder in a block
+
+    :param coders: List(Iccode)
+    :param messages: List(bytes)
+    :return: (np.ndarray, List(int), List(int)), blocks in shape
+             (n, blocks, block_length), head fill sizes and lengths
+    """
+
+    if len(coders) != len(messages):
+        raise Exception("number of coders ({}) and messages ({}) mismatch".format(len(coders),
+                                                                              len(messages)))
+    for coder in coders:
+        if coder.fingerprint_level != coders[0].fingerprint_level or \
+                coder.block_length != coders[0].block_length:
+            raise Exception("all coders in a batch must share the same fingerprint level")
+
+    block_length = coders[0].block_length
+    fills = [coder.step % block_length for coder in coders]
+    lengths = [len(message) for message in messages]
+    blocks = max((fill + length + block_length - 1) // block_length
+                 for fill, length in zip(fills, lengths))
+
+    ret = np.zeros((len(coders), blocks * block_length), dtype=np.uint8)
+    for i, message in enumerate(messages):
+        ret[i, fills[i]:fills[i] + lengths[i]] = Iccode._as_array(message)
+
+    return ret.reshape(len(coders), blocks, block_length), fills, lengths
+
+
+def encode_batch(coders, messages):
+    """
+    encode messages of independent coders in one vectorized pass, result
+    and coder states are the same as calling coders[i].encode(messages[i])
+    one by one. messages of similar length batch best since all of them
+    are padded to the longest one
+
+    :param coders: List(Iccode), coders with the same fingerprint level
+    :param messages: List(bytes), one message for every coder
+    :return: List(bytes), encoded messages
+    """
+
+    if not len(coders):
+        return []
+
+    plain, fills, lengths = _stack_batch(coders, messages)
+    if not plain.shape[1]:
+        return [b"" for i in coders]
+
+    base = np.stack([coder.base_key for coder in coders])[:, None, :]
+    buffer = np.stack([coder.buffer_key for coder in coders])
+
+    keys = plain * base
+    np.add.accumulate(keys, axis=1, out=keys)
+    final = buffer + keys[:, -1]
+
+    keys[:, 1:] = keys[:, :-1]
+    keys[:, 0] = 0
+    keys += buffer[:, None, :]
+    keys += base
+
+    res = plain + coders[0]._sign(keys)
+    res = res.reshape(len(coders), -1)
+
+    ret = []
+    for i, coder in enumerate(coders):
+        coder.buffer_key = final[i].copy()
+        coder.step += lengths[i]
+        ret.append(res[i, fills[i]:fills[i] + lengths[i]].tobytes())
+
+    return ret
+
+
+def decode_batch(coders, messages):
+    """
+    decode messages of independent coders, every block position of all
+    coders is decoded in one vectorized step, result and coder states are
+    the same as calling coders[i].decode(messages[i]) one by one
+
+    :param coders: List(Iccode), coders with the same fingerprint level
+    :param messages: List(bytes), one message for every coder
+    :return: List(bytes), decoded messages
+    """
+
+    if not len(coders):
+        return []
+
+    cipher, fills, lengths = _stack_batch(coders, messages)
+    if not cipher.shape[1]:
+        return [b"" for i in coders]
+
+    mask = np.zeros(cipher.shape[0:1] + (cipher.shape[1] * cipher.shape[2],), dtype=np.uint8)
+    for i in range(len(coders)):
+        mask[i, fills[i]:fills[i] + lengths[i]] = 1
+    mask = mask.reshape(cipher.shape)
+
+    base = np.stack([coder.base_key for coder in coders])
+    buffer = np.stack([coder.buffer_key for coder in coders])
+    res = np.empty(cipher.shape, dtype=np.uint8)
+
+    for b in range(cipher.shape[1]):
+        plain = res[:, b]
+        np.subtract(cipher[:, b], coders[0]._sign(buffer + base), out=plain)
+        plain *= mask[:, b]
+        buffer = buffer + plain * base
+
+    res = res.reshape(len(coders), -1)
+
+    ret = []
+    for i, coder in enumerate(coders):
+        coder.buffer_key = buffer[i].copy()
+        coder.step += lengths[i]
+        ret.append(res[i, fills[i]:fills[i] + lengths[i]].tobytes())
 
-        return res
+    return ret
 
 
 if __name__ == '__main__':
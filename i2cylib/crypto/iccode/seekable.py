@@ -0,0 +1,216 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Author: i2cy(i2cy@outlook.com)
+# Project: I2cylib
+# Filename: seekable
+# Created on: 2026/10/17
+
+import os
+import struct
+from .iccode import Iccode
+
+__all__ = ["IccodeWriter", "IccodeReader"]
+
+# File layout:
+#   header  | magic(6) version(1) fingerprint_level(1) checkpoint_interval(8)
+#   body    | Iccode encoded data stream
+#   index   | encoded with index key: key check(16) + state(8 + 1024) * count
+#   trailer | data_length(8) checkpoint_count(8) magic(8)
+
+SEEKABLE_MAGIC = b"ICSEEK"
+SEEKABLE_INDEX_MAGIC = b"ICSEEKIX"
+SEEKABLE_KEY_CHECK = b"ICSEEK-KEYCHECK\x00"
+SEEKABLE_VERSION = 1
+
+_HEADER = struct.Struct(">6sBBQ")
+_TRAILER = struct.Struct(">QQ8s")
+
+
+def _index_coder(key, fingerprint_level):
+    """
+    create the coder used for index, key states must never be stored as
+    plain text since they leak the base key
+
+    :param key: bytes
+    :param fingerprint_level: int
+    :return: Iccode
+    """
+
+    return Iccode(key + b"\x00ICSEEK-index", fingerprint_level=fingerprint_level)
+
+
+def _to_bytes(key):
+    if not isinstance(key, bytes):
+        key = key.encode()
+    return key
+
+
+class IccodeWriter:
+
+    def __init__(self, filename, key, fingerprint_level=3, checkpoint_interval=1048576):
+        """
+        IcCode seekable container writer, stores coder state every
+        checkpoint_interval bytes in an index footer so that any range
+        can be decoded from the nearest checkpoint
+
+        :param filename: str, container file to create
+        :param key: str (or bytes), basic key for encryptor
+        :param fingerprint_level: int (>=1), encryption level
+        :param checkpoint_interval: int, bytes between checkpoints,
+                                    rounded up to coder block length
+        """
+
+        self.key = _to_bytes(key)
+        self.coder = Iccode(self.key, fingerprint_level=fingerprint_level)
+        self.fingerprint_level = fingerprint_level
+
+        block_length = self.coder.block_length
+        self.checkpoint_interval = max(checkpoint_interval + (-checkpoint_interval) % block_length,
+                                       block_length)
+
+        self.length = 0
+        self.checkpoints = []
+
+        self.file = open(filename, "wb")
+        self.file.write(_HEADER.pack(SEEKABLE_MAGIC, SEEKABLE_VERSION, fingerprint_level,
+                                     self.checkpoint_interval))
+
+    def write(self, data):
+        """
+        encode and append data to container
+
+        :param data: bytes, bytearray or memoryview
+        :return: int, bytes written
+        """
+
+        if self.file is None:
+            raise Exception("container has been closed")
+
+        data = memoryview(data).cast("B")
+        offset = 0
+        while offset < len(data):
+            room = self.checkpoint_interval - self.length % self.checkpoint_interval
+            part = data[offset:offset + room]
+            self.file.write(self.coder.encode(part))
+            self.length += len(part)
+            offset += len(part)
+            if not self.length % self.checkpoint_interval:
+                self.checkpoints.append(self.coder.get_state())
+
+        return len(data)
+
+    def close(self):
+        """
+        write index footer and close container
+
+        :return: None
+        """
+
+        if self.file is None:
+            return
+
+        index = _index_coder(self.key, self.fingerprint_level).encode(
+            SEEKABLE_KEY_CHECK + b"".join(self.checkpoints))
+        self.file.write(index)
+        self.file.write(_TRAILER.pack(self.length, len(self.checkpoints), SEEKABLE_INDEX_MAGIC))
+        self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class IccodeReader:
+
+    def __init__(self, filename, key):
+        """
+        IcCode seekable container reader
+
+        :param filename: str, container file written by IccodeWriter
+        :param key: str (or bytes), basic key for decryptor
+        """
+
+        self.key = _to_bytes(key)
+        self.file = open(filename, "rb")
+
+        try:
+            magic, version, level, interval = _HEADER.unpack(self.file.read(_HEADER.size))
+            if magic != SEEKABLE_MAGIC:
+                raise Exception("not an IcCode seekable container")
+            if version != SEEKABLE_VERSION:
+                raise Exception("unsupported container version {}".format(version))
+
+            self.file.seek(-_TRAILER.size, os.SEEK_END)
+            self.length, count, magic = _TRAILER.unpack(self.file.read(_TRAILER.size))
+            if magic != SEEKABLE_INDEX_MAGIC:
+                raise Exception("container index not found, file may be incomplete")
+
+            self.fingerprint_level = level
+            self.checkpoint_interval = interval
+            self.coder = Iccode(self.key, fingerprint_level=level)
+
+            state_length = 8 + self.coder.block_length
+            self.file.seek(_HEADER.size + self.length)
+            index = _index_coder(self.key, level).decode(
+                self.file.read(len(SEEKABLE_KEY_CHECK) + state_length * count))
+            if index[:len(SEEKABLE_KEY_CHECK)] != SEEKABLE_KEY_CHECK:
+                raise Exception("invalid key")
+            index = index[len(SEEKABLE_KEY_CHECK):]
+            self.checkpoints = [index[i * state_length:(i + 1) * state_length] for i in range(count)]
+
+        except Exception:
+            self.file.close()
+            raise
+
+    def decode_range(self, offset, length):
+        """
+        decode data in range [offset, offset + length) starting from the
+        nearest checkpoint before offset
+
+        :param offset: int, position in decoded data
+        :param length: int, bytes to read
+        :return: bytes, decoded data (shorter if range exceeds data length)
+        """
+
+        if self.file is None:
+            raise Exception("container has been closed")
+        if offset < 0 or length < 0:
+            raise Exception("offset and length must not be negative")
+
+        length = max(min(length, self.length - offset), 0)
+        if not length:
+            return b""
+
+        checkpoint = offset // self.checkpoint_interval
+        if checkpoint:
+            self.coder.set_state(self.checkpoints[checkpoint - 1])
+        else:
+            self.coder.reset()
+        start = checkpoint * self.checkpoint_interval
+
+        self.file.seek(_HEADER.size + start)
+        if offset > start:
+            skip = bytearray(self.file.read(offset - start))
+            self.coder.decode_into(skip, skip)
+
+        return self.coder.decode(self.file.read(length))
+
+    def close(self):
+        """
+        close container
+
+        :return: None
+        """
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
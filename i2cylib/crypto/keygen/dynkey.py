@@ -8,8 +8,9 @@
 import time
 from hashlib import md5
 from typing import Any, Tuple
+import numpy as np
 
-__VERSION__ = 1.1
+__VERSION__ = 1.2
 
 
 class DynKey:  # 64-Bits dynamic key generator/matcher
@@ -72,51 +73,91 @@ class DynKey:  # 64-Bits dynamic key generator/matcher
             return key
 
         # generate new if it doesn't exists
-        time_unit = str(time_unit_raw).encode()
-        time_unit = md5(time_unit).digest()
+        final_key = self._keygen_units([time_unit_raw])[0]
+
+        self.__key_buffer.append([time_unit_raw, final_key])
+        self.__buffer_check()
+
+        return final_key
+
+    @staticmethod
+    def _conv(data, cores):
+        """
+        valid convolution (correlation) of every row of data with its core,
+        taps are accumulated in the same order as scalar loop so that float
+        cores give bit-identical results, then reduced by modulo 256
+
+        :param data: np.ndarray, shape (n, length)
+        :param cores: np.ndarray, shape (n, width)
+        :return: np.ndarray, uint8 in shape (n, length - width + 1)
+        """
+
+        width = cores.shape[1]
+        length = data.shape[1] - width + 1
+        ret = 0
+        for c in range(width):
+            ret = ret + data[:, c:c + length] * cores[:, c:c + 1]
+
+        return np.mod(ret, 256).astype(np.uint8)
+
+    def _keygen_units(self, time_units):
+        """
+        generate keys of given time units, convolution stages of all keys
+        are computed together
+
+        :param time_units: List(int), raw time units
+        :return: List(bytes), 64 bytes keys
+        """
+
         key_unit = md5(self.key).digest()
-        sub_key_unit = time_unit + key_unit
+        time_units = [md5(str(unit).encode()).digest() for unit in time_units]
+        sub_key_units = [time_unit + key_unit for time_unit in time_units]
 
         for i in range(self.flush_time):
-            sub_key_unit = md5(sub_key_unit).digest()[::-1]
-            conv_core = [int((num + 1 * self.multiplier) % 255 + 1) for num in sub_key_unit[:3]]
-            conv_res = []
-            for i2, ele in enumerate(sub_key_unit[3:-2]):
-                conv_res_temp = 0
-                for c in range(3):
-                    conv_res_temp += sub_key_unit[3 + i2 + c] * conv_core[c]
-                conv_res.append(int(conv_res_temp % 256))
-            sub_key_unit = md5(sub_key_unit[:3] + bytes(conv_core)).digest()[::-1]
-            sub_key_unit += md5(sub_key_unit + bytes(conv_res)).digest()
-            sub_key_unit += md5(bytes(conv_res)).digest()
-            sub_key_unit += md5(bytes(conv_res) + self.key).digest()
-            sub_key_unit += key_unit
-
-        conv_cores = [[time_unit[i2] for i2 in range(4 * i, 4 * i + 4)]
-                      for i in range(4)]
-
-        for i, ele in enumerate(conv_cores):
-            ele.insert(2,
-                       1 * self.multiplier + (key_unit[i] + key_unit[i + 4] + key_unit[i + 8] + key_unit[i + 12]) // 4)
-
-        final_key = sub_key_unit
+            sub_key_units = [md5(sub_key_unit).digest()[::-1] for sub_key_unit in sub_key_units]
+            conv_cores = [[int((num + 1 * self.multiplier) % 255 + 1) for num in sub_key_unit[:3]]
+                          for sub_key_unit in sub_key_units]
+            data = np.frombuffer(b"".join(sub_key_units), dtype=np.uint8).reshape(-1, 16)
+            conv_res = self._conv(data[:, 3:].astype(np.int64), np.array(conv_cores, dtype=np.int64))
+
+            for i2, sub_key_unit in enumerate(sub_key_units):
+                conv = conv_res[i2].tobytes()
+                sub_key_unit = md5(sub_key_unit[:3] + bytes(conv_cores[i2])).digest()[::-1]
+                sub_key_unit += md5(sub_key_unit + conv).digest()
+                sub_key_unit += md5(conv).digest()
+                sub_key_unit += md5(conv + self.key).digest()
+                sub_key_unit += key_unit
+                sub_key_units[i2] = sub_key_unit
+
+        time_units = np.frombuffer(b"".join(time_units), dtype=np.uint8).reshape(-1, 4, 4).astype(np.float64)
+        final_key = np.frombuffer(b"".join(sub_key_units), dtype=np.uint8).reshape(len(sub_key_units), -1)
 
         for i in range(4):
-            conv_core = conv_cores[i]
-            conv_res = []
-            for i2, ele in enumerate(final_key[:-4]):
-                conv_res_temp = 0
-                for c in range(5):
-                    conv_res_temp += final_key[i2 + c] * conv_core[c]
-                conv_res.append(int(conv_res_temp % 256))
-            final_key = bytes(conv_res)
+            conv_cores = np.insert(time_units[:, i], 2,
+                                   1 * self.multiplier + (key_unit[i] + key_unit[i + 4] +
+                                                          key_unit[i + 8] + key_unit[i + 12]) // 4,
+                                   axis=1)
+            final_key = self._conv(final_key.astype(np.float64), conv_cores)
             if self.__debug:
-                print("Conv2, iter {}: length {}".format(i, len(final_key)))
+                print("Conv2, iter {}: length {}".format(i, final_key.shape[1]))
 
-        self.__key_buffer.append([time_unit_raw, final_key])
-        self.__buffer_check()
+        return [row.tobytes() for row in final_key]
 
-        return final_key
+    def keygen_range(self, start_offset=0, count=1):
+        """
+        generate keys of many consecutive time windows in one call
+
+        :param start_offset: int, offset of the first time window
+        :param count: int, number of time windows
+        :return: List(bytes), 64 bytes keys
+        """
+
+        if count <= 0:
+            return []
+
+        time_unit_raw = int(time.time() * self.multiplier) + int(start_offset)
+
+        return self._keygen_units([time_unit_raw + i for i in range(count)])
 
     def keymatch(self, key):  # Live key matcher
         lock = [self.keygen(offset) for offset in range(-1, 2)]
@@ -7,6 +7,7 @@
 
 
 from hashlib import md5
+import threading
 import time
 
 
@@ -54,6 +55,16 @@ class DynKey16:  # 16-Bytes dynamic key generator/matcher
     def keygen(self, offset=0):  # 16-Bytes dynamic key generator
         timestamp = int(time.time() / self.divide) + int(offset)
 
+        return self._keygen_unit(timestamp)
+
+    def _keygen_unit(self, timestamp):
+        """
+        generate key of given time unit
+
+        :param timestamp: int, time unit (time.time() / divide)
+        :return: bytes, 16 bytes key
+        """
+
         # search for the key that previously generated
         key = self.__find_buffed(timestamp)
         if key != b"":
@@ -92,6 +103,99 @@ class DynKey16:  # 16-Bytes dynamic key generator/matcher
             return False
 
 
+class DynKey16Ring(DynKey16):  # 16-Bytes dynamic key matcher with precomputed key ring
+    """
+    DynKey16 with a key ring of previous, current and next time window,
+    a background thread rotates the ring at every window boundary so that
+    keymatch is a set lookup and never generates keys inline
+    """
+
+    def __init__(self, key, flush_times=1, divide=60, key_buff_max=5, auto_start=True):
+        super(DynKey16Ring, self).__init__(key, flush_times=flush_times, divide=divide,
+                                           key_buff_max=key_buff_max)
+        # (time unit, keys matched in unit, keys matched in unit + 1)
+        self.__ring = (None, frozenset(), frozenset())
+        self.__stop = threading.Event()
+        self.__thread = None
+
+        self.rotate()
+        if auto_start:
+            self.start()
+
+    def _time_unit(self):
+        return int(time.time() / self.divide)
+
+    def rotate(self):
+        """
+        rebuild key ring for current time window (and the next one)
+
+        :return: None
+        """
+
+        unit = self._time_unit()
+        old_unit, current, following = self.__ring
+        if old_unit == unit:
+            return
+
+        if old_unit is not None and old_unit + 1 == unit:
+            current = following
+        else:
+            current = frozenset(self._keygen_unit(unit + offset) for offset in range(-1, 2))
+        following = frozenset(self._keygen_unit(unit + offset) for offset in range(0, 3))
+        self.__ring = (unit, current, following)
+
+    def _rotate_thread(self):
+        """
+        key ring rotating service, wakes up right after every window boundary
+
+        :return: None
+        """
+
+        while not self.__stop.is_set():
+            delay = (self._time_unit() + 1) * self.divide - time.time()
+            if self.__stop.wait(max(delay, 0) + 0.01):
+                break
+            try:
+                self.rotate()
+            except Exception:
+                pass
+
+    def start(self):
+        """
+        start background rotation
+
+        :return: None
+        """
+
+        if self.__thread is not None and self.__thread.is_alive():
+            return
+        self.__stop.clear()
+        self.rotate()
+        self.__thread = threading.Thread(target=self._rotate_thread, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """
+        stop background rotation
+
+        :return: None
+        """
+
+        self.__stop.set()
+        self.__thread = None
+
+    def keymatch(self, key):  # Live key matcher
+        unit, current, following = self.__ring
+        now = self._time_unit()
+        if now == unit:
+            return key in current
+        if now == unit + 1:
+            return key in following
+
+        self.rotate()
+        return key in self.__ring[1]
+
+
 if __name__ == '__main__':
     kg = DynKey16(b"testtest123", flush_times=2)
     test_match = kg.keygen(-1)
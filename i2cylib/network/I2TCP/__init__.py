@@ -7,3 +7,5 @@
 
 from .client import *
 from .server import *
+from .async_client import *
+from .pool import *
\ No newline at end of file
@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Author: i2cy(i2cy@outlook.com)
+# Project: I2cylib
+# Filename: async_client
+# Created on: 2026/10/17
+
+import rsa
+from i2cylib.network.i2tcp_basic import AsyncI2TCPclient
+from i2cylib.crypto.iccode import Iccode
+from i2cylib.utils import random_keygen
+from .client import VERSION
+
+
+class AsyncClient(AsyncI2TCPclient):
+
+    def __init__(self, hostname, port=24678, key=b"I2TCPbasicKey",
+                 watchdog_timeout=15, logger=None,
+                 max_buffer_size=100, auto_reconnect=True, checksum="none"):
+        """
+        asyncio I2TCP 客户端通讯类, the same secured session as Client
+        with awaitable send/get
+
+        :param hostname: str, server address 服务器地址
+        :param port: int, server port 服务器端口
+        :param key: str, dynamic key for authentication 对称动态密钥
+        :param watchdog_timeout: int, watchdog timeout 守护超时时间
+        :param logger: Logger, client log output object 日志器（来自于i2cylib.utils.logger.logger.Logger）
+        :param max_buffer_size: int, max pakcage buffer size 最大包缓冲池大小（单位：个）
+        :param auto_reconnect: bool, weather should the client auto reconnect to server
+        when disconnect unexpectedly  是否自动重连
+        :param checksum: str, preferred payload checksum ("none", "adler32", "crc32" or "md5"),
+        the stronger one of client and server is used, server of secured session prefers "none"
+        负载校验方式（取双方中较强者）
+        """
+        super(AsyncClient, self).__init__(hostname, port=port, key=key,
+                                          watchdog_timeout=watchdog_timeout,
+                                          logger=logger, max_buffer_size=max_buffer_size,
+                                          auto_reconnect=auto_reconnect, checksum=checksum)
+
+        self.connection_timeout = 10
+
+        self.public_key = None
+        self.coder_pack = None
+        self.coder_depack = None
+
+        self.flag_secured_connection_built = False
+
+        self.version = VERSION.encode()
+
+    def _package_heads(self, data):
+        """
+        【保留】 split data into I2TCP sub-packages, encrypted in secured session
+
+        :param data: bytes
+        :return: List(tuple(bytes, memoryview)), package head and payload view
+        """
+
+        if self.flag_secured_connection_built:  # 安全连接加密
+            assert isinstance(self.coder_pack, Iccode)
+            self.coder_pack.reset()
+            data = self.coder_pack.encode(data)
+
+        return super(AsyncClient, self)._package_heads(data)
+
+    def _put_package(self, pak):
+        """
+        【保留】 decrypt package in secured session and move it to buffer
+
+        :param pak: bytes
+        :return: None
+        """
+
+        if self.flag_secured_connection_built and pak:  # 安全连接解密
+            assert isinstance(self.coder_depack, Iccode)
+            self.coder_depack.reset()
+            pak = self.coder_depack.decode(pak)
+
+        super(AsyncClient, self)._put_package(pak)
+
+    def _close_connection(self):
+        """
+        close connection and drop secured session
+
+        :return: None
+        """
+
+        super(AsyncClient, self)._close_connection()
+        self.public_key = None
+        self.coder_pack = None
+        self.coder_depack = None
+        self.flag_secured_connection_built = False
+
+    async def _post_connect(self):
+        """
+        build secured session (or authentication only session) after
+        authentication
+
+        :return: bool, session status
+        """
+
+        flag = await self.get(timeout=self.connection_timeout)
+        if flag is None:
+            self.logger.ERROR("{} failed to build connection, flag didn't received".format(
+                self.log_header
+            ))
+            return False
+
+        flag = flag.split(b"\a")
+
+        if flag[0] == b"SECURED_SESSION_KEY_REQUIRED":
+            try:
+                self.public_key = rsa.PublicKey.load_pkcs1(flag[1])
+                self.logger.DEBUG("{} public rsa key received, \n{}".format(self.log_header, flag[1].decode()))
+            except Exception as err:
+                self.logger.ERROR("{} broken rsa key received, {}".format(self.log_header, flag[1]))
+                return False
+
+            try:
+                session_key = random_keygen(64)
+                self.coder_pack = Iccode(session_key, fingerprint_level=3)
+                self.coder_depack = Iccode(session_key, fingerprint_level=3)
+                self.logger.DEBUG("{} random session key generated: {}".format(self.log_header, session_key))
+                session_key = rsa.encrypt(session_key, self.public_key)
+
+                await self.send(session_key)
+
+            except Exception as err:
+                self.logger.ERROR("{} error while sending session key to server, {}".format(
+                    self.log_header, err
+                ))
+                return False
+
+            feedback = await self.get(timeout=self.connection_timeout)
+            if feedback != b"CODER READY":
+                self.logger.ERROR("{} error while waiting ready signal from server".format(
+                    self.log_header
+                ))
+                return False
+
+            self.logger.DEBUG("{} secured connection built".format(self.log_header))
+            self.flag_secured_connection_built = True
+
+        elif flag[0] == b"AUTHENTICATION_ONLY":
+            self.logger.DEBUG("{} connection built".format(self.log_header))
+
+        else:
+            self.logger.ERROR("{} failed to build connection, unexpected flag received, {}".format(
+                self.log_header, flag
+            ))
+            return False
+
+        return True
+
+    async def connect(self, timeout=10, auto_reconnect=None):
+        """
+        connect to server  连接到I2TCP服务器
+
+        :param timeout: int, connection timeout 设置超时时间
+        :param auto_reconnect: bool, should client reconnect to server when connection lost unexpectedly 自动重连
+        :return: bool, connection status 连接状态（成功为True）
+        """
+
+        if auto_reconnect is not None:
+            self.auto_reconnect = auto_reconnect
+        self.connection_timeout = timeout
+
+        return await super(AsyncClient, self).connect(timeout=timeout)
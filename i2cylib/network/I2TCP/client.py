@@ -8,9 +8,10 @@
 import threading
 import time
 import rsa
-import random
-from hashlib import md5
-from i2cylib.network.i2tcp_basic import I2TCPclient
+from concurrent.futures import Future
+from functools import partial
+from i2cylib.network.i2tcp_basic import I2TCPclient, I2TCPinbox, STREAM_HEAD, STREAM_CHUNK_SIZE, STREAM_BUFFER, \
+    stream_reader, REPLY_HEAD, ERROR_HEAD, STREAM_ID_MAX, request_message, parse_reply, Deadline
 from i2cylib.crypto.iccode import Iccode
 from i2cylib.utils import random_keygen
 
@@ -21,7 +22,7 @@ class Client(I2TCPclient):
 
     def __init__(self, hostname, port=24678, key=b"I2TCPbasicKey",
                  watchdog_timeout=15, logger=None,
-                 max_buffer_size=100, auto_reconnect=True):
+                 max_buffer_size=100, auto_reconnect=True, checksum="none"):
         """
         I2TCPclient 客户端通讯类
 
@@ -33,67 +34,48 @@ class Client(I2TCPclient):
         :param max_buffer_size: int, max pakcage buffer size 最大包缓冲池大小（单位：个）
         :param auto_reconnect: bool, weather should the client auto reconnect to server
         when disconnect unexpectedly  是否自动重连
+        :param checksum: str, preferred payload checksum ("none", "adler32", "crc32" or "md5"),
+        the stronger one of client and server is used, server of secured session prefers "none"
+        负载校验方式（取双方中较强者）
         """
         super(Client, self).__init__(hostname, port=port, key=key,
                                      watchdog_timeout=watchdog_timeout,
-                                     logger=logger)
+                                     logger=logger, checksum=checksum)
 
         self.connection_timeout = 10
 
         self.max_buffer = max_buffer_size
-        self.package_buffer = []
+        self.package_buffer = I2TCPinbox(max_buffer_size)
+        self.package_buffer.register(STREAM_HEAD, limit=STREAM_BUFFER)
+
+        self.requests = {}  # stream id -> (Future, Deadline or None) of request in flight
+        self.request_id = 0
+        self.request_lock = threading.Lock()
 
         self.public_key = None
         self.coder_pack = None
         self.coder_depack = None
 
-        self.flag_pack_busy = False
-        self.flag_depack_busy = False
         self.flag_secured_connection_built = False
 
         self.__auto_reconnect = auto_reconnect
 
         self.version = VERSION.encode()
 
-    def _packager(self, data):
+    def _package_heads(self, data):
         """
-        【保留】 pack data with I2TCP format
+        【保留】 split data into I2TCP sub-packages, encrypted in secured session
 
         :param data: bytes
-        :return: List(bytes), packed data
+        :return: List(tuple(bytes, memoryview)), package head and payload view
         """
-        offset = 0
-        paks = []
-        length = len(data)
 
-        if self.flag_secured_connection_built:  # 安全连接加密
+        if self.flag_secured_connection_built:  # 安全连接加密，在send_lock内调用
             assert isinstance(self.coder_pack, Iccode)
-            while self.flag_pack_busy:
-                time.sleep(0.001)
-            self.flag_pack_busy = True
             self.coder_pack.reset()
             data = self.coder_pack.encode(data)
-            self.flag_pack_busy = False
-
-        left = length
-        header_unit = self.version + self.keygen.key
-        package_id = bytes((random.randint(0, 255),))
-        while left > 0:
-            pak = b"A" + left.to_bytes(length=3, byteorder='big', signed=False)
-            if left < 32758:
-                left = 0
-            else:
-                left -= 32758
-            pak_length = length - left - offset
-            pak += pak_length.to_bytes(length=2, byteorder='big', signed=False)
-            pak += bytes((md5(pak + header_unit).digest()[2],))
-            payload_sum = md5(data[offset:length - left]).digest()[:2]
-            pak += payload_sum
-            pak += package_id
-            pak += data[offset:length - left]
-            offset = length - left
-            paks.append(pak)
-        return paks
+
+        return super(Client, self)._package_heads(data)
 
     def _check_receiver(self):
         """
@@ -128,23 +110,30 @@ class Client(I2TCPclient):
 
             if self.flag_secured_connection_built:  # 安全连接解密
                 assert isinstance(self.coder_depack, Iccode)
-                while self.flag_depack_busy and self.live:
-                    time.sleep(0.001)
                 if package:
-                    self.flag_depack_busy = True
                     self.coder_depack.reset()
                     package = self.coder_depack.decode(package)
-                    self.flag_depack_busy = False
 
-            if package is not None:
-                self.package_buffer.append(package)
+            if package is not None and (package.startswith(REPLY_HEAD) or package.startswith(ERROR_HEAD)):
+                self._resolve(package)  # 应答直接交给请求，不经过缓冲池
+                continue
 
-            if len(self.package_buffer) > self.max_buffer:
-                self.package_buffer.pop(0)
+            if package is not None and self.package_buffer.put(package):
                 self.logger.WARNING("{} {} package buffer emitted, packages the oldest may be lost".format(
                     self.log_header, local_header
                 ))
 
+            since = time.time()
+            while self.live and self.package_buffer.full(STREAM_HEAD):  # 流数据未被取走时暂停读取
+                if time.time() - since >= self.watchdog_timeout:  # 超过看门狗时限仍未取走则断开
+                    self.logger.ERROR("{} {} stream not consumed for {} seconds, disconnecting...".format(
+                        self.log_header, local_header, self.watchdog_timeout))
+                    self.reset(kill_threads=False)
+                    self._start_reconnect()
+                    break
+                self.package_buffer.wait_room(STREAM_HEAD, 0.5)
+                self.watchdog.feed()  # 仅喂看门狗，心跳照常发送
+
             tick += 1
 
         self.threads.update({"receiver": False})
@@ -161,14 +150,14 @@ class Client(I2TCPclient):
         self.coder_pack = None
         self.coder_depack = None
 
-        self.flag_pack_busy = False
-        self.flag_depack_busy = False
         self.flag_secured_connection_built = False
-        self.package_buffer = []
+        self.package_buffer.clear()
+        self._fail_requests("connection reset")
 
         if kill_threads:
             auto_reconnect_save = self.__auto_reconnect
             self.live = False
+            self.package_buffer.close()
             self.__auto_reconnect = False
             wait = True
             while wait:
@@ -190,6 +179,135 @@ class Client(I2TCPclient):
         """
         return super(Client, self).send(data)
 
+    def send_stream(self, chunks, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        send data of any size as a stream, chunks are sent one by one so memory
+        usage stays constant  以流方式发送任意大小的数据（恒定内存占用）
+
+        :param chunks: iterable of bytes, stream data  数据块迭代器
+        :param chunk_size: int, max payload length of one message  单个消息最大负载长度
+        :return: int, total amount of bytes that has been sent  发送出去的总大小
+        """
+        return super(Client, self).send_stream(chunks, chunk_size=chunk_size)
+
+    def recv_stream(self, timeout=10):
+        """
+        receive a stream sent by send_stream(), payloads are yielded as they arrive
+        接收以流方式发送的数据，数据块到达即返回
+
+        :param timeout: float, seconds to wait for each chunk  每个数据块的超时时间
+        :return: generator of bytes, stream data  数据块生成器
+        """
+        return stream_reader(self.package_buffer.get, timeout=timeout)
+
+    def request(self, data, timeout=None):
+        """
+        send a request and return at once, the reply is matched by stream id, so
+        many requests can be in flight on one connection  发送请求并立即返回（按流ID匹配应答，可同时发出多个请求）
+        the server answers it with get_request() and reply() of handler  服务端以get_request()和reply()应答
+
+        :param data: bytes, request data  请求数据
+        :param timeout: float or None, seconds to wait for reply before the future fails  应答超时时间
+        :return: Future, result() gives reply data  应答数据的Future
+        """
+
+        future = Future()
+        deadline = None
+        with self.request_lock:
+            stream_id = self.request_id
+            while stream_id in self.requests:  # only after wrapping around
+                stream_id = (stream_id + 1) & STREAM_ID_MAX
+            self.request_id = (stream_id + 1) & STREAM_ID_MAX
+            if timeout is not None:
+                deadline = Deadline(timeout, partial(self._expire_request, stream_id, future, timeout))
+                deadline.start()  # 应答到达时取消
+            self.requests.update({stream_id: (future, deadline)})
+
+        try:
+            sent = self.send(request_message(stream_id, data))
+        except Exception as err:
+            sent = 0
+            self.logger.ERROR("{} failed to send request, {}".format(self.log_header, err))
+        if not sent:
+            self._finish_request(stream_id, exception=Exception("failed to send request"))
+
+        return future
+
+    def _finish_request(self, stream_id, result=None, exception=None, future=None):
+        """
+        settle the future of a request in flight
+
+        :param stream_id: int
+        :param result: bytes, reply data
+        :param exception: Exception or None
+        :param future: Future or None, only settle this one (the id may be reused)
+        :return: None
+        """
+
+        with self.request_lock:
+            entry = self.requests.get(stream_id)
+            if entry is None or (future is not None and entry[0] is not future):
+                return
+            del self.requests[stream_id]
+        future, deadline = entry
+        if deadline is not None:
+            deadline.cancel()
+        if future.done():
+            return
+        try:
+            if exception is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exception)
+        except Exception:
+            pass  # cancelled by user meanwhile
+
+    def _resolve(self, package):
+        """
+        settle the request answered by a reply package
+
+        :param package: bytes, reply package
+        :return: None
+        """
+
+        try:
+            stream_id, data, error = parse_reply(package)
+        except Exception as err:
+            self.logger.WARNING("{} {}".format(self.log_header, err))
+            return
+        if error:
+            self._finish_request(stream_id, exception=Exception("request failed by server, {}".format(
+                data.decode(errors="replace"))))
+        else:
+            self._finish_request(stream_id, result=data)
+
+    def _expire_request(self, stream_id, future, timeout):
+        self._finish_request(stream_id, exception=Exception("request timeout, no reply received in {}s".format(
+            timeout)), future=future)
+
+    def _fail_requests(self, reason):
+        """
+        fail all requests in flight, replies never come after connection lost
+
+        :param reason: str
+        :return: None
+        """
+
+        with self.request_lock:
+            stream_ids = list(self.requests.keys())
+        for stream_id in stream_ids:
+            self._finish_request(stream_id, exception=Exception(reason))
+
+    def register_header(self, header):
+        """
+        index packages with specified header, get(header) takes them without
+        scanning the whole buffer  注册包头部索引，按该头部获取数据包时无需遍历缓冲池
+
+        :param header: bytes, package header  包头部
+        :return: None
+        """
+        self.package_buffer.register(header)
+
     def get(self, header=None, timeout=0):
         """
         get one package with specified header(or not)  从缓冲池中获取数据包（可指定包头部进行筛选）若超时则返回None
@@ -199,91 +317,72 @@ class Client(I2TCPclient):
         :return: bytes, depacked data  解析后的包数据（不含协议层）
         """
 
-        ret = None
-        t = time.time()
-        while ret is None:
-            if len(self.package_buffer) > 0:
-                for i, ele in enumerate(self.package_buffer):
-                    if header is None or ele[:len(header)] == header:
-                        got = self.package_buffer.pop(i)
-                        ret = got
-                        break
+        return self.package_buffer.get(header, timeout=timeout)
+
+    def _watchdog_expired(self):
+        """
+        watchdog timeout on timer wheel, disconnect and reconnect if enabled
 
-            if timeout:
-                time.sleep(0.0001)
-            if timeout == 0 or (time.time() - t) > timeout:
-                break
+        :return: None
+        """
 
-        return ret
+        if not self.live:
+            return
+        self.logger.ERROR("{} [watchdog] server seems not responding, disconnecting...".format(self.log_header))
+        self.reset(kill_threads=False)
+        self._start_reconnect()
 
-    def _watchdog_thread(self):
+    def _start_reconnect(self):
         """
-        watchdog service, keeps connection available
+        start reconnecting service if auto reconnect is enabled and it is not running
 
         :return: None
         """
 
-        if "watchdog" in self.threads.keys() and self.threads["watchdog"]:
+        if not self.__auto_reconnect or self.threads.get("reconnect"):
             return
+        self.threads.update({"reconnect": True})
+        threading.Thread(target=self._reconnect_thread).start()
+
+    def _reconnect_thread(self):
+        """
+        reconnecting service, runs only while connection is lost
+
+        :return: None
+        """
 
-        self.threads.update({"watchdog": True})
-        local_header = "[watchdog]"
-        self.logger.DEBUG("{} {} thread started".format(self.log_header, local_header))
+        self.threads.update({"reconnect": True})
+        local_header = "[reconnect]"
+        self.logger.INFO("{} {} connection lost".format(self.log_header, local_header))
 
         try:
-            tick = 0
-            while self.live:
-                if tick >= 4:
-                    tick = 0
-                    if self.watchdog_waitting > self.watchdog_timeout:
-                        self.logger.ERROR("{} {} server seems not responding, disconnecting...".format(self.log_header,
-                                                                                                       local_header))
-                        self.reset(kill_threads=False)
-
-                if self.clt is None or not self.connected:
-                    self.logger.INFO("{} {} connection lost".format(self.log_header, local_header))
-                    self.reset(kill_threads=False)
-                    if not self.__auto_reconnect:
-                        break
+            disconnected_ts = time.time()
+
+            while self.threads.get("receiver"):
+                time.sleep(0.02)
 
-                    disconnected_ts = time.time()
-
-                    wait = True
-                    while wait:
-                        wait = False
-                        for ele in self.threads:
-                            if self.threads[ele] and ele != "watchdog":
-                                wait = True
-                                break
-                        time.sleep(0.02)
-
-                    cnt = 0
-                    ci = 150
-                    while self.__auto_reconnect:
-                        if ci >= 150:
-                            cnt += 1
-                            self.logger.DEBUG("{} {} trying to reconnect to server, attempt {}".format(
-                                self.log_header, local_header, cnt
-                            ))
-                            ret = self.connect()
-                            if ret:
-                                self.logger.INFO("{} {} server reconnected after {:.1f}s".format(
-                                    self.log_header, local_header, time.time() - disconnected_ts
-                                ))
-                                break
-                            ci = 0
-                        time.sleep(0.1)
-                        ci += 1
-
-                time.sleep(0.5)
-                tick += 1
-                self.watchdog_waitting += 1
+            cnt = 0
+            ci = 150
+            while self.__auto_reconnect and not self.connected:
+                if ci >= 150:
+                    cnt += 1
+                    self.logger.DEBUG("{} {} trying to reconnect to server, attempt {}".format(
+                        self.log_header, local_header, cnt
+                    ))
+                    ret = self.connect()
+                    if ret:
+                        self.logger.INFO("{} {} server reconnected after {:.1f}s".format(
+                            self.log_header, local_header, time.time() - disconnected_ts
+                        ))
+                        break
+                    ci = 0
+                time.sleep(0.1)
+                ci += 1
         except Exception as err:
-            if self.live:
-                self.logger.ERROR("{} {} watchdog error, {}".format(self.log_header, local_header, err))
+            self.logger.ERROR("{} {} reconnect error, {}".format(self.log_header, local_header, err))
 
         self.logger.DEBUG("{} {} thread stopped".format(self.log_header, local_header))
-        self.threads.update({"watchdog": False})
+        self.threads.update({"reconnect": False})
 
     def connect(self, timeout=10, auto_reconnect=None):
         """
@@ -301,15 +400,13 @@ class Client(I2TCPclient):
             self.__auto_reconnect = auto_reconnect
 
         self.reset(kill_threads=False)
+        self.package_buffer.open()
         ret = super(Client, self).connect(timeout=timeout)
         self.connection_timeout = timeout
         if ret:
             threading.Thread(target=self._receiver_thread).start()
-        elif self.__auto_reconnect:
-            self.live = True
-            threading.Thread(target=self._watchdog_thread).start()
-            return self.connected
         else:
+            self._start_reconnect()
             return self.connected
 
         flag = self.get(timeout=self.connection_timeout)
@@ -319,6 +416,7 @@ class Client(I2TCPclient):
             ))
             self.connected = False
             self.reset(kill_threads=False)
+            self._start_reconnect()
             return self.connected
 
         flag = flag.split(b"\a")
@@ -331,6 +429,7 @@ class Client(I2TCPclient):
                 self.logger.ERROR("{} broken rsa key received, {}".format(self.log_header, flag[1]))
                 self.connected = False
                 self.reset(kill_threads=False)
+                self._start_reconnect()
                 return self.connected
 
             try:
@@ -348,6 +447,7 @@ class Client(I2TCPclient):
                 ))
                 self.connected = False
                 self.reset(kill_threads=False)
+                self._start_reconnect()
                 return self.connected
 
             feedback = self.get(timeout=self.connection_timeout)
@@ -357,7 +457,8 @@ class Client(I2TCPclient):
                 ))
                 self.connected = False
                 self.reset(kill_threads=False)
-
+                self._start_reconnect()
+                return self.connected
 
             self.logger.DEBUG("{} secured connection built".format(self.log_header))
             self.flag_secured_connection_built = True
@@ -373,6 +474,7 @@ class Client(I2TCPclient):
             ))
             self.connected = False
             self.reset(kill_threads=False)
+            self._start_reconnect()
 
         return self.connected
 
@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Author: i2cy(i2cy@outlook.com)
+# Project: I2cylib
+# Filename: pool
+# Created on: 2026/10/17
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from .client import Client
+
+
+class I2TCPClientPool:
+
+    def __init__(self, hostname, port=24678, key=b"I2TCPbasicKey", size=4,
+                 watchdog_timeout=15, logger=None, max_buffer_size=100,
+                 checksum="none", connect_timeout=10):
+        """
+        pool of warm I2TCP client connections to one server, authentication and
+        secured session are built once per connection instead of once per request
+        I2TCP客户端连接池（连接保持预热，每个请求无需重新认证和建立安全会话）
+
+        :param hostname: str, server address  服务器地址
+        :param port: int, server port  服务器端口
+        :param key: bytes, dynamic key for authentication  对称动态密钥
+        :param size: int, number of connections kept  连接数
+        :param watchdog_timeout: int, watchdog timeout of every connection  看门狗超时时间
+        :param logger: Logger, log output object  日志器
+        :param max_buffer_size: int, max package buffer size of every connection  最大包缓冲池大小
+        :param checksum: str, preferred payload checksum  负载校验方式
+        :param connect_timeout: int, timeout of connecting  连接超时时间
+        """
+
+        self.hostname = hostname
+        self.port = port
+        self.size = size
+        self.connect_timeout = connect_timeout
+
+        self.clients = [Client(hostname, port=port, key=key, watchdog_timeout=watchdog_timeout,
+                               logger=logger, max_buffer_size=max_buffer_size,
+                               auto_reconnect=True, checksum=checksum)
+                        for _ in range(size)]
+        self.logger = self.clients[0].logger
+        self.log_header = "[I2TCP] [pool] [{}:{}]".format(hostname, port)
+
+        self.idle = deque()  # clients checked in, the longest idle first
+        self.cond = threading.Condition()
+        self.live = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def healthy(self, client):
+        """
+        check a connection without touching the network, it is healthy when
+        connected and its heartbeat (or any traffic) succeeded recently
+        检查连接是否可用（心跳是否正常）
+
+        :param client: Client
+        :return: bool
+        """
+
+        return (client.connected and client.live and not client.threads.get("reconnect") and
+                client.watchdog.idle < client.watchdog_timeout * 0.75)
+
+    def start(self):
+        """
+        connect all connections, those failed keep reconnecting in background
+        连接全部连接（失败的连接在后台自动重连）
+
+        :return: int, number of connections built  成功建立的连接数
+        """
+
+        self.live = True
+        threads = [threading.Thread(target=client.connect, args=(self.connect_timeout,))
+                   for client in self.clients]
+        for thr in threads:
+            thr.start()
+        for thr in threads:
+            thr.join()
+
+        with self.cond:
+            self.idle.extend(self.clients)
+            self.cond.notify_all()
+
+        built = sum(client.connected for client in self.clients)
+        self.logger.INFO("{} {}/{} connection(s) built".format(self.log_header, built, self.size))
+
+        return built
+
+    def checkout(self, timeout=None):
+        """
+        take a healthy connection out of pool, return it by checkin()
+        从连接池中取出一个可用连接（用完后须调用checkin()归还）
+
+        :param timeout: float or None, seconds to wait for one, None for waiting forever
+        :return: Client
+        """
+
+        deadline = None if timeout is None else time.time() + timeout
+        with self.cond:
+            while True:
+                if not self.live:
+                    raise Exception("connection pool closed")
+                for _ in range(len(self.idle)):
+                    client = self.idle.popleft()
+                    if self.healthy(client):
+                        return client
+                    self.idle.append(client)  # still reconnecting, try it later
+
+                wait = 0.1 if self.idle else None  # reconnecting does not notify
+                if deadline is not None:
+                    left = deadline - time.time()
+                    if left <= 0:
+                        raise Exception("no healthy connection in pool within {}s".format(timeout))
+                    wait = left if wait is None else min(wait, left)
+                self.cond.wait(wait)
+
+    def checkin(self, client):
+        """
+        return a connection to pool, packages left in its buffer are dropped
+        归还连接（缓冲区中未读取的数据包将被丢弃）
+
+        :param client: Client, connection taken by checkout()
+        :return: None
+        """
+
+        if not any(client is ele for ele in self.clients):
+            raise Exception("client does not belong to this pool")
+
+        if self.healthy(client):  # a reconnecting client clears it by itself, keep its handshake
+            client.package_buffer.clear()
+        with self.cond:
+            if any(client is ele for ele in self.idle):
+                return
+            self.idle.append(client)
+            self.cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        checkout a connection in with statement, it is checked in at exit
+        以with语句取出连接，退出时自动归还
+
+        :param timeout: float or None, seconds to wait for one
+        :return: context manager of Client
+        """
+
+        client = self.checkout(timeout)
+        try:
+            yield client
+        finally:
+            self.checkin(client)
+
+    def close(self):
+        """
+        close all connections of pool  关闭连接池中的全部连接
+
+        :return: None
+        """
+
+        with self.cond:
+            self.live = False
+            self.idle.clear()
+            self.cond.notify_all()
+
+        threads = [threading.Thread(target=client.reset) for client in self.clients]
+        for thr in threads:
+            thr.start()
+        for thr in threads:
+            thr.join()
+        self.logger.INFO("{} closed".format(self.log_header))
@@ -6,10 +6,7 @@
 # Created on: 2021/9/29
 
 
-import time
 import rsa
-import random
-from hashlib import md5
 from i2cylib.network.i2tcp_basic import I2TCPserver, I2TCPhandler
 from i2cylib.crypto.iccode import Iccode
 
@@ -21,7 +18,7 @@ class Server(I2TCPserver):
 
     def __init__(self, key=b"I2TCPbasicKey", port=24678,
                  max_con=20, logger=None, secured_connection=True,
-                 max_buffer_size=100, watchdog_timeout=15, timeout=20):
+                 max_buffer_size=100, watchdog_timeout=15, timeout=20, checksum=None):
         """
         I2TCP server class  I2TCP服务端类
 
@@ -34,9 +31,14 @@ class Server(I2TCPserver):
         :param max_buffer_size: int, max package buffer size for every handler  包缓冲区最大大小（单位：个）
         :param watchdog_timeout: int, timeout value for watchdogs  看门狗超时时间
         :param timeout: int, timeout value for connection  连接超时时间
+        :param checksum: str or None, preferred payload checksum ("none", "adler32", "crc32" or "md5"),
+        None for "none" in secured session and "crc32" otherwise  负载校验方式（取双方中较强者）
         """
+        if checksum is None:
+            checksum = "none" if secured_connection else "crc32"
+
         super(Server, self).__init__(key=key, port=port, max_con=max_con,
-                                     logger=logger)
+                                     logger=logger, checksum=checksum)
 
         self.version = VERSION.encode()
 
@@ -54,40 +56,18 @@ class Server(I2TCPserver):
             self.private_key = keys[1]
             self.public_key = keys[0]
 
-    def _mainloop_thread(self):
+    def _create_handler(self, con, addr):
         """
-        overwrite server main loop
+        overwrite handler creation  使用带加密层的Handler
 
-        :return: None
+        :param con: socket.socket, accepted connection  已接受的连接
+        :param addr: tuple, address of connection  连接地址
+        :return: Handler
         """
 
-        self.threads.update({"mainloop": True})
-        local_header = "[mainloop]"
-        self.logger.DEBUG("{} {} thread started".format(self.log_header, local_header))
-
-        try:
-            while self.live:
-                con, addr = self.srv.accept()
-                if self.live:
-                    self.logger.INFO("{} new connection {}:{} coming in".format(self.log_header,
-                                                                                addr[0], addr[1]))
-                    handler = Handler(con, addr, self,
-                                      timeout=self.timeout, watchdog_timeout=self.watchdog_timeout,
-                                      buffer_max=self.max_buffer_size)
-                    for i in range(self.max_con):
-                        if self.connections[i] is None:
-                            self.connections.update({i: {"handler": handler,
-                                                         "handled": False}})
-                            break
-                else:
-                    break
-
-        except Exception as err:
-            if self.live:
-                self.logger.ERROR("{} {} mainloop error, {}".format(self.log_header, local_header, err))
-
-        self.logger.DEBUG("{} {} thread stopped".format(self.log_header, local_header))
-        self.threads.update({"mainloop": False})
+        return Handler(con, addr, self,
+                       timeout=self.timeout, watchdog_timeout=self.watchdog_timeout,
+                       buffer_max=self.max_buffer_size)
 
     def start(self, port=None):
         """
@@ -126,71 +106,40 @@ class Handler(I2TCPhandler):
         self.coder_pack = None
         self.coder_depack = None
 
-        self.flag_pack_busy = False
-        self.flag_depack_busy = False
         self.flag_secured_connection_built = False
 
         super(Handler, self).__init__(srv, addr, parent, timeout=timeout,
                                       buffer_max=buffer_max, watchdog_timeout=watchdog_timeout,
                                       temp_dir=temp_dir)
 
-    def _packager(self, data):
+    def _package_heads(self, data):
         """
-        【保留】 pack data with I2TCP format
+        【保留】 split data into I2TCP sub-packages, encrypted in secured session
 
         :param data: bytes
-        :return: List(bytes), packed data
+        :return: List(tuple(bytes, memoryview)), package head and payload view
         """
-        offset = 0
-        paks = []
-        length = len(data)
 
-        if self.flag_secured_connection_built:  # 安全连接加密
+        if self.flag_secured_connection_built:  # 安全连接加密，仅由发送线程调用
             assert isinstance(self.coder_pack, Iccode)
-            while self.flag_pack_busy and self.live:
-                time.sleep(0.001)
-            self.flag_pack_busy = True
             self.coder_pack.reset()
             data = self.coder_pack.encode(data)
-            self.flag_pack_busy = False
-
-        left = length
-        header_unit = self.version + self.keygen.key
-        package_id = bytes((random.randint(0, 255),))
-        while left > 0:
-            pak = b"A" + left.to_bytes(length=3, byteorder='big', signed=False)
-            if left < 32758:
-                left = 0
-            else:
-                left -= 32758
-            pak_length = length - left - offset
-            pak += pak_length.to_bytes(length=2, byteorder='big', signed=False)
-            pak += bytes((md5(pak + header_unit).digest()[2],))
-            payload_sum = md5(data[offset:length - left]).digest()[:2]
-            pak += payload_sum
-            pak += package_id
-            pak += data[offset:length - left]
-            offset = length - left
-            paks.append(pak)
-        return paks
+
+        return super(Handler, self)._package_heads(data)
 
     def _recv(self):
         data = super(Handler, self)._recv()
         local_header = "[receiver]"
 
-        if self.flag_secured_connection_built:  # 安全连接解密
+        if self.coder_depack is not None:  # 安全连接解密，发出CODER READY前即启用
             assert isinstance(self.coder_depack, Iccode)
-            while self.flag_depack_busy and self.live:
-                time.sleep(0.001)
             if data:
-                self.flag_depack_busy = True
                 try:
                     self.coder_depack.reset()
                     data = self.coder_depack.decode(data)
                 except Exception as err:
                     self.logger.ERROR("{} {} failed to depack package {}".format(
                         self.log_header, local_header, err))
-                self.flag_depack_busy = False
 
         return data
 
@@ -220,6 +169,7 @@ class Handler(I2TCPhandler):
             self.coder_depack = Iccode(session_key, fingerprint_level=3)
             self.logger.DEBUG("{} secured connection built".format(self.log_header))
             self.send(b"CODER READY")
+            self.flush()  # 确保明文发出后再启用加密
 
             self.flag_secured_connection_built = True
 
@@ -236,14 +186,17 @@ class Handler(I2TCPhandler):
         """
         super(Handler, self).kill()
 
-    def send(self, data):
+    def send(self, data, copy=False):
         """
         send data to client  向客户端发送数据
 
-        :param data: bytes, data to send (smaller than 16MB) 待发送的数据
-        :return: int, total amount of bytes that has been sent 发送出去的总大小
+        :param data: bytes-like, data to send, bytearray and memoryview are not copied,
+                     do not change them till flush() returns  待发送的数据，可变数据不复制，flush()前勿修改
+        :param copy: bool, send a copy of data that is not bytes  复制非bytes数据
+        :return: int, total package length queued, call flush() to wait for it to be sent
+                 已排队的总大小，发送完成需调用flush()等待
         """
-        return super(Handler, self).send(data)
+        return super(Handler, self).send(data, copy=copy)
 
     def get(self, header=None, timeout=0):
         """
@@ -254,19 +207,4 @@ class Handler(I2TCPhandler):
         :return: bytes, depacked data  解包后的数据
         """
 
-        ret = None
-        t = time.time()
-        while ret is None:
-            if len(self.package_buffer) > 0:
-                for i, ele in enumerate(self.package_buffer):
-                    if header is None or ele[:len(header)] == header:
-                        got = self.package_buffer.pop(i)
-                        ret = got
-                        break
-
-            if timeout:
-                time.sleep(0.0001)
-            if timeout == 0 or (time.time() - t) > timeout:
-                break
-
-        return ret
+        return self.package_buffer.get(header, timeout=timeout)
@@ -5,4 +5,15 @@
 # Created on: 2021/3/6
 
 from .base_server import *
-from .base_client import *
\ No newline at end of file
+from .base_client import *
+from .decoder import *
+from .sender import *
+from .inbox import *
+from .stream import *
+from .rpc import *
+from .timer import *
+from .negotiation import *
+from .codec import *
+from .selector_server import *
+from .async_server import *
+from .async_client import *
\ No newline at end of file
@@ -0,0 +1,270 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Author: i2cy(i2cy@outlook.com)
+# Project: I2cylib
+# Filename: async_base
+# Created on: 2026/10/17
+
+import asyncio
+from collections import deque
+from .decoder import HEAD_LENGTHS
+from .codec import I2TCPcodec
+from .negotiation import DEFAULT_FRAME_SIZE, DEFAULT_MAX_MESSAGE, OFFER_MAGIC, DEFAULT_CHECKSUM
+
+
+class AsyncI2TCPbase(I2TCPcodec):
+
+    def __init__(self, keygen, logger, version, timeout=10, buffer_max=256,
+                 frame_size=DEFAULT_FRAME_SIZE, checksum=DEFAULT_CHECKSUM,
+                 max_message=DEFAULT_MAX_MESSAGE):
+        """
+        common I2TCP packaging, receiving and package buffer of asyncio
+        client and server handler
+
+        :param keygen: DynKey, dynamic key generator (key used in header sum)
+        :param logger: Logger, log output object
+        :param version: bytes, protocol version
+        :param timeout: int, timeout for handshake reading
+        :param buffer_max: int, max packages in buffer
+        :param frame_size: int, max package length offered to peer
+        :param checksum: str, preferred payload checksum of revision 2 packages
+        :param max_message: int, max length of one message accepted
+        """
+
+        self.reader = None
+        self.writer = None
+        self.keygen = keygen
+        self.logger = logger
+        self.version = version
+        self.timeout = timeout
+        self.live = False
+
+        self.frame_size = frame_size
+        self.checksum = checksum
+        self.max_message = max_message
+        self._reset_codec()
+
+        self.log_header = "[I2TCP]"
+
+        self.buffer_max = buffer_max
+        self.package_buffer = deque()
+        self.last_active = 0
+        self.last_sent = 0
+
+        self.__waiters = []
+
+    def _feed_watchdog(self):
+        """
+        reset the timer of watchdog to keep watchdog from timeout
+
+        :return: None
+        """
+
+        self.last_active = asyncio.get_running_loop().time()
+
+    async def _read(self, length):
+        """
+        read exactly length bytes within handshake timeout
+
+        :param length: int
+        :return: bytes
+        """
+
+        return await asyncio.wait_for(self.reader.readexactly(length), self.timeout)
+
+    async def _read_head(self):
+        """
+        read a 10 bytes package head, skip bytes till a valid package type
+        is found
+
+        :return: bytes, package head
+        """
+
+        while True:
+            pak = await self.reader.readexactly(1)
+            if pak[0] == 78:  # "N", negotiation offer
+                await self._read_offer()
+            elif pak[0] in HEAD_LENGTHS:
+                return pak + await self.reader.readexactly(HEAD_LENGTHS[pak[0]] - 1)
+
+    async def _read_offer(self):
+        """
+        read the rest of negotiation offer after its type byte
+
+        :return: None
+        """
+
+        if await self.reader.readexactly(len(OFFER_MAGIC) - 1) != OFFER_MAGIC[1:]:
+            return
+        length = (await self.reader.readexactly(1))[0]
+        fields = await self.reader.readexactly(length)
+        self.logger.DEBUG("{} negotiation offer received: {}".format(self.log_header, fields))
+        self._negotiate(fields)
+
+    async def _read_payload(self, ret):
+        """
+        read and verify payload of one sub-package
+
+        :param ret: dict, depacked head
+        :return: bytes, payload
+        """
+
+        if ret["package_length"] > max(self.frame_size, 65535):
+            raise Exception("broken package")
+        data = await self.reader.readexactly(ret["package_length"])
+        if ret["checksum"] is not None and ret["checksum"](data) != ret["payload_sum"]:
+            self.logger.WARNING("{} broken package received".format(self.log_header))
+            raise Exception("broken package")
+
+        return data
+
+    async def _recv(self):
+        """
+        receive raw data from connection and depack it till a whole
+        package is received
+
+        :return: bytes, depacked data
+        """
+
+        ret = None
+        while ret is None:
+            pak = await self._read_head()
+            self.logger.DEBUG("{} received package head: {}".format(self.log_header, pak))
+            ret = self._depacker(pak)
+            if ret is None:
+                self.logger.WARNING("{} broken package received".format(self.log_header))
+            if ret == "heartbeat":
+                self.logger.DEBUG("{} heartbeat received".format(self.log_header))
+                self._feed_watchdog()
+                ret = None
+
+        total_length = ret["total_length"]
+        package_id = ret["package_id"]
+        if total_length > self.max_message:
+            self.logger.WARNING("{} message of {} bytes exceeds limit {}, dropped".format(
+                self.log_header, total_length, self.max_message))
+            raise Exception("broken package")
+        self.logger.DEBUG("{} receiving data of total length {}".format(self.log_header,
+                                                                        total_length))
+
+        all_data = bytearray(await self._read_payload(ret))
+
+        while len(all_data) < total_length:
+            ret = self._depacker(await self._read_head())
+            if ret == "heartbeat":
+                self.logger.DEBUG("{} heartbeat received".format(self.log_header))
+                self._feed_watchdog()
+                continue
+            if ret is None or package_id != ret["package_id"] or \
+                    total_length - len(all_data) != ret["total_length"]:
+                raise Exception("broken package")
+            all_data += await self._read_payload(ret)
+
+        if len(all_data) != total_length:
+            raise Exception("broken package")
+
+        self._feed_watchdog()
+        return bytes(all_data)
+
+    def _put_package(self, pak):
+        """
+        hand received package to the earliest waiting get() with matching
+        header, or move it to buffer (the oldest one is dropped when
+        buffer overflowed)
+
+        :param pak: bytes
+        :return: None
+        """
+
+        for i, (header, future) in enumerate(self.__waiters):
+            if future.done():
+                continue
+            if header is None or pak[:len(header)] == header:
+                del self.__waiters[i]
+                future.set_result(pak)
+                return
+
+        if len(self.package_buffer) >= self.buffer_max:
+            self.logger.WARNING("{} package buffer overflowed, the oldest package dropped".format(
+                self.log_header))
+            self.package_buffer.popleft()
+        self.package_buffer.append(pak)
+
+    def _wake_waiters(self):
+        """
+        wake up every waiting get() with None, called when connection closed
+
+        :return: None
+        """
+
+        waiters = self.__waiters
+        self.__waiters = []
+        for header, future in waiters:
+            if not future.done():
+                future.set_result(None)
+
+    async def send(self, data):
+        """
+        send data with I2TCP format to peer
+
+        :param data: bytes, regular data
+        :return: int, total package length (include header)
+        """
+
+        if not self.live or self.writer is None:
+            raise Exception("no connection built yet")
+
+        packs = self._package_heads(data)
+        sent = 0
+
+        try:
+            for pak, payload in packs:
+                self.writer.write(pak)
+                self.writer.write(payload)
+                sent += len(pak) + len(payload)
+            self._feed_watchdog()
+            self.last_sent = self.last_active
+            await self.writer.drain()
+        except Exception as err:
+            if self.live:
+                self.logger.ERROR("{} failed to send data, {}".format(self.log_header, err))
+
+        return sent
+
+    async def get(self, header=None, timeout=0):
+        """
+        get one package with specified header(or not), waits on a future
+        instead of polling
+
+        :param header: bytes, package header, leave it None to get any package
+        :param timeout: int, 0 for no waiting, None for waiting forever
+        :return: bytes, depacked data (None if timeout or connection closed)
+        """
+
+        for i, ele in enumerate(self.package_buffer):
+            if header is None or ele[:len(header)] == header:
+                del self.package_buffer[i]
+                return ele
+
+        if timeout == 0 or not self.live:
+            return None
+
+        waiter = (header, asyncio.get_running_loop().create_future())
+        self.__waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if waiter in self.__waiters:
+                self.__waiters.remove(waiter)
+
+    async def recv(self, timeout=0):
+        """
+        receive a whole package from peer
+
+        :param timeout: int (default: 0), 0 for no waiting, None for waiting forever
+        :return: bytes, depacked data
+        """
+
+        return await self.get(timeout=timeout)
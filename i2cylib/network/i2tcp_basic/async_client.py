@@ -0,0 +1,286 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Author: i2cy(i2cy@outlook.com)
+# Project: I2cylib
+# Filename: async_client
+# Created on: 2026/10/17
+
+import asyncio
+import time
+import uuid
+from hashlib import md5, sha256
+from i2cylib.crypto.keygen import DynKey, DynKey16
+from i2cylib.crypto.iccode import Iccode
+from i2cylib.utils.logger import Logger
+from .base_client import VERSION
+from .async_base import AsyncI2TCPbase
+from .negotiation import DEFAULT_FRAME_SIZE, DEFAULT_MAX_MESSAGE, DEFAULT_CHECKSUM, \
+    build_offer, parse_reject
+
+
+class AsyncI2TCPclient(AsyncI2TCPbase):
+
+    def __init__(self, hostname, port=27631, key=b"basic", watchdog_timeout=15,
+                 logger=None, max_buffer_size=100, auto_reconnect=False,
+                 reconnect_interval=15, frame_size=DEFAULT_FRAME_SIZE,
+                 checksum=DEFAULT_CHECKSUM, max_message=DEFAULT_MAX_MESSAGE):
+        """
+        asyncio I2TCP client class, speaks the same protocol as I2TCPclient
+        with awaitable send/get
+
+        :param hostname: str, server address
+        :param port: int, server port
+        :param key: bytes, dynamic key for authentication
+        :param watchdog_timeout: int, heartbeat is sent after half of this
+                                 many seconds without sending anything
+        :param logger: Logger, client log output object
+        :param max_buffer_size: int, max package buffer size
+        :param auto_reconnect: bool, reconnect when connection lost unexpectedly
+        :param reconnect_interval: int, seconds between reconnect attempts
+        :param frame_size: int, max package length offered to server
+        :param checksum: str, preferred payload checksum ("none", "adler32",
+                         "crc32" or "md5"), the stronger one of both sides is used
+        :param max_message: int, max length of one message accepted
+        """
+
+        if not isinstance(logger, Logger):
+            logger = Logger()
+
+        super(AsyncI2TCPclient, self).__init__(DynKey(key), logger, VERSION.encode(),
+                                               buffer_max=max_buffer_size, frame_size=frame_size,
+                                               checksum=checksum, max_message=max_message)
+
+        self.address = (hostname, port)
+        self.keygen_preAuth = DynKey16(md5(key).digest())
+        self.key = key
+
+        self.mac_id = uuid.uuid1().bytes
+
+        self.watchdog_timeout = watchdog_timeout
+        self.auto_reconnect = auto_reconnect
+        self.reconnect_interval = reconnect_interval
+        self.connected = False
+
+        self.tasks = []
+        self.__reconnect_task = None
+
+    async def _auth(self):
+        """
+        authentication sequence, raises exception when failed
+
+        :return: None
+        """
+
+        pre_auth_key = self.keygen_preAuth.keygen()
+        self.writer.write(pre_auth_key)
+        await self.writer.drain()
+        self.logger.DEBUG("{} pre-auth dynkey sent: {}".format(self.log_header, pre_auth_key))
+
+        try:
+            rand_num = await self._read(64)
+        except asyncio.TimeoutError:
+            raise Exception("timeout while receiving random data from server")
+        reason = parse_reject(rand_num)
+        if reason is not None:
+            raise Exception("connection rejected by server, {}".format(reason))
+        self.logger.DEBUG("{} 64-bit random key received: {}".format(self.log_header, rand_num))
+
+        key_sha256 = sha256()
+        key_sha256.update(self.key)
+        mix_sha256 = sha256()
+        mix_sha256.update(key_sha256.digest() + rand_num)
+        mix_coder = Iccode(mix_sha256.digest(), fingerprint_level=6)
+        dynamic_key = mix_coder.encode(self.keygen.keygen())
+
+        self.writer.write(dynamic_key)
+        await self.writer.drain()
+        try:
+            feedback = await self._read(len(self.version))
+        except asyncio.IncompleteReadError as err:
+            feedback = err.partial
+        if feedback != self.version:
+            raise Exception("invalid key or invalid server, feedback: {}".format(feedback))
+        self._reset_codec()
+        self.writer.write(b"OK" + build_offer(self.frame_size, self.checksum))
+        await self.writer.drain()
+
+    async def _post_connect(self):
+        """
+        hook after authentication, overwrite this to build upper layer
+        session before connect() returns
+
+        :return: bool, session status
+        """
+
+        return True
+
+    def _close_connection(self):
+        """
+        close socket and stop receiver and heartbeat
+
+        :return: None
+        """
+
+        self.live = False
+        self.connected = False
+        if self.writer is not None:
+            try:
+                self.writer.close()
+            except Exception:
+                pass
+        current = asyncio.current_task()
+        for task in self.tasks:
+            if task is not current:
+                task.cancel()
+        self.tasks = []
+        self.reader = None
+        self.writer = None
+        self._wake_waiters()
+
+    def _connection_lost(self):
+        """
+        handle unexpected disconnection, reconnects if auto_reconnect is on
+
+        :return: None
+        """
+
+        if not self.connected:
+            return
+        self.logger.INFO("{} connection lost".format(self.log_header))
+        self._close_connection()
+        if self.auto_reconnect and self.__reconnect_task is None:
+            self.__reconnect_task = asyncio.ensure_future(self._reconnect_task())
+
+    async def _reconnect_task(self):
+        """
+        reconnect to server every reconnect_interval seconds till connected
+
+        :return: None
+        """
+
+        local_header = "[reconnect]"
+        disconnected_ts = time.time()
+        cnt = 0
+        try:
+            while self.auto_reconnect and not self.connected:
+                cnt += 1
+                self.logger.DEBUG("{} {} trying to reconnect to server, attempt {}".format(
+                    self.log_header, local_header, cnt))
+                if await self.connect(timeout=self.timeout):
+                    self.logger.INFO("{} {} server reconnected after {:.1f}s".format(
+                        self.log_header, local_header, time.time() - disconnected_ts))
+                    break
+                await asyncio.sleep(self.reconnect_interval)
+        finally:
+            self.__reconnect_task = None
+
+    async def _receiver_task(self):
+        """
+        receiving packages from server and move it to buffer
+
+        :return: None
+        """
+
+        local_header = "[receiver]"
+        self.logger.DEBUG("{} {} task started".format(self.log_header, local_header))
+
+        try:
+            while self.live:
+                try:
+                    pak = await self._recv()
+                except (asyncio.IncompleteReadError, ConnectionError, OSError):
+                    self._connection_lost()
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as err:
+                    if self.live:
+                        self.logger.ERROR("{} {} failed to receive message, {}".format(
+                            self.log_header, local_header, err))
+                    continue
+
+                self._put_package(pak)
+        finally:
+            self.logger.DEBUG("{} {} task stopped".format(self.log_header, local_header))
+
+    async def _heartbeat_task(self):
+        """
+        heartbeat service, keeps connection alive when nothing has been
+        sent for half of watchdog timeout
+
+        :return: None
+        """
+
+        local_header = "[heartbeat]"
+        loop = asyncio.get_running_loop()
+        while self.live:
+            left = self.last_sent + self.watchdog_timeout / 2 - loop.time()
+            if left > 0:
+                await asyncio.sleep(left)
+                continue
+            try:
+                self.writer.write(b"Heartbeat_")
+                await self.writer.drain()
+                self.last_sent = loop.time()
+                self.logger.DEBUG("{} {} heartbeat sent".format(self.log_header, local_header))
+            except Exception as err:
+                self.logger.WARNING("{} {} failed to send heartbeat, {}".format(self.log_header,
+                                                                                local_header, err))
+                self._connection_lost()
+                break
+
+    async def connect(self, timeout=10):
+        """
+        connect to server
+
+        :param timeout: int, connection timeout
+        :return: bool, connection status
+        """
+
+        if self.connected:
+            return self.connected
+
+        self.timeout = timeout
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.address[0], self.address[1]), timeout)
+        except Exception as err:
+            self.logger.ERROR("{} failed to connect to server, {}".format(self.log_header, err))
+            return self.connected
+
+        try:
+            await self._auth()
+        except Exception as err:
+            self.logger.ERROR("{} failed to auth, {}".format(self.log_header, err))
+            self._close_connection()
+            return self.connected
+
+        self.live = True
+        self.connected = True
+        self._feed_watchdog()
+        self.last_sent = self.last_active
+        self.tasks = [asyncio.ensure_future(self._receiver_task()),
+                      asyncio.ensure_future(self._heartbeat_task())]
+
+        if not await self._post_connect():
+            self._close_connection()
+            return self.connected
+
+        self.logger.INFO("{} server {}:{} connected".format(self.log_header,
+                                                            self.address[0],
+                                                            self.address[1]))
+
+        return self.connected
+
+    async def reset(self):
+        """
+        reset connection status (close the connection), stops auto reconnecting
+
+        :return: None
+        """
+
+        if self.__reconnect_task is not None and self.__reconnect_task is not asyncio.current_task():
+            self.__reconnect_task.cancel()
+            self.__reconnect_task = None
+        self._close_connection()
+        self.package_buffer.clear()
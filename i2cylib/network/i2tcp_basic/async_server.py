@@ -0,0 +1,420 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Author: i2cy(i2cy@outlook.com)
+# Project: I2cylib
+# Filename: async_server
+# Created on: 2026/10/17
+
+import asyncio
+import uuid
+from hashlib import md5, sha256
+from i2cylib.crypto.keygen import DynKey, DynKey16Ring
+from i2cylib.crypto.iccode import Iccode
+from i2cylib.utils.logger import Logger
+from i2cylib.utils.bytes import random_keygen
+from .base_server import VERSION
+from .async_base import AsyncI2TCPbase
+from .negotiation import DEFAULT_FRAME_SIZE, DEFAULT_MAX_MESSAGE, DEFAULT_CHECKSUM, build_offer, build_reject
+
+
+class AsyncI2TCPserver:
+
+    def __init__(self, key=b"basic", port=27631, max_con=4096, logger=None,
+                 timeout=10, watchdog_timeout=15, buffer_max=256, handler_callback=None,
+                 frame_size=DEFAULT_FRAME_SIZE, checksum=DEFAULT_CHECKSUM,
+                 max_message=DEFAULT_MAX_MESSAGE):
+        """
+        asyncio I2TCP server class, speaks the same protocol as I2TCPserver
+        while all connections are served by one event loop
+
+        :param key: bytes, dynamic key for authentication
+        :param port: int, server port that to be bond
+        :param max_con: int, max TCP connection(s) that allowed
+                        to be accept at the same time
+        :param logger: Logger, server log output object
+        :param timeout: int, timeout for authentication
+        :param watchdog_timeout: int, disconnect client after this many
+                                 seconds without any package or heartbeat
+        :param buffer_max: int, package buffer size for every handler
+        :param handler_callback: coroutine function or None, called with every
+                                 authorized AsyncI2TCPhandler, connections not
+                                 handled by callback can be got by get_connection
+        :param frame_size: int, max package length offered to clients
+        :param checksum: str, preferred payload checksum ("none", "adler32",
+                         "crc32" or "md5"), the stronger one of both sides is used
+        :param max_message: int, max length of one message accepted
+        """
+
+        self.port = port
+        self.srv = None
+        self.keygen = DynKey(key)
+        self.keygen_preAuth = DynKey16Ring(md5(key).digest(), auto_start=False)
+        self.key = key
+        self.max_con = max_con
+        self.timeout = timeout
+        self.watchdog_timeout = watchdog_timeout
+        self.buffer_max = buffer_max
+        self.handler_callback = handler_callback
+        self.frame_size = frame_size
+        self.checksum = checksum
+        self.max_message = max_message
+
+        if not isinstance(logger, Logger):
+            logger = Logger()
+
+        self.logger = logger
+        self.log_header = "[I2TCP]"
+        self.version = VERSION.encode()
+
+        self.connections = set()
+        self.pending = None
+
+        self.live = False
+
+    def _create_handler(self, reader, writer, addr):
+        """
+        create connection handler, overwrite this to use a subclass of
+        AsyncI2TCPhandler
+
+        :return: AsyncI2TCPhandler
+        """
+
+        return AsyncI2TCPhandler(reader, writer, addr, self, timeout=self.timeout,
+                                 buffer_max=self.buffer_max,
+                                 watchdog_timeout=self.watchdog_timeout)
+
+    async def _on_connection(self, reader, writer):
+        """
+        incoming connection callback of asyncio server
+
+        :return: None
+        """
+
+        addr = writer.get_extra_info("peername")[:2]
+        if not self.live:
+            writer.close()
+            return
+        if len(self.connections) >= self.max_con:
+            self.logger.WARNING("{} connection {}:{} refused, max connection(s) reached".format(
+                self.log_header, addr[0], addr[1]))
+            try:
+                writer.write(build_reject("max connection(s) reached"))
+                writer.write_eof()
+                await asyncio.wait_for(reader.read(), 1)  # drain pre-auth key before closing
+            except Exception:
+                pass
+            writer.close()
+            return
+
+        self.logger.INFO("{} new connection {}:{} coming in".format(self.log_header, addr[0], addr[1]))
+        handler = self._create_handler(reader, writer, addr)
+        self.connections.add(handler)
+
+        try:
+            if await handler.start():
+                if self.handler_callback is None:
+                    await self.pending.put(handler)
+                else:
+                    await self.handler_callback(handler)
+                await handler.wait_closed()
+        except Exception as err:
+            self.logger.ERROR("{} connection handler error, {}".format(handler.log_header, err))
+        finally:
+            handler.kill()
+            self.connections.discard(handler)
+
+    async def start(self, port=None):
+        """
+        start I2TCP server
+
+        :param port: int (default self.port), port to be bond
+        :return: None
+        """
+
+        if port is None:
+            port = self.port
+        else:
+            self.port = port
+
+        self.pending = asyncio.Queue()
+        self.srv = await asyncio.start_server(self._on_connection, "0.0.0.0", port,
+                                              backlog=min(self.max_con, 4096))
+        self.live = True
+        self.keygen_preAuth.start()
+
+        self.logger.INFO("{} server started at 0.0.0.0:{}".format(self.log_header, self.port))
+
+    async def serve_forever(self):
+        """
+        run server until it is killed
+
+        :return: None
+        """
+
+        if not self.live:
+            await self.start()
+        await self.srv.serve_forever()
+
+    async def kill(self):
+        """
+        stop the server and kill all connection(s)
+
+        :return: None
+        """
+
+        self.live = False
+        self.keygen_preAuth.stop()
+        if self.srv is not None:
+            self.srv.close()
+            await self.srv.wait_closed()
+            self.srv = None
+
+        connections = list(self.connections)
+        for handler in connections:
+            handler.kill()
+        for handler in connections:
+            await handler.wait_closed()
+        self.connections.clear()
+
+        self.logger.INFO("{} server killed".format(self.log_header))
+
+    async def get_connection(self, wait=False):
+        """
+        get the latest connected connection that yet to be
+        handled
+
+        :param wait: bool, wait until a connection comes in
+        :return: AsyncI2TCPhandler, connection handler
+        """
+
+        while self.live:
+            if wait:
+                handler = await self.pending.get()
+            elif self.pending.empty():
+                return None
+            else:
+                handler = self.pending.get_nowait()
+            if handler.live:
+                return handler
+            self.connections.discard(handler)
+
+        return None
+
+
+class AsyncI2TCPhandler(AsyncI2TCPbase):
+
+    def __init__(self, reader, writer, addr, parent, timeout=10,
+                 buffer_max=256, watchdog_timeout=15):
+        """
+        asyncio I2TCP connection handler
+
+        :param reader: asyncio.StreamReader
+        :param writer: asyncio.StreamWriter
+        :param addr: tuple, incoming connection address
+        :param parent: AsyncI2TCPserver, father object
+        :param timeout (default: 10): int, timeout for authentication
+        :param buffer_max (default: 256): int, max packages in buffer
+        :param watchdog_timeout (default 15): int, seconds without
+                                              any package before disconnecting
+        """
+
+        super(AsyncI2TCPhandler, self).__init__(parent.keygen, parent.logger, parent.version,
+                                                timeout=timeout, buffer_max=buffer_max,
+                                                frame_size=parent.frame_size,
+                                                checksum=parent.checksum,
+                                                max_message=parent.max_message)
+
+        self.addr = addr
+        self.reader = reader
+        self.writer = writer
+        self.keygen_preAuth = parent.keygen_preAuth
+        self.live = True
+
+        self.log_header = "[I2TCP] [{}:{}]".format(self.addr[0], self.addr[1])
+
+        self.watchdog_timeout = watchdog_timeout
+
+        assert isinstance(parent, AsyncI2TCPserver)
+        self.parent = parent
+
+        self.mac_id = uuid.UUID(int=uuid.getnode()).bytes[-6:]
+
+        self.tasks = []
+        self.__closed = asyncio.Event()
+
+    async def _auth(self):
+        """
+        authentication sequence for incoming connection
+
+        :return: bool, authentication status
+        """
+
+        self.logger.DEBUG("{} connected".format(self.log_header))
+        ret = False
+
+        try:
+            # pre-auth
+            dynamic_key = await self._read(16)
+
+            if self.keygen_preAuth.keymatch(dynamic_key):
+                self.logger.DEBUG("{} pre-authorized".format(self.log_header))
+            else:
+                raise Exception("pre-auth failed, pre-auth key received: {}".format(dynamic_key))
+
+            # basic-auth
+            rand_num = random_keygen(64)
+            self.writer.write(rand_num)
+            await self.writer.drain()
+            self.logger.DEBUG("{} random seed sent, {}".format(self.log_header, rand_num))
+
+            key_sha256 = sha256()
+            key_sha256.update(self.parent.key)
+            mix_sha256 = sha256()
+            mix_sha256.update(key_sha256.digest() + rand_num)
+            mix_coder = Iccode(mix_sha256.digest(), fingerprint_level=6)
+
+            dynamic_key = await self._read(64)
+            self.logger.DEBUG("{} dynamic key received".format(self.log_header))
+
+            dynamic_key = mix_coder.decode(dynamic_key)
+
+            if self.keygen.keymatch(dynamic_key):
+                ret = True
+                self.writer.write(self.version)
+                await self.writer.drain()
+                self.logger.DEBUG("{} authorized".format(self.log_header))
+            else:
+                raise Exception("unauthorized connection, key received: {}".format(dynamic_key))
+
+            feedback = await self._read(2)
+            if feedback != b"OK":
+                raise Exception("invalid feedback, {}".format(feedback))
+
+            self.writer.write(build_offer(self.frame_size, self.checksum))
+            await self.writer.drain()
+
+        except asyncio.IncompleteReadError:
+            self.logger.DEBUG("{} connection lost".format(self.log_header))
+            ret = False
+        except asyncio.TimeoutError:
+            self.logger.WARNING("{} authentication process failure, timeout".format(self.log_header))
+            ret = False
+        except Exception as err:
+            self.logger.WARNING("{} authentication process failure, {}".format(self.log_header, err))
+            ret = False
+
+        return ret
+
+    async def _receiver_task(self):
+        """
+        data receiving service, receive I2TCP package from client
+        and move it to buffer with depacked data
+
+        :return: None
+        """
+
+        local_header = "[receiver]"
+        self.logger.DEBUG("{} {} task started".format(self.log_header, local_header))
+
+        try:
+            while self.live:
+                try:
+                    pak = await self._recv()
+                except asyncio.IncompleteReadError:
+                    self.logger.INFO("{} {} connection lost".format(self.log_header, local_header))
+                    break
+                except (ConnectionError, OSError) as err:
+                    if self.live:
+                        self.logger.INFO("{} {} connection lost, {}".format(self.log_header, local_header, err))
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as err:
+                    if not self.live:
+                        break
+                    self.logger.ERROR("{} {} failed to receive data from client, {}".format(self.log_header,
+                                                                                            local_header,
+                                                                                            err))
+                    continue
+
+                if pak is not None:
+                    self._put_package(pak)
+                    self.logger.DEBUG("{} {} new package received, buffer size now {}".format(
+                        self.log_header, local_header, len(self.package_buffer)))
+        finally:
+            self.logger.DEBUG("{} {} task stopped".format(self.log_header, local_header))
+            self.kill()
+
+    async def _watchdog_task(self):
+        """
+        handler watchdog, kills connection when client is not responding
+
+        :return: None
+        """
+
+        loop = asyncio.get_running_loop()
+        while self.live:
+            left = self.last_active + self.watchdog_timeout - loop.time()
+            if left <= 0:
+                self.logger.ERROR("{} [watchdog] client seems not responding, disconnecting...".format(
+                    self.log_header))
+                self.kill()
+                break
+            await asyncio.sleep(left)
+
+    async def start(self):
+        """
+        authorize connection and start receiver and watchdog
+
+        :return: bool, authentication status
+        """
+
+        if not await self._auth():
+            self.kill()
+            return False
+
+        self._feed_watchdog()
+        self.tasks = [asyncio.ensure_future(self._receiver_task()),
+                      asyncio.ensure_future(self._watchdog_task())]
+
+        return await self._post_auth()
+
+    async def _post_auth(self):
+        """
+        hook after authentication, overwrite this to build upper layer
+        session before connection is handed out
+
+        :return: bool, session status
+        """
+
+        return True
+
+    def kill(self):
+        """
+        kill this connection
+
+        :return: None
+        """
+
+        if not self.live and self.__closed.is_set():
+            return
+        self.live = False
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+        current = asyncio.current_task()
+        for task in self.tasks:
+            if task is not current:
+                task.cancel()
+        self._wake_waiters()
+        self.__closed.set()
+
+    async def wait_closed(self):
+        """
+        wait until this connection is killed
+
+        :return: None
+        """
+
+        await self.__closed.wait()
@@ -8,19 +8,26 @@ import socket
 import threading
 import time
 import uuid
-import random
 from hashlib import md5, sha256
 from i2cylib.crypto.keygen import DynKey, DynKey16
 from i2cylib.crypto.iccode import Iccode
 from i2cylib.utils.logger import Logger
+from .decoder import I2TCPdecoder
+from .sender import sendmsg_all
+from .stream import STREAM_CHUNK_SIZE, stream_messages
+from .timer import WHEEL_TICK, Deadline
+from .codec import I2TCPcodec
+from .negotiation import DEFAULT_FRAME_SIZE, DEFAULT_MAX_MESSAGE, DEFAULT_CHECKSUM, build_offer, parse_reject
 
 VERSION = "1.5"
+_MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0)
 
 
-class I2TCPclient:
+class I2TCPclient(I2TCPcodec):
 
     def __init__(self, hostname, port=27631, key=b"basic",
-                 watchdog_timeout=15, logger=None):
+                 watchdog_timeout=15, logger=None, frame_size=DEFAULT_FRAME_SIZE,
+                 checksum=DEFAULT_CHECKSUM, max_message=DEFAULT_MAX_MESSAGE):
         """
         I2TCPclient Class
 
@@ -29,9 +36,22 @@ class I2TCPclient:
         :param key: bytes, dynamic key for authentication
         :param watchdog_timeout: int, watchdog timeout
         :param logger: Logger, client log output object
+        :param frame_size: int, max package length offered to server, used
+                           only when server supports protocol revision 2
+        :param checksum: str, preferred payload checksum ("none", "adler32",
+                         "crc32" or "md5") of revision 2 packages, the
+                         stronger one of both sides is used
+        :param max_message: int, max length of one message accepted, larger
+                            ones are dropped as broken before any memory
+                            is allocated for them
         """
         self.address = (hostname, port)
         self.clt = None
+        self.frame_size = frame_size
+        self.checksum = checksum
+        self.max_message = max_message
+        self._reset_codec()
+        self.decoder = None
         self.keygen = DynKey(key)
         self.keygen_preAuth = DynKey16(md5(key).digest())
         self.key = key
@@ -43,145 +63,66 @@ class I2TCPclient:
 
         self.logger = logger
         self.version = VERSION.encode()
-        self.busy = False
+        self.send_lock = threading.Lock()
 
         self.mac_id = uuid.uuid1().bytes  # 16位客户端UUID
 
-        self.watchdog_waitting = 0
-        self.watchdog_timeout = watchdog_timeout * 2
-        self.threads = {"heartbeat": False,
-                        "watchdog": False}
+        self.watchdog_timeout = watchdog_timeout
+        self.watchdog = Deadline(watchdog_timeout, self._watchdog_expired)
+        self.heartbeat = Deadline(watchdog_timeout / 2, self._heartbeat)
+        self.heartbeat_left = b""  # unsent tail of heartbeat, goes out before the next message
+        self.threads = {}
         self.connected = False
 
-    def _packager(self, data):
+    def _heartbeat(self):
         """
-        pack data with I2TCP format
-
-        :param data: bytes
-        :return: List(bytes), packed data
-        """
-
-        offset = 0
-        paks = []
-        length = len(data)
-        left = length
-        header_unit = self.version + self.keygen.key
-        package_id = bytes((random.randint(0, 255),))
-        while left > 0:
-            pak = b"A" + left.to_bytes(length=3, byteorder='big', signed=False)
-            if left < 32758:
-                left = 0
-            else:
-                left -= 32758
-            pak_length = length - left - offset
-            pak += pak_length.to_bytes(length=2, byteorder='big', signed=False)
-            pak += bytes((md5(pak + header_unit).digest()[2],))
-            payload_sum = md5(data[offset:length - left]).digest()[:2]
-            pak += payload_sum
-            pak += package_id
-            pak += data[offset:length - left]
-            offset = length - left
-            paks.append(pak)
-        return paks
-
-    def _depacker(self, pak_data):
-        """
-        depack packed data to normal data format
-
-        :param pak_data: bytes, packed data
-        :return: bytes, data
-        """
-
-        header_unit = self.version + self.keygen.key
-        pak_type = pak_data[0]
-
-        if pak_type == ord("H"):
-            ret = "heartbeat"
-        elif pak_type == ord("A"):
-            ret = {"total_length": int.from_bytes(pak_data[1:4], byteorder='big', signed=False),
-                   "package_length": int.from_bytes(pak_data[4:6], byteorder='big', signed=False),
-                   "header_sum": pak_data[6],
-                   "payload_sum": pak_data[7:9],
-                   "package_id": pak_data[9],
-                   "data": pak_data[10:]}
-            header_sum = md5(pak_data[0:6] + header_unit).digest()[2]
-            if header_sum != ret["header_sum"]:
-                ret = None
-        else:
-            ret = None
-        return ret
-
-    def _heartbeat_thread(self):
-        """
-        watchdog heartbeat service, this keeps connection alive
+        heartbeat service on timer wheel, sends heartbeat when nothing has
+        been sent or received for half of watchdog timeout
 
         :return: None
         """
 
-        self.threads.update({"heartbeat": True})
         local_header = "[heartbeat]"
-        self.logger.DEBUG("{} {} thread started".format(self.log_header, local_header))
-
-        try:
-            tick = 0
-            while self.live:
-                if tick >= 4:
-                    tick = 0
-                    if self.watchdog_waitting > (self.watchdog_timeout // 2):
-                        try:
-                            self.clt.sendall(
-                                b"Heartbeat_"
-                            )
-                            self.logger.DEBUG("{} {} heartbeat sent".format(self.log_header, local_header))
-                            self._feed_watchdog()
-                        except Exception as err:
-                            self.logger.WARNING("{} {} failed to send heartbeat, {}".format(self.log_header,
-                                                                                            local_header,
-                                                                                            err))
-                time.sleep(0.5)
-                tick += 1
-        except Exception as err:
-            if self.live:
-                self.logger.ERROR("{} {} heartbeat error, {}".format(self.log_header, local_header, err))
-
-        self.logger.DEBUG("{} {} thread stopped".format(self.log_header, local_header))
-        self.threads.update({"heartbeat": False})
+        if not self.live:
+            return
+
+        if self.send_lock.acquire(blocking=False):  # a message being sent keeps connection alive too
+            try:
+                left = self.heartbeat_left or b"Heartbeat_"
+                try:
+                    sent = self.clt.send(left, _MSG_DONTWAIT)  # never block timer wheel
+                except BlockingIOError:
+                    sent = 0
+                self.heartbeat_left = left[sent:]
+                if not self.heartbeat_left:
+                    self.logger.DEBUG("{} {} heartbeat sent".format(self.log_header, local_header))
+                    self._feed_watchdog()
+            except Exception as err:
+                self.logger.WARNING("{} {} failed to send heartbeat, {}".format(self.log_header,
+                                                                                local_header,
+                                                                                err))
+            finally:
+                self.send_lock.release()
+
+        if not self.live:
+            return
+        if self.heartbeat_left:  # socket buffer full, retry on next tick unless send() finishes it first
+            self.heartbeat.wheel.schedule(WHEEL_TICK, self._heartbeat)
+        else:
+            self.heartbeat.start()
 
-    def _watchdog_thread(self):
+    def _watchdog_expired(self):
         """
-        watchdog service, keeps connection available
+        watchdog service on timer wheel, called when nothing has been sent
+        or received for watchdog timeout
 
         :return: None
         """
 
-        self.threads.update({"watchdog": True})
-        local_header = "[watchdog]"
-        self.logger.DEBUG("{} {} thread started".format(self.log_header, local_header))
-
-        try:
-            tick = 0
-            while self.live:
-                if tick >= 4:
-                    tick = 0
-                    if self.watchdog_waitting > self.watchdog_timeout:
-                        self.logger.ERROR("{} {} server seems not responding, disconnecting...".format(self.log_header,
-                                                                                                       local_header))
-                        self.reset()
-
-                if self.clt is None or not self.connected:
-                    self.logger.INFO("{} {} connection lost".format(self.log_header, local_header))
-                    self.reset()
-                    break
-
-                time.sleep(0.5)
-                tick += 1
-                self.watchdog_waitting += 1
-        except Exception as err:
-            if self.live:
-                self.logger.ERROR("{} {} watchdog error, {}".format(self.log_header, local_header, err))
-
-        self.logger.DEBUG("{} {} thread stopped".format(self.log_header, local_header))
-        self.threads.update({"watchdog": False})
+        if not self.live:
+            return
+        self.logger.ERROR("{} [watchdog] server seems not responding, disconnecting...".format(self.log_header))
+        self.reset()
 
     def _feed_watchdog(self):
         """
@@ -190,7 +131,8 @@ class I2TCPclient:
         :return: None
         """
 
-        self.watchdog_waitting = 0
+        self.watchdog.feed()
+        self.heartbeat.feed()
 
     def _start(self):
         """
@@ -199,12 +141,8 @@ class I2TCPclient:
         :return: None
         """
 
-        if not self.threads["heartbeat"]:
-            heartbeat_thr = threading.Thread(target=self._heartbeat_thread)
-            heartbeat_thr.start()
-        if not self.threads["watchdog"]:
-            watchdog_thr = threading.Thread(target=self._watchdog_thread)
-            watchdog_thr.start()
+        self.watchdog.start()
+        self.heartbeat.start()
 
     def reset(self):
         """
@@ -214,11 +152,15 @@ class I2TCPclient:
         """
 
         self.live = False
+        self.watchdog.cancel()
+        self.heartbeat.cancel()
         try:
             self.clt.close()
         except:
             pass
         self.clt = None
+        self.decoder = None
+        self.heartbeat_left = b""
         self.connected = False
 
     def connect(self, timeout=10):
@@ -252,6 +194,10 @@ class I2TCPclient:
                 if time.time() - ts > timeout:
                     raise Exception("timeout while receiving random data from server")
 
+            reason = parse_reject(rand_num)
+            if reason is not None:
+                raise Exception("connection rejected by server, {}".format(reason))
+
             self.logger.DEBUG("{} 64-bit random key received: {}".format(
                 self.log_header,
                 rand_num
@@ -269,8 +215,13 @@ class I2TCPclient:
             feedback = clt.recv(65536)
             if feedback != self.version:
                 raise Exception("invalid key or invalid server, feedback: {}".format(feedback))
-            clt.sendall(b"OK")
+            clt.sendall(b"OK" + build_offer(self.frame_size, self.checksum))
             self.clt = clt
+            self._reset_codec()
+            self.decoder = I2TCPdecoder(clt, self._depacker, feed_watchdog=self._feed_watchdog,
+                                        logger=self.logger, log_header=self.log_header,
+                                        on_offer=self._negotiate, max_frame=self.frame_size,
+                                        max_message=self.max_message)
             self.live = True
             self.connected = True
             self._start()
@@ -293,23 +244,39 @@ class I2TCPclient:
 
         if self.clt is None or not self.connected:
             raise Exception("no connection built yet")
-        paks = self._packager(data)
         sent = 0
 
-        while self.busy:
-            time.sleep(0.0001)
+        with self.send_lock:
+            paks = self._package_heads(data)
+            buffers = [buf for pak in paks for buf in pak]
+            left = self.heartbeat_left
+            if left:  # rest of a heartbeat cut off by a full socket buffer
+                buffers.insert(0, left)
+                self.heartbeat_left = b""
+            try:
+                sent = sendmsg_all(self.clt, buffers) - len(left)
+                self._feed_watchdog()
+            except Exception as err:
+                self.logger.ERROR("{} failed to send message, {}".format(self.log_header, err))
 
-        self.busy = True
+        return sent
 
-        try:
-            for i in paks:
-                ret = self.clt.sendall(i)
-                sent += len(i)
-                self._feed_watchdog()
-        except Exception as err:
-            self.logger.ERROR("{} failed to send message, {}".format(self.log_header, err))
+    def send_stream(self, chunks, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        send data of any size as a stream with constant memory, chunks
+        are sent one by one as they are generated
+
+        :param chunks: iterable of bytes-like, stream data
+        :param chunk_size: int, max payload length of one message
+        :return: int, total data length (include headers)
+        """
 
-        self.busy = False
+        sent = 0
+        for message in stream_messages(chunks, chunk_size):
+            length = self.send(message)
+            if not length:
+                raise Exception("connection lost while sending stream")
+            sent += length
 
         return sent
 
@@ -323,55 +290,12 @@ class I2TCPclient:
         if self.clt is None or not self.connected:
             raise Exception("no connection built yet")
 
-        all_data = b""
+        decoder = self.decoder
+        if decoder is None:
+            raise Exception("no connection built yet")
+
         try:
-            ret = None
-            while ret is None:
-                pak = b"\x00"
-                while pak[0] not in (72, 65):
-                    pak = self.clt.recv(1)
-                    if pak == b"":
-                        return None
-                while len(pak) < 10:
-                    pak += self.clt.recv(10 - len(pak))
-                if pak == b"":
-                    self.logger.INFO("{} connection lost".format(self.log_header))
-                    self.reset()
-                    raise Exception("no connection built yet")
-                ret = self._depacker(pak)
-            total_length = ret["total_length"]
-            self.logger.DEBUG("{} receiving data of total length {}".format(self.log_header, total_length))
-            data = b""
-            length = 0
-            while length != ret["package_length"]:
-                length = len(data)
-                data += self.clt.recv(ret["package_length"] - length)
-            payload_sum = md5(data).digest()[:2]
-            if payload_sum != ret["payload_sum"]:
-                self.logger.WARNING("{} broken package received".format(self.log_header))
-                raise Exception("broken package")
-            all_data = data
-            while len(all_data) < total_length:
-                pak = b"\x00"
-                while pak[0] not in (72, 65):
-                    pak = self.clt.recv(1)
-                    if pak == b"":
-                        return None
-                while len(pak) < 10:
-                    pak += self.clt.recv(10 - len(pak))
-                ret = self._depacker(pak)
-                if ret is None:
-                    raise Exception("broken package")
-                data = b""
-                length = 0
-                while length != ret["package_length"]:
-                    length = len(data)
-                    data += self.clt.recv(ret["package_length"] - length)
-                payload_sum = md5(data).digest()[:2]
-                if payload_sum != ret["payload_sum"]:
-                    self.logger.WARNING("{} broken package received".format(self.log_header))
-                    raise Exception("broken package")
-                all_data += data
+            all_data = decoder.recv()
         except Exception as err:
             if exception and self.live:
                 self.logger.ERROR("{} failed to receive message, {}".format(self.log_header, err))
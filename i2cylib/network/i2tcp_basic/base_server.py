@@ -4,23 +4,120 @@
 # Filename: I2TCP_server
 # Created on: 2021/1/11
 
-import random
+import queue
+import selectors
 import socket
 import threading
 import time
 import uuid
 from hashlib import md5, sha256
-from i2cylib.crypto.keygen import DynKey, DynKey16
+from i2cylib.crypto.keygen import DynKey, DynKey16Ring
 from i2cylib.crypto.iccode import Iccode
 from i2cylib.utils.logger import Logger
 from i2cylib.utils.bytes import random_keygen
+from collections import deque
+from .decoder import I2TCPdecoder
+from .sender import sendmsg_all
+from .inbox import I2TCPinbox
+from .timer import Deadline
+from .stream import STREAM_HEAD, STREAM_CHUNK_SIZE, STREAM_BUFFER, stream_messages, stream_reader
+from .rpc import REQUEST_HEAD, reply_message, parse_request
+from .codec import I2TCPcodec
+from .negotiation import REVISION, DEFAULT_FRAME_SIZE, DEFAULT_MAX_MESSAGE, DEFAULT_CHECKSUM, build_offer, build_reject
 
 VERSION = "1.5"
+HEARTBEAT = b"Heartbeat_"
+COALESCE_SIZE = 65536
+REJECT_LINGER = 1  # seconds a rejected connection is drained before closed
+REJECT_PENDING_MAX = 1024
+
+_HEARTBEAT_ITEM = memoryview(HEARTBEAT)  # queued by identity, sent without packing
+_reject_queue = queue.Queue()
+_reject_thread = None
+_reject_lock = threading.Lock()
+
+
+def _close_quietly(con):
+    try:
+        con.close()
+    except Exception:
+        pass
+
+
+def _reject_worker():
+    """
+    drain and close rejected connections, one thread for all of them
+
+    :return: None
+    """
+
+    sel = selectors.DefaultSelector()
+    expires = {}
+    while True:
+        try:
+            con = _reject_queue.get(timeout=None if not expires else 0.1)
+            while True:
+                if len(expires) >= REJECT_PENDING_MAX:
+                    _close_quietly(con)
+                else:
+                    sel.register(con, selectors.EVENT_READ)
+                    expires[con] = time.time() + REJECT_LINGER
+                con = _reject_queue.get_nowait()
+        except queue.Empty:
+            pass
+
+        for key, mask in sel.select(timeout=0.1):
+            try:
+                if key.fileobj.recv(4096):  # drain pre-auth key, closing with unread data resets the frame
+                    continue
+            except BlockingIOError:
+                continue
+            except Exception:
+                pass
+            expires.pop(key.fileobj, None)
+            sel.unregister(key.fileobj)
+            _close_quietly(key.fileobj)
+
+        now = time.time()
+        for con in [con for con, expire in expires.items() if expire <= now]:
+            del expires[con]
+            sel.unregister(con)
+            _close_quietly(con)
+
+
+def reject_connection(con, reason):
+    """
+    refuse a connection with a reject frame, so the client fails at
+    once instead of waiting for its timeout. never blocks, the socket
+    is drained and closed by a shared worker thread
+
+    :param con: socket.socket, accepted connection
+    :param reason: str, why connection is refused
+    :return: None
+    """
+
+    global _reject_thread
+
+    try:
+        con.setblocking(False)
+        con.send(build_reject(reason))  # 64 bytes always fit in the send buffer of a new socket
+        con.shutdown(socket.SHUT_WR)
+    except Exception:
+        _close_quietly(con)
+        return
+
+    with _reject_lock:
+        if _reject_thread is None:
+            _reject_thread = threading.Thread(target=_reject_worker, name="I2TCP-reject", daemon=True)
+            _reject_thread.start()
+    _reject_queue.put(con)
 
 
 class I2TCPserver:
 
-    def __init__(self, key=b"basic", port=27631, max_con=20, logger=None):
+    def __init__(self, key=b"basic", port=27631, max_con=20, logger=None,
+                 frame_size=DEFAULT_FRAME_SIZE, checksum=DEFAULT_CHECKSUM,
+                 max_message=DEFAULT_MAX_MESSAGE):
         """
         I2TCP server class
 
@@ -29,14 +126,25 @@ class I2TCPserver:
         :param max_con: int, max TCP connection(s) that allowed
                         to be accept at the same time
         :param logger: Logger, server log output object
+        :param frame_size: int, max package length offered to clients, used
+                           only with clients supporting protocol revision 2
+        :param checksum: str, preferred payload checksum ("none", "adler32",
+                         "crc32" or "md5") of revision 2 packages, the
+                         stronger one of both sides is used
+        :param max_message: int, max length of one message accepted, larger
+                            ones are dropped as broken before any memory
+                            is allocated for them
         """
 
         self.port = port
         self.srv = None
         self.keygen = DynKey(key)
-        self.keygen_preAuth = DynKey16(md5(key).digest())
+        self.keygen_preAuth = DynKey16Ring(md5(key).digest(), auto_start=False)
         self.key = key
         self.max_con = max_con
+        self.frame_size = frame_size
+        self.checksum = checksum
+        self.max_message = max_message
 
         if not isinstance(logger, Logger):
             logger = Logger()
@@ -47,15 +155,19 @@ class I2TCPserver:
 
         self.threads = {"watchdog": False,
                         "mainloop": False}
-        self.connections = {}
+        self.connections = {}  # slot -> None or {"handler": I2TCPhandler, "handled": bool}
+        self.free_slots = deque()
+        self.pending = queue.Queue()  # authenticated handlers waiting for get_connection()
+        self.slot_lock = threading.Lock()
+        self.stopped = threading.Event()
 
         self.live = False
 
     def _watchdog_thread(self):
         """
         watchdog service, kills connection during server
-         shutting down, and removes dead connection in
-         buffer
+         shutting down, dead connections free their slots
+         by themselves
 
         :return: None
         """
@@ -65,25 +177,18 @@ class I2TCPserver:
         self.logger.DEBUG("{} {} thread started".format(self.log_header, local_header))
 
         try:
-            while self.live:
-                for i in range(self.max_con):
-                    if self.connections[i] is None:
-                        continue
-                    if not self.connections[i]["handler"].live:
-                        self.connections.update({i: None})
-                time.sleep(0.5)
+            self.stopped.wait()
             self.logger.DEBUG("{} {} kill signal received".format(self.log_header, local_header))
+            with self.slot_lock:
+                handlers = [ele["handler"] for ele in self.connections.values() if ele is not None]
+            for handler in handlers:
+                if handler.live:
+                    threading.Thread(target=handler.kill).start()
             self.logger.DEBUG("{} {} waiting for all connection(s) to be killed".format(self.log_header,
                                                                                         local_header))
             tick = 0
             while True:
-                alive_con = 0
-                for i in range(self.max_con):
-                    if self.connections[i] is None:
-                        continue
-                    if self.connections[i]["handler"].live:
-                        alive_con += 1
-                if alive_con == 0:
+                if len(self.free_slots) == self.max_con:
                     self.logger.INFO("{} {} all connection(s) have been killed".format(self.log_header,
                                                                                        local_header))
                     break
@@ -110,6 +215,65 @@ class I2TCPserver:
         self.logger.DEBUG("{} {} thread stopped".format(self.log_header, local_header))
         self.threads.update({"watchdog": False})
 
+    def _take_slot(self):
+        """
+        take a free connection slot, O(1)
+
+        :return: int or None, slot index, None if max connection(s) reached
+        """
+
+        with self.slot_lock:
+            if not self.free_slots:
+                return None
+            return self.free_slots.popleft()
+
+    def _bind_slot(self, slot, handler):
+        """
+        put authenticated handler into its slot and queue it for
+        get_connection(), the slot is freed if handler is already dead
+
+        :param slot: int, slot taken by _take_slot()
+        :param handler: I2TCPhandler
+        :return: None
+        """
+
+        with self.slot_lock:
+            if not handler.live:
+                self.free_slots.append(slot)
+                return
+            handler.slot = slot
+            self.connections.update({slot: {"handler": handler,
+                                            "handled": False}})
+        self.pending.put(handler)
+
+    def _release(self, handler):
+        """
+        free the slot of a killed handler, called by I2TCPhandler.kill()
+
+        :param handler: I2TCPhandler
+        :return: None
+        """
+
+        with self.slot_lock:
+            slot = handler.slot
+            if slot is None:
+                return
+            handler.slot = None
+            self.connections.update({slot: None})
+            self.free_slots.append(slot)
+
+    def _create_handler(self, con, addr):
+        """
+        create handler of an incoming connection, override this to use
+        another handler class
+
+        :param con: socket.socket, accepted connection
+        :param addr: tuple, address of connection
+        :return: I2TCPhandler
+        """
+
+        return I2TCPhandler(con, addr, self)
+
     def _mainloop_thread(self):
         """
         server mainloop, accept incoming connection
@@ -124,17 +288,23 @@ class I2TCPserver:
         try:
             while self.live:
                 con, addr = self.srv.accept()
-                if self.live:
-                    self.logger.INFO("{} new connection {}:{} coming in".format(self.log_header,
-                                                                                addr[0], addr[1]))
-                    handler = I2TCPhandler(con, addr, self)
-                    for i in range(self.max_con):
-                        if self.connections[i] is None:
-                            self.connections.update({i: {"handler": handler,
-                                                         "handled": False}})
-                            break
-                else:
+                if not self.live:
                     break
+                slot = self._take_slot()
+                if slot is None:
+                    self.logger.WARNING("{} connection {}:{} refused, max connection(s) reached".format(
+                        self.log_header, addr[0], addr[1]))
+                    reject_connection(con, "max connection(s) reached")
+                    continue
+                self.logger.INFO("{} new connection {}:{} coming in".format(self.log_header,
+                                                                            addr[0], addr[1]))
+                try:
+                    handler = self._create_handler(con, addr)
+                except Exception:
+                    with self.slot_lock:
+                        self.free_slots.append(slot)
+                    raise
+                self._bind_slot(slot, handler)
 
         except Exception as err:
             if self.live:
@@ -164,8 +334,12 @@ class I2TCPserver:
 
             for i in range(self.max_con):
                 self.connections.update({i: None})
+            self.free_slots = deque(range(self.max_con))
+            self.pending = queue.Queue()
+            self.stopped.clear()
 
             self.live = True
+            self.keygen_preAuth.start()
 
             thr = threading.Thread(target=self._mainloop_thread)
             thr.start()
@@ -186,6 +360,8 @@ class I2TCPserver:
         """
 
         self.live = False
+        self.stopped.set()
+        self.keygen_preAuth.stop()
         tick = 0
         alive = True
         while alive:
@@ -208,42 +384,47 @@ class I2TCPserver:
 
     def get_connection(self, wait=False):
         """
-        get the latest connected connection that yet to be
+        get the earliest connected connection that yet to be
         handled
 
-        :return: I2TCPhandler, connection handler
+        :param wait: bool, block until a connection comes in or
+                     server is killed
+        :return: I2TCPhandler or None, connection handler
         """
 
-        ret = None
-        while ret is None and self.live:
-            for i in range(self.max_con):
-                if self.connections[i] is None:
+        while True:
+            try:
+                handler = self.pending.get(timeout=0.5 if wait else 0.001)
+            except queue.Empty:
+                if wait and self.live:
                     continue
-                if not self.connections[i]["handled"]:
-                    ret = self.connections[i]["handler"]
-                    self.connections[i]["handled"] = True
-                    break
-            time.sleep(0.001)
-            if not wait:
-                break
-
-        return ret
+                return None
+            with self.slot_lock:
+                slot = handler.slot
+                if slot is None or not handler.live:
+                    continue  # died before being handled
+                self.connections[slot].update({"handled": True})
+            return handler
 
 
-class I2TCPhandler:
+class I2TCPhandler(I2TCPcodec):
 
     def __init__(self, srv, addr, parent, timeout=10,
-                 buffer_max=256, watchdog_timeout=15, temp_dir="temp"):
+                 buffer_max=256, watchdog_timeout=15, temp_dir="temp",
+                 send_queue_max=256):
         """
-        I2TCP connection handler
+        I2TCP connection handler, state shared by every kind of handler is
+        set up here, then _open() starts serving the connection
 
         :param srv: socket.socket, socket server object
         :param addr: str, incoming connection address
         :param parent: I2TCPserver, father object
         :param timeout (default: 20): int, timeout for connection
-        :param buffer_max (default: 256): int,
-        :param watchdog_timeout (default 15):
+        :param buffer_max (default: 256): int, max packages in package buffer
+        :param watchdog_timeout (default 15): int, seconds without any package before disconnecting
         :param temp_dir (default: "temp"): cache directory, reserved option
+        :param send_queue_max (default: 256): int, max messages waiting to be
+                                              sent, send() blocks when reached
         """
 
         self.addr = addr
@@ -253,87 +434,54 @@ class I2TCPhandler:
         self.logger = parent.logger
         self.version = parent.version
         self.live = True
-        self.busy = False
 
         self.log_header = "[I2TCP] [{}:{}]".format(self.addr[0], self.addr[1])
 
-        self.watchdog_waitting = 0
-        self.threads = {"watchdog": False,
-                        "receiver": False}
-        self.package_buffer = []
-        self.srv.settimeout(timeout)
+        self.package_buffer = I2TCPinbox(buffer_max)
+        self.package_buffer.register(STREAM_HEAD, limit=STREAM_BUFFER)
+        self.package_buffer.register(REQUEST_HEAD, limit=buffer_max)  # never dropped, refused when full
+        self.frame_size = parent.frame_size
+        self.checksum = parent.checksum
+        self._reset_codec()
+        self.decoder = I2TCPdecoder(self.srv, self._depacker, feed_watchdog=self._feed_watchdog,
+                                    logger=self.logger, log_header=self.log_header,
+                                    on_offer=self._negotiate, max_frame=self.frame_size,
+                                    max_message=parent.max_message)
 
         self.buffer_max = buffer_max
-        self.watchdog_timeout = watchdog_timeout * 2
+        self.timeout = timeout
+        self.watchdog_timeout = watchdog_timeout
+        self.send_queue_max = send_queue_max
         self.temp_dir = temp_dir
-
-        assert isinstance(parent, I2TCPserver)
         self.parent = parent
 
         self.mac_id = uuid.UUID(int=uuid.getnode()).bytes[-6:]
+        self.slot = None  # connection slot in parent, set when authenticated
 
-        if self._auth():
-            self._start()
-        else:
-            self.kill()
+        self._open()
 
-    def _packager(self, data):
+    def _open(self):
         """
-        pack data with I2TCP format
+        authenticate client and start receiver and writer threads,
+        handlers driven by others override this
 
-        :param data: bytes
-        :return: List(bytes), packed data
+        :return: None
         """
 
-        offset = 0
-        paks = []
-        length = len(data)
-        left = length
-        header_unit = self.version + self.keygen.key
-        package_id = bytes((random.randint(0, 255),))
-        while left > 0:
-            pak = b"A" + left.to_bytes(length=3, byteorder='big', signed=False)
-            if left < 32758:
-                left = 0
-            else:
-                left -= 32758
-            pak_length = length - left - offset
-            pak += pak_length.to_bytes(length=2, byteorder='big', signed=False)
-            pak += bytes((md5(pak + header_unit).digest()[2],))
-            payload_sum = md5(data[offset:length - left]).digest()[:2]
-            pak += payload_sum
-            pak += package_id
-            pak += data[offset:length - left]
-            offset = length - left
-            paks.append(pak)
-        return paks
-
-    def _depacker(self, pak_data):
-        """
-        depack packed data to normal data format
-
-        :param pak_data: bytes, packed data
-        :return: bytes, data
-        """
-
-        header_unit = self.version + self.keygen.key
-        pak_type = pak_data[0]
-
-        if pak_type == ord("H"):
-            ret = "heartbeat"
-        elif pak_type == ord("A"):
-            ret = {"total_length": int.from_bytes(pak_data[1:4], byteorder='big', signed=False),
-                   "package_length": int.from_bytes(pak_data[4:6], byteorder='big', signed=False),
-                   "header_sum": pak_data[6],
-                   "payload_sum": pak_data[7:9],
-                   "package_id": pak_data[9],
-                   "data": pak_data[10:]}
-            header_sum = md5(pak_data[0:6] + header_unit).digest()[2]
-            if header_sum != ret["header_sum"]:
-                ret = None
+        assert isinstance(self.parent, I2TCPserver)
+
+        self.threads = {"receiver": False,
+                        "writer": False}
+        self.send_queue = deque()
+        self.__send_cond = threading.Condition()
+        self.__sending = 0
+        self.srv.settimeout(self.timeout)
+        self.watchdog = Deadline(self.watchdog_timeout, self._watchdog_expired)
+
+        if self._auth():
+            self._start()
         else:
-            ret = None
-        return ret
+            self.kill()
 
     def _receiver_thread(self):
         """
@@ -362,12 +510,15 @@ class I2TCPhandler:
                 if pak is None:
                     self.logger.INFO("{} {} connection lost".format(self.log_header, local_header))
                     threading.Thread(target=self.kill).start()
-                else:
+                elif not self._refuse_request(pak):
+                    if self.package_buffer.put(pak):
+                        self.logger.ERROR("{} {} package buffer overflowed, the oldest package dropped".format(
+                            self.log_header, local_header))
                     self.logger.DEBUG("{} {} new package received, buffer size now {}".format(
                         self.log_header,
                         local_header,
                         len(self.package_buffer)))
-                    self.package_buffer.append(pak)
+                    self._wait_consumed()
 
         except Exception as err:
             if self.live:
@@ -376,69 +527,77 @@ class I2TCPhandler:
         self.logger.DEBUG("{} {} thread stopped".format(self.log_header, local_header))
         self.threads.update({"receiver": False})
 
-    def _watchdog_thread(self):
+    def _watchdog_expired(self):
         """
-        handler watchdog, keeps connection alive and kills it when
-        client is not responding, handle package buffer overflow
-        event
+        handler watchdog on timer wheel, kills connection when client is
+        not responding
 
         :return: None
         """
 
-        self.threads.update({"watchdog": True})
-        local_header = "[watchdog]"
-        self.logger.DEBUG("{} {} thread started".format(self.log_header, local_header))
+        if not self.live:
+            return
+        self.logger.ERROR("{} [watchdog] client seems not responding, disconnecting...".format(self.log_header))
+        threading.Thread(target=self.kill).start()
 
-        try:
-            tick = 0
-            while self.live:
-                if tick >= 4:
-                    tick = 0
-                    if self.watchdog_waitting > self.watchdog_timeout:
-                        self.logger.ERROR("{} {} client seems not responding, disconnecting...".format(self.log_header,
-                                                                                                       local_header))
-                        threading.Thread(target=self.kill).start()
-                        break
-                if tick % 2 == 0:
-                    err = False
-                    for i in self.threads.keys():
-                        if not self.threads[i]:
-                            self.logger.WARNING("{} {} thread \"{}\" seems offline".format(self.log_header,
-                                                                                           local_header,
-                                                                                           i))
-                            err = True
-                    if err:
-                        self._start()
-
-                    if len(self.package_buffer) > self.buffer_max:
-                        self.logger.ERROR("{} {} package buffer overflowed, cleaning...".format(self.log_header,
-                                                                                                local_header))
-                        while len(self.package_buffer) > self.buffer_max:
-                            self.package_buffer.pop(0)
-
-                if not self.parent.live:
-                    self.logger.DEBUG("{} {} parent loop stopping, killing handler".format(self.log_header,
-                                                                                           local_header))
-                    threading.Thread(target=self.kill).start()
-                    break
+    def _feed_watchdog(self):
+        """
+        reset the timer of watchdog to keep watchdog from timeout
 
-                time.sleep(0.5)
-                self.watchdog_waitting += 1
-                tick += 1
-        except Exception as err:
-            self.logger.ERROR("{} {} watchdog error, {}".format(self.log_header, local_header, err))
+        :return: None
+        """
 
-        self.logger.DEBUG("{} {} thread stopped".format(self.log_header, local_header))
-        self.threads.update({"watchdog": False})
+        self.watchdog.feed()
 
-    def _feed_watchdog(self):
+    def _wait_consumed(self):
         """
-        reset the timer of watchdog to keep watchdog from timeout
+        stop reading from client while streams are not consumed,
+        meanwhile the watchdog is fed for it is not the client that
+        stalls, and heartbeats keep the watchdog of client fed, the
+        connection is killed when nothing is consumed for watchdog timeout
 
         :return: None
         """
 
-        self.watchdog_waitting = 0
+        beat = 0
+        since = time.time()
+        stalled = False
+        while self.live and self.package_buffer.full(STREAM_HEAD):
+            now = time.time()
+            if now - since < self.watchdog.timeout:
+                if now - beat >= self.watchdog.timeout / 2:  # tell client we are alive
+                    beat = now
+                    with self.__send_cond:
+                        self.send_queue.append(_HEARTBEAT_ITEM)
+                        self.__send_cond.notify_all()
+                self._feed_watchdog()
+            elif not stalled:
+                stalled = True
+                self.logger.ERROR("{} [receiver] stream not consumed for {} seconds, disconnecting...".format(
+                    self.log_header, self.watchdog.timeout))
+                threading.Thread(target=self.kill).start()
+            self.package_buffer.wait_room(STREAM_HEAD, 0.5)
+
+    def _refuse_request(self, message):
+        """
+        answer a request with an error instead of buffering it when
+        buffer_max requests are waiting, receiving never waits for them
+
+        :param message: bytes, received message
+        :return: bool, True if message is a refused request
+        """
+
+        if not message.startswith(REQUEST_HEAD) or not self.package_buffer.full(REQUEST_HEAD):
+            return False
+        try:
+            stream_id = parse_request(message)[0]
+        except Exception:
+            return True
+        self.logger.WARNING("{} [receiver] request queue full, request {} refused".format(self.log_header,
+                                                                                         stream_id))
+        self.reply(stream_id, b"request queue full", error=True)
+
+        return True
 
     def _auth(self):
         """
@@ -509,6 +668,8 @@ class I2TCPhandler:
             if feedback != b"OK":
                 raise Exception("invalid feedback, {}".format(feedback))
 
+            self.srv.sendall(build_offer(self.frame_size, self.checksum))
+
         except Exception as err:
             self.logger.WARNING("{} authentication process failure, {}".format(self.log_header, err))
 
@@ -519,99 +680,136 @@ class I2TCPhandler:
         receive raw data from client socket connection and
         depack it till a whole package is received
 
-        :return: bytes, depacked data
+        :return: bytes, depacked data (None if connection lost)
         """
 
-        ret = None
-        while ret is None:
-            pak = b"\x00"
-            while pak[0] not in (72, 65):
-                pak = self.srv.recv(1)
-                if pak == b"":
-                    return None
-            while len(pak) < 10:
-                pak += self.srv.recv(10 - len(pak))
-            self.logger.DEBUG("{} received package head: {}".format(self.log_header, pak))
-            if pak == b"":
-                return None
-            ret = self._depacker(pak)
-            if ret is None:
-                self.logger.WARNING("{} broken package received".format(self.log_header))
-            if ret == "heartbeat":
-                self.logger.DEBUG("{} heartbeat received".format(self.log_header))
-                self._feed_watchdog()
-                ret = None
-
-        total_length = ret["total_length"]
-        package_id = ret["package_id"]
-        self.logger.DEBUG("{} receiving data of total length {}".format(self.log_header,
-                                                                        total_length))
-
-        data = b""
-        length = 0
-
-        while length != ret["package_length"]:
-            length = len(data)
-            data += self.srv.recv(ret["package_length"] - length)
-        payload_sum = md5(data).digest()[:2]
-        if payload_sum != ret["payload_sum"]:
-            self.logger.WARNING("{} broken package received".format(self.log_header))
-            raise Exception("broken package")
-        all_data = data
-
-        while len(all_data) < total_length:
-            pak = b"\x00"
-            while pak[0] not in (72, 65):
-                pak = self.srv.recv(1)
-                if pak == b"":
-                    return None
-            while len(pak) < 10:
-                pak += self.srv.recv(10 - len(pak))
-            ret = self._depacker(pak)
-            if ret is None or package_id != ret["package_id"] or total_length - len(all_data) != ret["total_length"]:
-                raise Exception("broken package")
-            if ret == "heartbeat":
-                self.logger.DEBUG("{} heartbeat received".format(self.log_header))
-                self._feed_watchdog()
-            data = b""
-            length = 0
-            while length != ret["package_length"]:
-                length = len(data)
-                data += self.srv.recv(ret["package_length"] - length)
-            payload_sum = md5(data).digest()[:2]
-            if payload_sum != ret["payload_sum"]:
-                self.logger.WARNING("{} broken package received".format(self.log_header))
-                raise Exception("broken package")
-            all_data += data
-
-        if len(all_data) != total_length:
-            raise Exception("broken package")
-
-        self._feed_watchdog()
-        return all_data
+        return self.decoder.recv()
+
+    def _writer_thread(self):
+        """
+        data sending service, the only thread that writes to client
+        after authentication, packs queued messages and sends small
+        ones together in one syscall
+
+        :return: None
+        """
+
+        self.threads.update({"writer": True})
+        local_header = "[writer]"
+        self.logger.DEBUG("{} {} thread started".format(self.log_header, local_header))
+
+        failed = False
+        try:
+            while self.live:
+                with self.__send_cond:
+                    if not self.send_queue:
+                        self.__send_cond.wait(0.5)
+                        continue
+                    batch = [self.send_queue.popleft()]
+                    size = len(batch[0])
+                    while self.send_queue and size < COALESCE_SIZE:
+                        batch.append(self.send_queue.popleft())
+                        size += len(batch[-1])
+                    self.__sending = len(batch)
+                    self.__send_cond.notify_all()
+
+                buffers = []
+                for data in batch:
+                    if failed:  # connection is being killed, drop the rest
+                        break
+                    if data is _HEARTBEAT_ITEM:
+                        buffers.append(data)
+                        continue
+                    try:
+                        for pak in self._package_heads(data):
+                            buffers.extend(pak)
+                    except Exception as err:
+                        self.logger.ERROR("{} {} failed to pack data, {}".format(self.log_header,
+                                                                                 local_header, err))
+
+                try:
+                    if buffers:
+                        sendmsg_all(self.srv, buffers)
+                        self._feed_watchdog()
+                except Exception as err:
+                    if self.live:
+                        self.logger.ERROR("{} {} failed to send data, {}".format(self.log_header,
+                                                                                 local_header, err))
+                        failed = True
+                        threading.Thread(target=self.kill).start()
+
+                with self.__send_cond:
+                    self.__sending = 0
+                    self.__send_cond.notify_all()
+
+        except Exception as err:
+            if self.live:
+                self.logger.ERROR("{} {} error while running, {}".format(self.log_header, local_header, err))
+
+        with self.__send_cond:
+            self.__sending = 0
+            self.__send_cond.notify_all()
+
+        self.logger.DEBUG("{} {} thread stopped".format(self.log_header, local_header))
+        self.threads.update({"writer": False})
+
+    def _packed_length(self, length):
+        """
+        length of data after packed with current protocol revision
+
+        :param length: int, data length
+        :return: int, total package length (include headers)
+        """
+
+        revision, frame_size = self.wire[:2]
+        head_length = 17 if revision >= REVISION else 10
+
+        return length + -(-length // frame_size) * head_length
 
     def _start(self):
         """
-        start watchdog service and receiver service
+        start watchdog service, receiver service and writer service
 
         :return: None
         """
 
+        if not self.watchdog.active:
+            self.watchdog.start()
         if not self.threads["receiver"]:
             thr = threading.Thread(target=self._receiver_thread)
             thr.start()
-        if not self.threads["watchdog"]:
-            thr = threading.Thread(target=self._watchdog_thread)
+        if not self.threads["writer"]:
+            self.threads.update({"writer": True})  # only one writer keeps messages in order
+            thr = threading.Thread(target=self._writer_thread)
             thr.start()
 
+    def flush(self, timeout=None):
+        """
+        wait until all queued data has been sent
+
+        :param timeout: float or None, None for waiting forever
+        :return: bool, True if send queue is drained
+        """
+
+        with self.__send_cond:
+            return self.__send_cond.wait_for(lambda: not (self.send_queue or self.__sending) or
+                                             not self.live, timeout)
+
     def kill(self):
         """
-        kill this connection
+        kill this connection, data queued before is sent first
 
         :return: None
         """
 
+        if self.live:
+            self.flush(timeout=2)
         self.live = False
+        self.watchdog.cancel()
+        self.parent._release(self)
+        with self.__send_cond:
+            self.__send_cond.notify_all()
+        self.package_buffer.close()
         try:
             self.srv.close()
         except:
@@ -629,34 +827,106 @@ class I2TCPhandler:
                 self.logger.ERROR("{} failed to kill handler thread(s), timeout".format(self.log_header))
                 break
 
-    def send(self, data):
+    def send(self, data, copy=False):
+        """
+        queue data to be sent to client with I2TCP format by writer
+        thread, blocks while send queue is full. bytearray and memoryview
+        are queued as read-only views without copy, do not change them
+        till flush() returns, or send with copy=True
+
+        :param data: bytes-like, regular data
+        :param copy: bool, queue a copy of data that is not bytes
+        :return: int, total package length (include header) queued, it
+                 is returned before anything is written, call flush() to
+                 wait for it to be sent, 0 if connection closed
+        """
+
+        if not isinstance(data, bytes):
+            data = bytes(data) if copy else memoryview(data).cast("B").toreadonly()
+
+        with self.__send_cond:
+            while len(self.send_queue) >= self.send_queue_max and self.live:
+                self.__send_cond.wait(0.5)
+            if not self.live:
+                return 0
+            self.send_queue.append(data)
+            self.__send_cond.notify_all()
+
+        return self._packed_length(len(data))
+
+    def send_stream(self, chunks, chunk_size=STREAM_CHUNK_SIZE):
         """
-        send data with I2TCP format to client
+        send data of any size as a stream with constant memory, at most
+        STREAM_BUFFER messages of it wait in send queue
 
-        :param data: bytes, regular data
-        :return: int, total package length (include header)
+        :param chunks: iterable of bytes-like, stream data
+        :param chunk_size: int, max payload length of one message
+        :return: int, total package length (include headers)
         """
 
-        packs = self._packager(data)
         sent = 0
+        for message in stream_messages(chunks, chunk_size):
+            with self.__send_cond:
+                while len(self.send_queue) >= STREAM_BUFFER and self.live:
+                    self.__send_cond.wait(0.5)
+            length = self.send(message)
+            if not length:
+                raise Exception("connection lost while sending stream")
+            sent += length
 
-        while self.busy:
-            time.sleep(0.0001)
+        return sent
 
-        self.busy = True
+    def recv_stream(self, timeout=10):
+        """
+        receive a stream sent by send_stream() of client, payloads are
+        yielded as they arrive
 
-        try:
-            for i in packs:
-                ret = self.srv.sendall(i)
-                sent += len(i)
-                self._feed_watchdog()
-        except Exception as err:
-            if self.live:
-                self.logger.ERROR("{} failed to send data, {}".format(self.log_header, err))
+        :param timeout: float (default: 10), seconds to wait for each chunk
+        :return: generator of bytes, stream data
+        """
 
-        self.busy = False
+        return stream_reader(self.package_buffer.get, timeout=timeout)
 
-        return sent
+    def get_request(self, timeout=0):
+        """
+        take the oldest request sent by request() of client, answer it
+        with reply()
+
+        :param timeout: float (default: 0), seconds to wait for it
+        :return: tuple(int, bytes) or None, stream id and request data,
+                 None if timeout
+        """
+
+        message = self.package_buffer.get(REQUEST_HEAD, timeout=timeout)
+        if message is None:
+            return None
+
+        return parse_request(message)
+
+    def reply(self, stream_id, data, error=False):
+        """
+        answer a request, replies may be sent in any order
+
+        :param stream_id: int, stream id from get_request()
+        :param data: bytes, reply data, or error description if error
+        :param error: bool, the request failed, request() of client
+                      raises with data as message
+        :return: int, total package length (include headers), 0 if
+                 connection closed
+        """
+
+        return self.send(reply_message(stream_id, bytes(data), error=error))
+
+    def register_header(self, header):
+        """
+        index packages starting with header, get(header) of these packages
+        takes no scan of package buffer
+
+        :param header: bytes, package header
+        :return: None
+        """
+
+        self.package_buffer.register(header)
 
     def recv(self, timeout=0):
         """
@@ -667,20 +937,7 @@ class I2TCPhandler:
         :return: bytes, depacked data
         """
 
-        ret = None
-        t = time.time()
-        while ret is None:
-            if len(self.package_buffer) > 0:
-                got = self.package_buffer.pop(0)
-                ret = got
-                break
-
-            if timeout:
-                time.sleep(0.002)
-            elif timeout == 0 or (time.time() - t) > timeout:
-                break
-
-        return ret
+        return self.package_buffer.get(timeout=timeout)
 
 
 def init():
@@ -723,8 +980,50 @@ def test():
         srv.kill()
 
 
+def test_stall(port=27633):
+    """
+    regression of a stream nobody consumes, the handler must be killed
+    soon after watchdog timeout whether the client stays or goes
+
+    :param port: int, local port to test on
+    :return: bool, test result
+    """
+
+    from .base_client import I2TCPclient
+
+    class Server(I2TCPserver):
+        def _create_handler(self, con, addr):
+            return I2TCPhandler(con, addr, self, watchdog_timeout=2)
+
+    logger = Logger(level="ERROR")
+    srv = Server(port=port, logger=logger)
+    srv.start()
+    res = True
+    try:
+        for drop in (False, True):
+            clt = I2TCPclient("127.0.0.1", port=port, logger=logger)
+            if not clt.connect():
+                return False
+            con = srv.get_connection(wait=True)
+            clt.send_stream([b"stalled!" * 128] * (4 * STREAM_BUFFER), chunk_size=1024)
+            if drop:
+                clt.reset()
+            ts = time.time()
+            while con.live and time.time() - ts < 10:
+                time.sleep(0.2)
+            ok = not con.live and con.slot is None
+            print("## -test- ## unconsumed stream with client {} test result: {}".format(
+                "dropped" if drop else "kept", ok))
+            res = res and ok
+            clt.reset()
+        return res
+    finally:
+        srv.kill()
+
+
 if __name__ == '__main__':
     init()
+    test_stall()
     test()
 else:
     init()
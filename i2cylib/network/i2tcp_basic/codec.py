@@ -0,0 +1,146 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Author: i2cy(i2cy@outlook.com)
+# Project: I2cylib
+# Filename: codec
+# Created on: 2026/10/17
+
+# Wire format of I2TCP packages, shared by the threaded client and handler and
+# the asyncio ones. Owners provide version, keygen, frame_size, checksum,
+# logger and log_header, the negotiated revision, frame size and payload
+# checksum are kept here as one tuple, replaced at once by the receiving side
+# and read once per message by the sending side, so a message never mixes
+# values of two negotiations.
+
+import random
+from hashlib import md5
+from .negotiation import REVISION, LEGACY_REVISION, LEGACY_FRAME_SIZE, CHECKSUM_FUNCS, md5_sum, parse_offer
+
+
+LEGACY_WIRE = (LEGACY_REVISION, LEGACY_FRAME_SIZE, "md5")
+
+
+class I2TCPcodec:
+
+    wire = LEGACY_WIRE  # (revision, frame size, payload checksum) used for sending
+
+    @property
+    def revision(self):
+        return self.wire[0]
+
+    @property
+    def send_frame_size(self):
+        return self.wire[1]
+
+    @property
+    def payload_checksum(self):
+        return self.wire[2]
+
+    def _reset_codec(self):
+        """
+        go back to revision 1 packages, called before every new connection
+
+        :return: None
+        """
+
+        self.wire = LEGACY_WIRE
+
+    def _package_heads(self, data):
+        """
+        split data into I2TCP sub-packages without copying the payload
+
+        :param data: bytes-like
+        :return: List(tuple(bytes, memoryview)), package head and payload view
+        """
+
+        offset = 0
+        paks = []
+        view = memoryview(data)
+        length = len(view)
+        left = length
+        header_unit = self.version + self.keygen.key
+        package_id = bytes((random.randint(0, 255),))
+        revision, frame_size, payload_checksum = self.wire
+        if revision >= REVISION:
+            pak_type, total_size, length_size = b"B", 8, 4
+            checksum = CHECKSUM_FUNCS[payload_checksum]
+        else:
+            pak_type, total_size, length_size = b"A", 3, 2
+            checksum = md5_sum
+        while left > 0:
+            pak = pak_type + left.to_bytes(length=total_size, byteorder='big', signed=False)
+            if left < frame_size:
+                left = 0
+            else:
+                left -= frame_size
+            pak_length = length - left - offset
+            pak += pak_length.to_bytes(length=length_size, byteorder='big', signed=False)
+            pak += bytes((md5(pak + header_unit).digest()[2],))
+            payload = view[offset:length - left]
+            pak += b"\x00\x00" if checksum is None else checksum(payload)
+            pak += package_id
+            offset = length - left
+            paks.append((pak, payload))
+        return paks
+
+    def _packager(self, data):
+        """
+        pack data with I2TCP format
+
+        :param data: bytes
+        :return: List(bytes), packed data
+        """
+
+        return [pak + payload for pak, payload in self._package_heads(data)]
+
+    def _depacker(self, pak_data):
+        """
+        depack packed data to normal data format
+
+        :param pak_data: bytes, packed data
+        :return: bytes, data
+        """
+
+        header_unit = self.version + self.keygen.key
+        pak_type = pak_data[0]
+
+        if pak_type == ord("H"):
+            ret = "heartbeat"
+        elif pak_type == ord("A"):
+            ret = {"total_length": int.from_bytes(pak_data[1:4], byteorder='big', signed=False),
+                   "package_length": int.from_bytes(pak_data[4:6], byteorder='big', signed=False),
+                   "header_sum": pak_data[6],
+                   "payload_sum": pak_data[7:9],
+                   "package_id": pak_data[9],
+                   "checksum": md5_sum,
+                   "data": pak_data[10:]}
+            header_sum = md5(pak_data[0:6] + header_unit).digest()[2]
+            if header_sum != ret["header_sum"]:
+                ret = None
+        elif pak_type == ord("B"):
+            ret = {"total_length": int.from_bytes(pak_data[1:9], byteorder='big', signed=False),
+                   "package_length": int.from_bytes(pak_data[9:13], byteorder='big', signed=False),
+                   "header_sum": pak_data[13],
+                   "payload_sum": pak_data[14:16],
+                   "package_id": pak_data[16],
+                   "checksum": CHECKSUM_FUNCS[self.payload_checksum],
+                   "data": pak_data[17:]}
+            header_sum = md5(pak_data[0:13] + header_unit).digest()[2]
+            if header_sum != ret["header_sum"]:
+                ret = None
+        else:
+            ret = None
+        return ret
+
+    def _negotiate(self, fields):
+        """
+        apply protocol revision offered by peer
+
+        :param fields: bytes, offer fields
+        :return: None
+        """
+
+        wire = parse_offer(fields, self.frame_size, self.checksum)
+        self.wire = wire
+        self.logger.DEBUG("{} protocol revision {} negotiated, frame size {}, checksum {}".format(
+            self.log_header, *wire))
@@ -0,0 +1,295 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Author: i2cy(i2cy@outlook.com)
+# Project: I2cylib
+# Filename: decoder
+# Created on: 2026/10/17
+
+import re
+from .negotiation import OFFER_MAGIC, DEFAULT_FRAME_SIZE, DEFAULT_MAX_MESSAGE
+
+HEAD_LENGTHS = {65: 10,  # "A", revision 1 package
+                66: 17,  # "B", revision 2 package
+                72: 10}  # "H", heartbeat
+DIRECT_READ_MIN = 4096
+
+_PAK_TYPE = re.compile(b"[ABHN]")
+
+
+class I2TCPdecoder:
+
+    def __init__(self, sock, depacker, feed_watchdog=None, logger=None,
+                 log_header="[I2TCP]", buffer_size=65536, on_offer=None,
+                 max_frame=DEFAULT_FRAME_SIZE, max_message=DEFAULT_MAX_MESSAGE):
+        """
+        buffered I2TCP frame decoder, reads socket in bulk with recv_into
+        and assembles every message in one preallocated bytearray
+
+        :param sock: socket.socket, connected socket
+        :param depacker: callable(bytes), parses package head, returns
+                         dict, "heartbeat" or None (the _depacker of owner)
+        :param feed_watchdog: callable or None, called when heartbeat or
+                              a whole message is received
+        :param logger: Logger or None, log output object
+        :param log_header: str, log header of owner
+        :param buffer_size: int, size of receive buffer in bytes
+        :param on_offer: callable(bytes) or None, called with fields of
+                         negotiation offer received from peer
+        :param max_frame: int, max package length accepted
+        :param max_message: int, max message length accepted, checked
+                            before the message buffer is allocated
+        """
+
+        self.sock = sock
+        self.depacker = depacker
+        self.feed_watchdog = feed_watchdog
+        self.logger = logger
+        self.log_header = log_header
+        self.on_offer = on_offer
+        self.max_frame = max(max_frame, 65535)  # revision 1 packages always allowed
+        self.max_message = max_message
+
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+        self.message = None
+        self.message_view = None
+        self.package_id = None
+        self.offset = 0
+        self.package_start = 0
+        self.package_end = 0
+        self.payload_sum = None
+        self.checksum = None
+
+    def _debug(self, msg):
+        if self.logger is not None:
+            self.logger.DEBUG("{} {}".format(self.log_header, msg))
+
+    def _drop_message(self):
+        """
+        drop the message being assembled
+
+        :return: None
+        """
+
+        if self.message_view is not None:
+            self.message_view.release()
+        self.message = None
+        self.message_view = None
+        self.package_id = None
+        self.offset = 0
+        self.package_start = 0
+        self.package_end = 0
+        self.payload_sum = None
+
+    def _fill(self):
+        """
+        receive as many bytes as the buffer can hold, unread bytes are
+        moved to the front when the buffer runs out of space at its end
+
+        :return: bool, False if connection closed
+        """
+
+        if self.start == self.end:
+            self.start = 0
+            self.end = 0
+        elif self.end == len(self.buffer):
+            left = self.end - self.start
+            self.buffer[:left] = bytes(self.view[self.start:self.end])
+            self.start = 0
+            self.end = left
+
+        got = self.sock.recv_into(self.view[self.end:])
+        self.end += got
+
+        return got > 0
+
+    def _need(self, length):
+        """
+        receive till at least length unread bytes are in buffer
+
+        :param length: int
+        :return: bool, False if connection closed
+        """
+
+        while self.end - self.start < length:
+            if not self._fill():
+                return False
+
+        return True
+
+    def _read_offer(self):
+        """
+        read negotiation offer at the start of unread bytes, skips the
+        type byte if it is not an offer
+
+        :return: bool, False if connection closed
+        """
+
+        if not self._need(len(OFFER_MAGIC) + 1):
+            return False
+        if self.view[self.start:self.start + len(OFFER_MAGIC)] != OFFER_MAGIC:
+            self.start += 1
+            return True
+
+        fields_start = self.start + len(OFFER_MAGIC) + 1
+        length = len(OFFER_MAGIC) + 1 + self.buffer[fields_start - 1]
+        if not self._need(length):
+            return False
+        fields = bytes(self.view[fields_start:self.start + length])
+        self.start += length
+        self._debug("negotiation offer received: {}".format(fields))
+        if self.on_offer is not None:
+            self.on_offer(fields)
+
+        return True
+
+    def _read_head(self):
+        """
+        parse one package head from buffer, skips bytes till a valid
+        package type is found
+
+        :return: dict or "heartbeat" or None, depacked head,
+                 False if connection closed
+        """
+
+        while True:
+            found = _PAK_TYPE.search(self.buffer, self.start, self.end)
+            if found is None:
+                self.start = self.end
+                if not self._fill():
+                    return False
+                continue
+
+            self.start = found.start()
+            pak_type = self.buffer[self.start]
+            if pak_type == 78:  # "N", negotiation offer
+                if not self._read_offer():
+                    return False
+                continue
+
+            head_length = HEAD_LENGTHS[pak_type]
+            if not self._need(head_length):
+                return False
+            break
+
+        pak = bytes(self.view[self.start:self.start + head_length])
+        self.start += head_length
+        self._debug("received package head: {}".format(pak))
+
+        return self.depacker(pak)
+
+    def _begin_package(self, ret):
+        """
+        check package head and prepare message buffer for its payload
+
+        :param ret: dict, depacked head
+        :return: None
+        """
+
+        total_length = ret["total_length"]
+        package_length = ret["package_length"]
+
+        if package_length > self.max_frame:
+            self._drop_message()
+            raise Exception("broken package")
+
+        if self.message is None:
+            if package_length == 0 or package_length > total_length:
+                raise Exception("broken package")
+            if total_length > self.max_message:  # header sum is 1 byte only, never trust it for allocation
+                if self.logger is not None:
+                    self.logger.WARNING("{} message of {} bytes exceeds limit {}, dropped".format(
+                        self.log_header, total_length, self.max_message))
+                raise Exception("broken package")
+            self._debug("receiving data of total length {}".format(total_length))
+            self.message = bytearray(total_length)
+            self.message_view = memoryview(self.message)
+            self.package_id = ret["package_id"]
+        elif ret["package_id"] != self.package_id or \
+                total_length != len(self.message) - self.offset or \
+                package_length == 0 or package_length > total_length:
+            self._drop_message()
+            raise Exception("broken package")
+
+        self.package_start = self.offset
+        self.package_end = self.offset + package_length
+        self.payload_sum = ret["payload_sum"]
+        self.checksum = ret["checksum"]
+
+    def _read_payload(self):
+        """
+        move payload of current package into message, large payloads are
+        received into message directly
+
+        :return: bool, False if connection closed
+        """
+
+        while self.offset < self.package_end:
+            need = self.package_end - self.offset
+            buffered = self.end - self.start
+            if buffered:
+                length = min(need, buffered)
+                self.message_view[self.offset:self.offset + length] = \
+                    self.view[self.start:self.start + length]
+                self.start += length
+                self.offset += length
+            elif need >= DIRECT_READ_MIN:
+                got = self.sock.recv_into(self.message_view[self.offset:self.package_end])
+                if not got:
+                    return False
+                self.offset += got
+            elif not self._fill():
+                return False
+
+        if self.checksum is not None and \
+                self.checksum(self.message_view[self.package_start:self.package_end]) != self.payload_sum:
+            if self.logger is not None:
+                self.logger.WARNING("{} broken package received".format(self.log_header))
+            self._drop_message()
+            raise Exception("broken package")
+
+        self.payload_sum = None
+
+        return True
+
+    def recv(self):
+        """
+        receive a whole message, a socket timeout keeps the received part
+        and the next call continues from it
+
+        :return: bytes, depacked data (None if connection closed)
+        """
+
+        while True:
+            if self.payload_sum is None:
+                ret = self._read_head()
+                if ret is False:
+                    self._drop_message()
+                    return None
+                if ret == "heartbeat":
+                    self._debug("heartbeat received")
+                    if self.feed_watchdog is not None:
+                        self.feed_watchdog()
+                    continue
+                if ret is None:
+                    if self.message is not None:
+                        self._drop_message()
+                        raise Exception("broken package")
+                    if self.logger is not None:
+                        self.logger.WARNING("{} broken package received".format(self.log_header))
+                    continue
+                self._begin_package(ret)
+
+            if not self._read_payload():
+                self._drop_message()
+                return None
+
+            if self.offset == len(self.message):
+                ret = bytes(self.message)
+                self._drop_message()
+                if self.feed_watchdog is not None:
+                    self.feed_watchdog()
+                return ret
@@ -0,0 +1,272 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Author: i2cy(i2cy@outlook.com)
+# Project: I2cylib
+# Filename: inbox
+# Created on: 2026/10/17
+
+import threading
+import time
+from collections import deque
+
+
+class I2TCPinbox:
+
+    def __init__(self, max_size=256):
+        """
+        package buffer of received messages, packages starting with a
+        registered header are kept in their own queue, get() waits on a
+        condition variable instead of polling
+
+        :param max_size: int, max packages in buffer, the oldest one is
+                         dropped when reached
+        """
+
+        self.max_size = max_size
+        self.cond = threading.Condition()
+
+        self.queues = {}  # registered header -> deque of (sequence, package)
+        self.limits = {}  # registered header -> max packages, full() when reached
+        self.others = deque()  # packages matching no registered header
+        self.lengths = []  # lengths of registered headers, the longest first
+        self.sequence = 0
+        self.size = 0
+        self.closed = False
+
+    def __len__(self):
+        return self.size
+
+    def _route(self, data):
+        """
+        find the queue of package, the longest registered header wins
+
+        :param data: bytes, package
+        :return: tuple(bytes, deque), registered header (None if not
+                 registered) and its queue
+        """
+
+        for length in self.lengths:
+            header = bytes(data[:length])
+            queue = self.queues.get(header)
+            if queue is not None:
+                return header, queue
+
+        return None, self.others
+
+    def _rebuild(self):
+        """
+        sort all buffered packages into queues again after headers changed
+
+        :return: None
+        """
+
+        items = list(self.others)
+        self.others.clear()
+        for queue in self.queues.values():
+            items.extend(queue)
+            queue.clear()
+        self.lengths = sorted({len(header) for header in self.queues}, reverse=True)
+
+        items.sort(key=lambda item: item[0])
+        for item in items:
+            self._route(item[1])[1].append(item)
+
+    def _pop(self, header=None, drop=False):
+        """
+        remove and return the oldest package starting with header
+
+        :param header: bytes or None, None for any package
+        :param drop: bool, skip queues with limit (never dropped)
+        :return: bytes or None
+        """
+
+        found = None
+        found_queue = None
+        found_index = 0
+
+        queues = [(None, self.others)]
+        queues.extend(self.queues.items())
+        for key, queue in queues:
+            if not queue or (drop and key in self.limits):
+                continue
+            if header is None or (key is not None and key.startswith(header)):
+                # every package in this queue matches, its head is the oldest
+                if found is None or queue[0][0] < found[0]:
+                    found, found_queue, found_index = queue[0], queue, 0
+                continue
+            if key is not None and not header.startswith(key):
+                continue
+            for index, item in enumerate(queue):
+                if found is not None and item[0] > found[0]:
+                    break
+                if item[1].startswith(header):
+                    found, found_queue, found_index = item, queue, index
+                    break
+
+        if found is None:
+            return None
+
+        if found_index:
+            del found_queue[found_index]
+        else:
+            found_queue.popleft()
+        self.size -= 1
+        if self.limits:
+            self.cond.notify_all()
+
+        return found[1]
+
+    def count(self, header):
+        """
+        number of buffered packages of a registered header
+
+        :param header: bytes, registered package header
+        :return: int
+        """
+
+        queue = self.queues.get(header)
+        return 0 if queue is None else len(queue)
+
+    def register(self, header, limit=0):
+        """
+        keep packages starting with header in a queue of their own, so
+        get(header) takes them without scanning the buffer
+
+        :param header: bytes, package header
+        :param limit: int, 0 for no limit, otherwise full(header) is
+                      True while limit of these packages are buffered,
+                      and they are never dropped on overflow
+        :return: None
+        """
+
+        header = bytes(header)
+        if not header:
+            raise Exception("header must not be empty")
+
+        with self.cond:
+            if limit:
+                self.limits.update({header: limit})
+            else:
+                self.limits.pop(header, None)
+            if header in self.queues:
+                return
+            self.queues.update({header: deque()})
+            self._rebuild()
+
+    def unregister(self, header):
+        """
+        stop indexing packages by header, buffered packages are kept
+
+        :param header: bytes, package header
+        :return: None
+        """
+
+        with self.cond:
+            self.limits.pop(bytes(header), None)
+            queue = self.queues.pop(bytes(header), None)
+            if queue is not None:
+                self.others.extend(queue)
+                self._rebuild()
+
+    def put(self, data):
+        """
+        buffer one package and wake up getters, never waits, receivers
+        check full() to stop reading
+
+        :param data: bytes, package
+        :return: bool, True if the oldest package was dropped to make room
+        """
+
+        with self.cond:
+            dropped = False
+            queue = self._route(data)[1]
+            while self.size >= self.max_size and self._pop(drop=True) is not None:
+                dropped = True
+            queue.append((self.sequence, data))
+            self.sequence += 1
+            self.size += 1
+            self.cond.notify_all()
+
+        return dropped
+
+    def full(self, header):
+        """
+        the queue of a header with limit is full
+
+        :param header: bytes, registered package header
+        :return: bool
+        """
+
+        limit = self.limits.get(header)
+
+        return bool(limit) and len(self.queues[header]) >= limit
+
+    def wait_room(self, header, timeout):
+        """
+        wait till the queue of a header with limit has room
+
+        :param header: bytes, registered package header
+        :param timeout: float, seconds to wait at most
+        :return: bool, True if it has room or inbox is closed
+        """
+
+        with self.cond:
+            return self.cond.wait_for(lambda: self.closed or not self.full(header), timeout)
+
+    def get(self, header=None, timeout=0):
+        """
+        take the oldest package starting with header
+
+        :param header: bytes or None, package header, None for any package
+        :param timeout: float, seconds to wait for it, 0 for not waiting
+        :return: bytes or None, None if timeout or closed
+        """
+
+        if header is not None:
+            header = bytes(header)
+
+        deadline = time.time() + timeout if timeout else 0
+        with self.cond:
+            while True:
+                ret = self._pop(header)
+                if ret is not None or self.closed or not timeout:
+                    return ret
+                left = deadline - time.time()
+                if left <= 0:
+                    return None
+                self.cond.wait(left)
+
+    def clear(self):
+        """
+        drop all buffered packages
+
+        :return: None
+        """
+
+        with self.cond:
+            self.others.clear()
+            for queue in self.queues.values():
+                queue.clear()
+            self.size = 0
+            self.cond.notify_all()
+
+    def close(self):
+        """
+        wake up all getters, get() stops waiting from now on
+
+        :return: None
+        """
+
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def open(self):
+        """
+        let get() wait again after close()
+
+        :return: None
+        """
+
+        with self.cond:
+            self.closed = False
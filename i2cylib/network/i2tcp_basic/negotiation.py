@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Author: i2cy(i2cy@outlook.com)
+# Project: I2cylib
+# Filename: negotiation
+# Created on: 2026/10/17
+
+# Protocol revision negotiation. Right after authentication both sides send
+# an offer b"NEGO" + field_count + fields. Offers contain no "A" or "H" byte,
+# so peers of revision 1 skip them like any other garbage before a package
+# head. A side sends revision 2 packages ("B" type, 8 bytes total length and
+# 4 bytes package length) only after it has received the offer of its peer.
+# Fields: revision, log2 of frame size, preferred payload checksum. Both sides
+# use the stronger one of the two preferred checksums.
+
+import zlib
+from hashlib import md5
+
+LEGACY_REVISION = 1
+REVISION = 2
+
+LEGACY_FRAME_SIZE = 32758
+DEFAULT_FRAME_SIZE = 1048576
+DEFAULT_MAX_MESSAGE = 67108864  # 64 MB, send larger data with send_stream()
+MIN_FRAME_EXP = 15
+MAX_FRAME_EXP = 31
+
+OFFER_MAGIC = b"NEGO"
+REJECT_MAGIC = b"I2TCP_REJECT\a"
+REJECT_LENGTH = 64  # same as the random seed a client waits for
+
+CHECKSUMS = ("none", "adler32", "crc32", "md5")  # from the weakest to the strongest
+DEFAULT_CHECKSUM = "crc32"
+
+
+def md5_sum(data):
+    """
+    payload sum of revision 1, first 2 bytes of md5
+
+    :param data: bytes-like
+    :return: bytes, 2 bytes sum
+    """
+
+    return md5(data).digest()[:2]
+
+
+def crc32_sum(data):
+    """
+    crc32 folded to 2 bytes
+
+    :param data: bytes-like
+    :return: bytes, 2 bytes sum
+    """
+
+    value = zlib.crc32(data)
+    return ((value >> 16 ^ value) & 0xffff).to_bytes(length=2, byteorder='big', signed=False)
+
+
+def adler32_sum(data):
+    """
+    adler32 folded to 2 bytes
+
+    :param data: bytes-like
+    :return: bytes, 2 bytes sum
+    """
+
+    value = zlib.adler32(data)
+    return ((value >> 16 ^ value) & 0xffff).to_bytes(length=2, byteorder='big', signed=False)
+
+
+CHECKSUM_FUNCS = {"none": None,
+                  "adler32": adler32_sum,
+                  "crc32": crc32_sum,
+                  "md5": md5_sum}
+
+
+def frame_exp(frame_size):
+    """
+    round frame size down to a power of 2 within limits
+
+    :param frame_size: int, bytes
+    :return: int, exponent of frame size
+    """
+
+    return min(max(int(frame_size).bit_length() - 1, MIN_FRAME_EXP), MAX_FRAME_EXP)
+
+
+def build_offer(frame_size=DEFAULT_FRAME_SIZE, checksum=DEFAULT_CHECKSUM):
+    """
+    build negotiation offer
+
+    :param frame_size: int, max package length this side accepts
+    :param checksum: str, preferred payload checksum, one of CHECKSUMS
+    :return: bytes, offer
+    """
+
+    if checksum not in CHECKSUMS:
+        raise Exception("unsupported checksum \"{}\", expected one of {}".format(checksum, CHECKSUMS))
+
+    fields = bytes((REVISION, frame_exp(frame_size), CHECKSUMS.index(checksum)))
+
+    return OFFER_MAGIC + bytes((len(fields),)) + fields
+
+
+def parse_offer(fields, frame_size=DEFAULT_FRAME_SIZE, checksum=DEFAULT_CHECKSUM):
+    """
+    parse fields of offer received from peer
+
+    :param fields: bytes, offer fields (without magic and field count)
+    :param frame_size: int, max package length of this side
+    :param checksum: str, preferred payload checksum of this side
+    :return: tuple(int, int, str), revision, package length and payload
+             checksum of revision 2 packages
+    """
+
+    if len(fields) < 2 or fields[0] < REVISION:
+        return LEGACY_REVISION, LEGACY_FRAME_SIZE, "md5"
+
+    exp = min(max(fields[1], MIN_FRAME_EXP), MAX_FRAME_EXP, frame_exp(frame_size))
+
+    if len(fields) > 2:
+        peer_checksum = min(fields[2], len(CHECKSUMS) - 1)
+    else:
+        peer_checksum = CHECKSUMS.index("md5")
+    checksum = CHECKSUMS[max(CHECKSUMS.index(checksum), peer_checksum)]
+
+    return REVISION, 1 << exp, checksum
+
+
+def build_reject(reason):
+    """
+    build reject frame, sent instead of the random seed when server
+    refuses a connection, older clients fail on it as a wrong seed
+
+    :param reason: str, why connection is refused
+    :return: bytes, reject frame of REJECT_LENGTH bytes
+    """
+
+    reason = reason.encode()[:REJECT_LENGTH - len(REJECT_MAGIC)]
+
+    return (REJECT_MAGIC + reason).ljust(REJECT_LENGTH, b"\x00")
+
+
+def parse_reject(data):
+    """
+    check if data received in place of random seed is a reject frame
+
+    :param data: bytes, REJECT_LENGTH bytes
+    :return: str or None, reason of refusal, None if not a reject frame
+    """
+
+    if not data.startswith(REJECT_MAGIC):
+        return None
+
+    return data[len(REJECT_MAGIC):].rstrip(b"\x00").decode(errors="replace")
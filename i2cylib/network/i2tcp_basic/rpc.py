@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Author: i2cy(i2cy@outlook.com)
+# Project: I2cylib
+# Filename: rpc
+# Created on: 2026/10/17
+
+# Requests multiplexed over one connection. A request is one ordinary I2TCP
+# message REQUEST_HEAD + stream id (4 bytes, big endian) + payload, its reply
+# is REPLY_HEAD + the same stream id + payload (ERROR_HEAD if the peer failed
+# it), so replies may come back in any order and work with any protocol
+# revision and in secured sessions.
+
+REQUEST_HEAD = b"I2TCP_RPC\aQ"
+REPLY_HEAD = b"I2TCP_RPC\aR"
+ERROR_HEAD = b"I2TCP_RPC\aE"
+STREAM_ID_MAX = 0xFFFFFFFF
+
+_ID_LENGTH = 4
+
+
+def request_message(stream_id, payload):
+    """
+    build request message
+
+    :param stream_id: int, id of request (0 ~ STREAM_ID_MAX)
+    :param payload: bytes, request data
+    :return: bytes, message to send
+    """
+
+    return REQUEST_HEAD + stream_id.to_bytes(_ID_LENGTH, "big") + payload
+
+
+def reply_message(stream_id, payload, error=False):
+    """
+    build reply message of a request
+
+    :param stream_id: int, id of request replied
+    :param payload: bytes, reply data, or error description if error
+    :param error: bool, the request failed
+    :return: bytes, message to send
+    """
+
+    head = ERROR_HEAD if error else REPLY_HEAD
+
+    return head + stream_id.to_bytes(_ID_LENGTH, "big") + payload
+
+
+def parse_request(message):
+    """
+    parse request message
+
+    :param message: bytes, message starting with REQUEST_HEAD
+    :return: tuple(int, bytes), stream id and request data
+    """
+
+    offset = len(REQUEST_HEAD)
+    if not message.startswith(REQUEST_HEAD) or len(message) < offset + _ID_LENGTH:
+        raise Exception("broken request message")
+
+    return int.from_bytes(message[offset:offset + _ID_LENGTH], "big"), message[offset + _ID_LENGTH:]
+
+
+def parse_reply(message):
+    """
+    parse reply message
+
+    :param message: bytes, message starting with REPLY_HEAD or ERROR_HEAD
+    :return: tuple(int, bytes, bool), stream id, reply data and if the
+             request failed
+    """
+
+    error = message.startswith(ERROR_HEAD)
+    offset = len(REPLY_HEAD)
+    if not (error or message.startswith(REPLY_HEAD)) or len(message) < offset + _ID_LENGTH:
+        raise Exception("broken reply message")
+
+    return int.from_bytes(message[offset:offset + _ID_LENGTH], "big"), message[offset + _ID_LENGTH:], error
@@ -0,0 +1,897 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Author: i2cy(i2cy@outlook.com)
+# Project: I2cylib
+# Filename: selector_server
+# Created on: 2026/10/17
+
+import heapq
+import itertools
+import queue
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import md5, sha256
+from i2cylib.crypto.keygen import DynKey, DynKey16Ring
+from i2cylib.crypto.iccode import Iccode
+from i2cylib.utils.logger import Logger
+from i2cylib.utils.bytes import random_keygen
+from .base_server import VERSION, HEARTBEAT, I2TCPhandler, reject_connection
+from .sender import sendmsg_some
+from .stream import STREAM_HEAD, STREAM_CHUNK_SIZE, STREAM_BUFFER, stream_messages, stream_reader
+from .rpc import REQUEST_HEAD, parse_request
+from .negotiation import DEFAULT_FRAME_SIZE, DEFAULT_MAX_MESSAGE, DEFAULT_CHECKSUM, \
+    build_offer
+
+SEND_BUFFER_MAX = 4194304
+
+_PRE_AUTH = 0
+_BASIC_AUTH = 1
+_FEEDBACK = 2
+_AUTHORIZED = 3
+
+
+class I2TCPselectorServer:
+
+    def __init__(self, key=b"basic", port=27631, max_con=4096, logger=None,
+                 timeout=10, watchdog_timeout=15, buffer_max=256, workers=4,
+                 message_callback=None, frame_size=DEFAULT_FRAME_SIZE,
+                 checksum=DEFAULT_CHECKSUM, max_message=DEFAULT_MAX_MESSAGE):
+        """
+        I2TCP server class served by one selectors (epoll on Linux) loop
+        thread, which accepts, authorizes, watches and decodes all
+        connections, no thread is started per connection
+
+        :param key: bytes, dynamic key for authentication
+        :param port: int, server port that to be bond
+        :param max_con: int, max TCP connection(s) that allowed
+                        to be accept at the same time
+        :param logger: Logger, server log output object
+        :param timeout: int, timeout for authentication
+        :param watchdog_timeout: int, disconnect client after this many
+                                 seconds without any package or heartbeat
+        :param buffer_max: int, package buffer size for every handler
+        :param workers: int, threads of worker pool for message_callback
+        :param message_callback: callable(I2TCPselectorHandler, bytes) or
+                                 None, called in worker pool with every
+                                 message received (in order for each
+                                 connection), connections are not handed
+                                 out by get_connection then
+        :param frame_size: int, max package length offered to clients
+        :param checksum: str, preferred payload checksum ("none", "adler32",
+                         "crc32" or "md5"), the stronger one of both sides is used
+        :param max_message: int, max length of one message accepted, larger
+                            ones are dropped as broken before any memory
+                            is allocated for them
+        """
+
+        self.port = port
+        self.srv = None
+        self.keygen = DynKey(key)
+        self.keygen_preAuth = DynKey16Ring(md5(key).digest(), auto_start=False)
+        self.key = key
+        self.max_con = max_con
+        self.timeout = timeout
+        self.watchdog_timeout = watchdog_timeout
+        self.buffer_max = buffer_max
+        self.workers = workers
+        self.message_callback = message_callback
+        self.frame_size = frame_size
+        self.checksum = checksum
+        self.max_message = max_message
+
+        if not isinstance(logger, Logger):
+            logger = Logger()
+
+        self.logger = logger
+        self.log_header = "[I2TCP]"
+        self.version = VERSION.encode()
+
+        self.threads = {"loop": False}
+        self.connections = set()
+        self.pending = queue.Queue()
+        self.selector = None
+        self.pool = None
+        self.loop_thread = None
+
+        self.__deadlines = []  # heap of (deadline, sequence, handler)
+        self.__sequence = itertools.count()
+        self.__changes = set()  # handlers to be updated by loop
+        self.__changes_lock = threading.Lock()
+        self.__wakeup_recv = None
+        self.__wakeup_send = None
+
+        self.live = False
+
+    def _create_handler(self, con, addr):
+        """
+        create connection handler, overwrite this to use a subclass of
+        I2TCPselectorHandler
+
+        :return: I2TCPselectorHandler
+        """
+
+        return I2TCPselectorHandler(con, addr, self, timeout=self.timeout,
+                                    buffer_max=self.buffer_max,
+                                    watchdog_timeout=self.watchdog_timeout)
+
+    def _wake(self, handler=None):
+        """
+        ask loop thread to update handler (interest, closing)
+
+        :param handler: I2TCPselectorHandler or None
+        :return: None
+        """
+
+        if handler is not None:
+            with self.__changes_lock:
+                self.__changes.add(handler)
+        if threading.current_thread() is self.loop_thread:
+            return
+        try:
+            self.__wakeup_send.send(b"\x00")
+        except (BlockingIOError, OSError, AttributeError):
+            pass
+
+    def _schedule(self, handler, at=None):
+        """
+        put deadline of handler into heap, one live entry per handler, the
+        entry is moved when it expires while handler has been fed, an
+        entry pushed before the live one is skipped
+
+        :param handler: I2TCPselectorHandler
+        :param at: float or None, time to check handler, None for its deadline
+        :return: None
+        """
+
+        handler.entry = next(self.__sequence)
+        heapq.heappush(self.__deadlines, (handler.deadline if at is None else at, handler.entry, handler))
+
+    def _check_deadlines(self):
+        """
+        kill connections whose deadline passed, and heartbeat paused ones
+        till they have been paused for watchdog timeout
+
+        :return: float, seconds till the next deadline
+        """
+
+        now = time.time()
+        while self.__deadlines and self.__deadlines[0][0] <= now:
+            deadline, entry, handler = heapq.heappop(self.__deadlines)
+            if not handler.live or entry != handler.entry:
+                continue
+            if handler.paused:
+                if now - handler.paused_at < self.watchdog_timeout:
+                    self._heartbeat(handler)  # not reading by our choice, tell client we are alive
+                    continue
+                self.logger.ERROR("{} [watchdog] messages not consumed for {} seconds, disconnecting...".format(
+                    handler.log_header, int(now - handler.paused_at)))
+            elif handler.deadline > now:
+                self._schedule(handler)
+                continue
+            elif handler.authorized:
+                self.logger.ERROR("{} [watchdog] client seems not responding, disconnecting...".format(
+                    handler.log_header))
+            else:
+                self.logger.WARNING("{} authentication process failure, timeout".format(handler.log_header))
+            handler.kill()
+
+        if self.__deadlines:
+            return max(self.__deadlines[0][0] - now, 0)
+        return None
+
+    def _heartbeat(self, handler):
+        """
+        send heartbeat to client of a paused handler and feed its watchdog,
+        the handler is checked again after half of watchdog timeout
+
+        :param handler: I2TCPselectorHandler
+        :return: None
+        """
+
+        handler._write(HEARTBEAT)
+        handler._feed_watchdog()
+        self._schedule(handler, time.time() + self.watchdog_timeout / 2)
+
+    def _accept(self):
+        """
+        accept all incoming connections
+
+        :return: None
+        """
+
+        while True:
+            try:
+                con, addr = self.srv.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as err:
+                if self.live:
+                    self.logger.ERROR("{} [loop] failed to accept connection, {}".format(self.log_header, err))
+                return
+
+            if len(self.connections) >= self.max_con:
+                self.logger.WARNING("{} connection {}:{} refused, max connection(s) reached".format(
+                    self.log_header, addr[0], addr[1]))
+                reject_connection(con, "max connection(s) reached")
+                continue
+
+            self.logger.INFO("{} new connection {}:{} coming in".format(self.log_header, addr[0], addr[1]))
+            con.setblocking(False)
+            handler = self._create_handler(con, addr)
+            self.connections.add(handler)
+            self.selector.register(con, selectors.EVENT_READ, handler)
+            handler.events = selectors.EVENT_READ
+            self._schedule(handler)
+
+    def _update(self, handler):
+        """
+        apply interest of handler to selector, or close it
+
+        :param handler: I2TCPselectorHandler
+        :return: None
+        """
+
+        if not handler.live:
+            if handler.events:
+                try:
+                    self.selector.unregister(handler.srv)
+                except (KeyError, ValueError):
+                    pass
+                handler.events = 0
+            try:
+                handler.srv.close()
+            except Exception:
+                pass
+            self.connections.discard(handler)
+            return
+
+        events = 0
+        paused = handler.paused
+        handler.paused = handler._should_pause()
+        if paused and not handler.paused and handler.decoder.end > handler.decoder.start:
+            handler._on_readable()  # selector never reports bytes already read into decoder
+            if not handler.live:
+                self._update(handler)
+                return
+            handler.paused = handler._should_pause()
+        if handler.paused and not paused:
+            handler.paused_at = time.time()
+            self._heartbeat(handler)
+        if not handler.paused:
+            events |= selectors.EVENT_READ
+        if handler.out_buffers:
+            events |= selectors.EVENT_WRITE
+
+        if events == handler.events:
+            return
+        if not events:
+            self.selector.unregister(handler.srv)
+        elif not handler.events:
+            self.selector.register(handler.srv, events, handler)
+        else:
+            self.selector.modify(handler.srv, events, handler)
+        handler.events = events
+
+    def _loop_thread(self):
+        """
+        server loop, accepts connections, reads and writes sockets ready,
+        and kills connections timed out
+
+        :return: None
+        """
+
+        self.threads.update({"loop": True})
+        local_header = "[loop]"
+        self.logger.DEBUG("{} {} thread started".format(self.log_header, local_header))
+
+        try:
+            while self.live:
+                events = self.selector.select(self._check_deadlines())
+                for key, mask in events:
+                    if key.data is None:
+                        self._accept()
+                    elif key.data is self:
+                        try:
+                            while self.__wakeup_recv.recv(4096):
+                                pass
+                        except (BlockingIOError, InterruptedError):
+                            pass
+                    else:
+                        handler = key.data
+                        if mask & selectors.EVENT_WRITE:
+                            handler._on_writable()
+                        if mask & selectors.EVENT_READ and handler.live:
+                            handler._on_readable()
+
+                with self.__changes_lock:
+                    changes = self.__changes
+                    self.__changes = set()
+                for handler in changes:
+                    self._update(handler)
+
+        except Exception as err:
+            if self.live:
+                self.logger.ERROR("{} {} loop error, {}".format(self.log_header, local_header, err))
+
+        for handler in list(self.connections):
+            handler.live = False
+            handler.package_buffer.close()
+            self._update(handler)
+        self.__deadlines = []
+
+        self.logger.DEBUG("{} {} thread stopped".format(self.log_header, local_header))
+        self.threads.update({"loop": False})
+
+    def _authorized(self, handler):
+        """
+        called by loop thread when handler is authorized
+
+        :param handler: I2TCPselectorHandler
+        :return: None
+        """
+
+        if self.message_callback is None:
+            self.pending.put(handler)
+
+    def _dispatch(self, handler):
+        """
+        worker task, calls message_callback with messages of handler in
+        order till none is left
+
+        :param handler: I2TCPselectorHandler
+        :return: None
+        """
+
+        while True:
+            with handler.inbound_lock:
+                if not handler.inbound:
+                    handler.dispatching = False
+                    break
+                data = handler.inbound.popleft()
+            if handler.paused:
+                self._wake(handler)
+            try:
+                self.message_callback(handler, data)
+            except Exception as err:
+                self.logger.ERROR("{} [worker] message callback error, {}".format(handler.log_header, err))
+
+    def start(self, port=None):
+        """
+        start I2TCP server
+
+        :param port: int (default self.port), port to be bond
+        :return: None
+        """
+
+        if port is None:
+            port = self.port
+        else:
+            self.port = port
+
+        try:
+            srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            srv.bind(("0.0.0.0", port))
+            srv.listen(min(self.max_con, 4096))
+            srv.setblocking(False)
+            self.srv = srv
+
+            self.__wakeup_recv, self.__wakeup_send = socket.socketpair()
+            self.__wakeup_recv.setblocking(False)
+            self.__wakeup_send.setblocking(False)
+
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(srv, selectors.EVENT_READ, None)
+            self.selector.register(self.__wakeup_recv, selectors.EVENT_READ, self)
+            self.pool = ThreadPoolExecutor(max_workers=self.workers)
+
+            self.live = True
+            self.keygen_preAuth.start()
+
+            self.loop_thread = threading.Thread(target=self._loop_thread)
+            self.loop_thread.start()
+
+            self.logger.INFO("{} server started at 0.0.0.0:{}".format(self.log_header, self.port))
+
+        except Exception as err:
+            self.logger.ERROR("{} failed to start server, {}".format(self.log_header, err))
+
+    def kill(self):
+        """
+        stop the server and kill all connection(s)
+
+        :return: None
+        """
+
+        self.live = False
+        self.keygen_preAuth.stop()
+        self._wake()
+        if self.loop_thread is not None and self.loop_thread is not threading.current_thread():
+            self.loop_thread.join()
+        self.loop_thread = None
+
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+        for sock in (self.srv, self.__wakeup_recv, self.__wakeup_send):
+            if sock is not None:
+                sock.close()
+        if self.selector is not None:
+            self.selector.close()
+        self.srv = None
+        self.selector = None
+        self.__wakeup_recv = None
+        self.__wakeup_send = None
+
+        self.logger.INFO("{} server killed".format(self.log_header))
+
+    def get_connection(self, wait=False):
+        """
+        get the latest connected connection that yet to be
+        handled
+
+        :param wait: bool, wait until a connection comes in
+        :return: I2TCPselectorHandler, connection handler
+        """
+
+        while self.live:
+            try:
+                handler = self.pending.get(timeout=0.5) if wait else self.pending.get_nowait()
+            except queue.Empty:
+                if wait:
+                    continue
+                return None
+            if handler.live:
+                return handler
+
+        return None
+
+
+class I2TCPselectorHandler(I2TCPhandler):
+
+    def __init__(self, srv, addr, parent, timeout=10,
+                 buffer_max=256, watchdog_timeout=15,
+                 send_buffer_max=SEND_BUFFER_MAX):
+        """
+        I2TCP connection handler of I2TCPselectorServer, driven by the loop
+        thread of server instead of its own threads
+
+        :param srv: socket.socket, non-blocking socket of connection
+        :param addr: tuple, incoming connection address
+        :param parent: I2TCPselectorServer, father object
+        :param timeout (default: 10): int, timeout for authentication
+        :param buffer_max (default: 256): int, max packages in buffer
+        :param watchdog_timeout (default 15): int, seconds without
+                                              any package before disconnecting
+        :param send_buffer_max (default: 4 MB): int, send() blocks while
+                                                this many bytes are unsent
+        """
+
+        self.send_buffer_max = send_buffer_max
+
+        super(I2TCPselectorHandler, self).__init__(srv, addr, parent, timeout=timeout,
+                                                   buffer_max=buffer_max,
+                                                   watchdog_timeout=watchdog_timeout)
+
+    def _open(self):
+        """
+        prepare state driven by loop thread of server, authentication
+        goes on in _on_readable()
+
+        :return: None
+        """
+
+        assert isinstance(self.parent, I2TCPselectorServer)
+
+        self.deadline = time.time() + self.timeout
+        self.entry = None  # sequence of the live entry in deadline heap of server
+
+        self.events = 0  # interest registered in selector, only used by loop
+        self.paused = False
+        self.paused_at = 0
+        self.out_buffers = deque()
+        self.out_size = 0
+        self.inbound = deque()  # messages waiting for message_callback
+        self.inbound_lock = threading.Lock()
+        self.dispatching = False
+
+        self.__cond = threading.Condition()
+        self.__state = _PRE_AUTH
+        self.__auth_data = b""
+        self.__mix_coder = None
+
+    @property
+    def authorized(self):
+        return self.__state == _AUTHORIZED
+
+    def _feed_watchdog(self):
+        """
+        move deadline of watchdog, O(1), the deadline heap of server
+        catches up when the old deadline expires
+
+        :return: None
+        """
+
+        self.deadline = time.time() + self.watchdog_timeout
+
+    def _should_pause(self):
+        """
+        stop reading from client while messages are not consumed
+
+        :return: bool
+        """
+
+        if self.parent.message_callback is not None:
+            return len(self.inbound) >= self.buffer_max
+        return self.package_buffer.full(STREAM_HEAD)
+
+    def _write(self, data):
+        """
+        queue raw bytes of authentication or heartbeat
+
+        :param data: bytes
+        :return: None
+        """
+
+        with self.__cond:
+            self.out_buffers.append(memoryview(data))
+            self.out_size += len(data)
+            self._flush_out()
+
+    def _flush_out(self):
+        """
+        write queued buffers as far as socket accepts, asks loop thread to
+        watch writable event if some are left (call with lock held)
+
+        :return: None
+        """
+
+        try:
+            self.out_size -= sendmsg_some(self.srv, self.out_buffers)
+        except OSError as err:
+            if self.live:
+                self.logger.ERROR("{} failed to send data, {}".format(self.log_header, err))
+            self.out_buffers.clear()
+            self.out_size = 0
+            self.__cond.notify_all()
+            self.kill()
+            return
+
+        self.__cond.notify_all()
+        if self.out_buffers:
+            self.parent._wake(self)
+
+    def _on_writable(self):
+        with self.__cond:
+            self._flush_out()
+            if not self.out_buffers:
+                self._feed_watchdog()
+                self.parent._wake(self)
+
+    def _auth_step(self):
+        """
+        authentication sequence for incoming connection, one step for
+        each time client sends something (loop thread only)
+
+        :return: None
+        """
+
+        need = {_PRE_AUTH: 16, _BASIC_AUTH: 64, _FEEDBACK: 2}[self.__state]
+        try:
+            dat = self.srv.recv(need - len(self.__auth_data))
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            dat = b""
+        if dat == b"":
+            self.logger.DEBUG("{} connection lost".format(self.log_header))
+            self.kill()
+            return
+        self.__auth_data += dat
+        if len(self.__auth_data) < need:
+            return
+        data = self.__auth_data
+        self.__auth_data = b""
+
+        try:
+            if self.__state == _PRE_AUTH:
+                if not self.keygen_preAuth.keymatch(data):
+                    raise Exception("pre-auth failed, pre-auth key received: {}".format(data))
+                self.logger.DEBUG("{} pre-authorized".format(self.log_header))
+
+                rand_num = random_keygen(64)
+                self._write(rand_num)
+                self.logger.DEBUG("{} random seed sent, {}".format(self.log_header, rand_num))
+
+                key_sha256 = sha256()
+                key_sha256.update(self.parent.key)
+                mix_sha256 = sha256()
+                mix_sha256.update(key_sha256.digest() + rand_num)
+                self.__mix_coder = Iccode(mix_sha256.digest(), fingerprint_level=6)
+                self.__state = _BASIC_AUTH
+
+            elif self.__state == _BASIC_AUTH:
+                self.logger.DEBUG("{} dynamic key received".format(self.log_header))
+                dynamic_key = self.__mix_coder.decode(data)
+                if not self.keygen.keymatch(dynamic_key):
+                    raise Exception("unauthorized connection, key received: {}".format(dynamic_key))
+                self._write(self.version)
+                self.logger.DEBUG("{} authorized".format(self.log_header))
+                self.__state = _FEEDBACK
+
+            else:
+                if data != b"OK":
+                    raise Exception("invalid feedback, {}".format(data))
+                self._write(build_offer(self.frame_size, self.checksum))
+                self.__state = _AUTHORIZED
+                self.__mix_coder = None
+                self._feed_watchdog()
+                if self._post_auth():
+                    self.parent._authorized(self)
+                else:
+                    self.kill()
+
+        except Exception as err:
+            self.logger.WARNING("{} authentication process failure, {}".format(self.log_header, err))
+            self.kill()
+
+    def _post_auth(self):
+        """
+        hook after authentication (loop thread), overwrite this to prepare
+        connection before it is handed out
+
+        :return: bool, session status
+        """
+
+        return True
+
+    def _on_readable(self):
+        """
+        read everything client has sent, decode messages and deliver them
+        (loop thread only)
+
+        :return: None
+        """
+
+        if self.__state != _AUTHORIZED:
+            self._auth_step()
+            return
+
+        local_header = "[receiver]"
+        while self.live and not self.paused:
+            try:
+                pak = self.decoder.recv()
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as err:
+                self.logger.INFO("{} {} connection lost, {}".format(self.log_header, local_header, err))
+                self.kill()
+                break
+            except Exception as err:
+                self.logger.ERROR("{} {} failed to receive data from client, {}".format(self.log_header,
+                                                                                        local_header, err))
+                continue
+
+            if pak is None:
+                self.logger.INFO("{} {} connection lost".format(self.log_header, local_header))
+                self.kill()
+                break
+
+            self._deliver(pak)
+            if self._should_pause():
+                self.parent._wake(self)
+                break
+
+    def _deliver(self, data):
+        """
+        hand message to worker pool or package buffer (loop thread only)
+
+        :param data: bytes, message
+        :return: None
+        """
+
+        if self.parent.message_callback is None:
+            if self._refuse_request(data):
+                return
+            if self.package_buffer.put(data):
+                self.logger.ERROR("{} [receiver] package buffer overflowed, the oldest package dropped".format(
+                    self.log_header))
+            return
+
+        with self.inbound_lock:
+            self.inbound.append(data)
+            if self.dispatching:
+                return
+            self.dispatching = True
+        self.parent.pool.submit(self.parent._dispatch, self)
+
+    def _get_stream(self, header, timeout=0):
+        data = self.package_buffer.get(header, timeout=timeout)
+        if self.paused:
+            self.parent._wake(self)
+        return data
+
+    def get_request(self, timeout=0):
+        """
+        take the oldest request sent by request() of client, answer it
+        with reply()
+
+        :param timeout: float (default: 0), seconds to wait for it
+        :return: tuple(int, bytes) or None, stream id and request data,
+                 None if timeout
+        """
+
+        message = self._get_stream(REQUEST_HEAD, timeout=timeout)
+        if message is None:
+            return None
+
+        return parse_request(message)
+
+    def flush(self, timeout=None):
+        """
+        wait until all queued data has been sent
+
+        :param timeout: float or None, None for waiting forever
+        :return: bool, True if nothing is left to send
+        """
+
+        with self.__cond:
+            return self.__cond.wait_for(lambda: not self.out_buffers or not self.live, timeout)
+
+    def kill(self):
+        """
+        kill this connection, data queued before is sent first when
+        called out of the loop thread
+
+        :return: None
+        """
+
+        if self.live and threading.current_thread() is not self.parent.loop_thread:
+            self.flush(timeout=2)
+        self.live = False
+        with self.__cond:
+            self.__cond.notify_all()
+        self.package_buffer.close()
+        self.parent._wake(self)
+
+    def send(self, data, copy=False):
+        """
+        send data with I2TCP format to client, blocks while too much data
+        is waiting to be sent. bytearray and memoryview are buffered as
+        read-only views without copy, do not change them till flush()
+        returns, or send with copy=True
+
+        :param data: bytes-like, regular data
+        :param copy: bool, buffer a copy of data that is not bytes
+        :return: int, total package length (include header) buffered,
+                 part of it may be sent later by loop thread, call flush()
+                 to wait for it, 0 if connection closed
+        """
+
+        if not isinstance(data, bytes):
+            data = bytes(data) if copy else memoryview(data).cast("B").toreadonly()
+
+        with self.__cond:
+            if threading.current_thread() is not self.parent.loop_thread:
+                while self.out_size >= self.send_buffer_max and self.live:
+                    self.__cond.wait(0.5)
+            if not self.live:
+                return 0
+            sent = 0
+            for pak in self._package_heads(data):
+                for buf in pak:
+                    self.out_buffers.append(memoryview(buf))
+                    sent += len(buf)
+            self.out_size += sent
+            self._flush_out()
+
+        return sent
+
+    def send_stream(self, chunks, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        send data of any size as a stream with constant memory
+
+        :param chunks: iterable of bytes-like, stream data
+        :param chunk_size: int, max payload length of one message
+        :return: int, total package length (include headers)
+        """
+
+        sent = 0
+        for message in stream_messages(chunks, chunk_size):
+            length = self.send(message)
+            if not length:
+                raise Exception("connection lost while sending stream")
+            sent += length
+
+        return sent
+
+    def recv_stream(self, timeout=10):
+        """
+        receive a stream sent by send_stream() of client, payloads are
+        yielded as they arrive
+
+        :param timeout: float (default: 10), seconds to wait for each chunk
+        :return: generator of bytes, stream data
+        """
+
+        return stream_reader(self._get_stream, timeout=timeout)
+
+
+def test_resume(port=27632):
+    """
+    regression of pausing with a small buffer_max, messages already read
+    into decoder must be delivered when handler resumes
+
+    :param port: int, local port to test on
+    :return: bool, test result
+    """
+
+    from .base_client import I2TCPclient
+
+    def echo(con, data):
+        time.sleep(0.05)  # slow consumer keeps handler pausing
+        con.send(data)
+
+    logger = Logger(level="ERROR")
+    srv = I2TCPselectorServer(port=port, logger=logger, buffer_max=2, message_callback=echo)
+    srv.start()
+    clt = I2TCPclient("127.0.0.1", port=port, logger=logger)
+    try:
+        if not clt.connect():
+            return False
+        clt.clt.settimeout(5)
+        sent = [b"echo %d" % i for i in range(20)]
+        for data in sent:  # pipelined, most of them arrive in one read
+            clt.send(data)
+        received = [clt.recv() for i in range(len(sent))]
+        res = received == sent
+        print("## -test- ## resume with buffer_max=2 test result: {}".format(res))
+        return res
+    finally:
+        clt.reset()
+        srv.kill()
+
+
+def test_stall(port=27634):
+    """
+    regression of a stream nobody consumes, the paused handler must be
+    killed soon after watchdog timeout whether the client stays or goes
+
+    :param port: int, local port to test on
+    :return: bool, test result
+    """
+
+    from .base_client import I2TCPclient
+
+    logger = Logger(level="ERROR")
+    srv = I2TCPselectorServer(port=port, logger=logger, watchdog_timeout=2)
+    srv.start()
+    res = True
+    try:
+        for drop in (False, True):
+            clt = I2TCPclient("127.0.0.1", port=port, logger=logger)
+            if not clt.connect():
+                return False
+            con = srv.get_connection(wait=True)
+            clt.send_stream([b"stalled!" * 128] * (4 * STREAM_BUFFER), chunk_size=1024)
+            if drop:
+                clt.reset()
+            ts = time.time()
+            while con.live and time.time() - ts < 10:
+                time.sleep(0.2)
+            ok = not con.live
+            print("## -test- ## unconsumed stream with client {} test result: {}".format(
+                "dropped" if drop else "kept", ok))
+            res = res and ok
+            clt.reset()
+        return res
+    finally:
+        srv.kill()
+
+
+if __name__ == '__main__':
+    test_resume()
+    test_stall()
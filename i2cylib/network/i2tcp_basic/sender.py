@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Author: i2cy(i2cy@outlook.com)
+# Project: I2cylib
+# Filename: sender
+# Created on: 2026/10/17
+
+from itertools import islice
+
+IOV_BATCH = 512
+
+
+def sendmsg_all(sock, buffers):
+    """
+    send all buffers with scatter-gather socket.sendmsg, buffers are
+    never joined (falls back to sendall per buffer where sendmsg is
+    not available)
+
+    :param sock: socket.socket, connected socket
+    :param buffers: List(bytes-like), headers and payload views
+    :return: int, total bytes sent
+    """
+
+    buffers = [memoryview(buf) for buf in buffers if len(buf)]
+    total = sum(len(buf) for buf in buffers)
+
+    if not hasattr(sock, "sendmsg"):
+        for buf in buffers:
+            sock.sendall(buf)
+        return total
+
+    index = 0
+    while index < len(buffers):
+        sent = sock.sendmsg(buffers[index:index + IOV_BATCH])
+        while sent:
+            length = len(buffers[index])
+            if sent >= length:
+                sent -= length
+                index += 1
+            else:
+                buffers[index] = buffers[index][sent:]
+                sent = 0
+
+    return total
+
+
+def sendmsg_some(sock, buffers):
+    """
+    send as many buffers as a non-blocking socket accepts now, sent
+    buffers are removed from the deque, a partly sent one is replaced
+    by the rest of it
+
+    :param sock: socket.socket, non-blocking connected socket
+    :param buffers: deque(memoryview), buffers waiting to be sent
+    :return: int, bytes sent
+    """
+
+    total = 0
+    while buffers:
+        try:
+            sent = sock.sendmsg(list(islice(buffers, IOV_BATCH)))
+        except (BlockingIOError, InterruptedError):
+            break
+        total += sent
+        while sent:
+            length = len(buffers[0])
+            if sent >= length:
+                sent -= length
+                buffers.popleft()
+            else:
+                buffers[0] = buffers[0][sent:]
+                sent = 0
+
+    return total
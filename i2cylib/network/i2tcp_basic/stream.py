@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Author: i2cy(i2cy@outlook.com)
+# Project: I2cylib
+# Filename: stream
+# Created on: 2026/10/17
+
+# Streams move data of any size with constant memory. Every chunk is sent as
+# one ordinary I2TCP message STREAM_HEAD + b"D" + payload, the stream ends
+# with STREAM_HEAD + b"E" (or STREAM_HEAD + b"X" if the sender failed), so
+# streams work with any protocol revision and in secured sessions. Only one
+# stream at a time per direction of a connection.
+
+STREAM_HEAD = b"I2TCP_STREAM\a"
+STREAM_CHUNK_SIZE = 1048576
+STREAM_BUFFER = 16
+
+_DATA = STREAM_HEAD + b"D"
+_END = STREAM_HEAD + b"E"
+_ABORT = STREAM_HEAD + b"X"
+
+
+def stream_messages(chunks, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    turn chunks into stream messages, chunks larger than chunk_size are
+    split, the end message is yielded last
+
+    :param chunks: iterable of bytes-like, stream data
+    :param chunk_size: int, max payload length of one message
+    :return: generator of bytes, messages to send one by one
+    """
+
+    try:
+        for chunk in chunks:
+            chunk = memoryview(chunk).cast("B")
+            for offset in range(0, len(chunk), chunk_size):
+                yield _DATA + chunk[offset:offset + chunk_size]
+    except Exception:
+        yield _ABORT
+        raise
+
+    yield _END
+
+
+def stream_payload(message):
+    """
+    parse one stream message
+
+    :param message: bytes, message starting with STREAM_HEAD
+    :return: bytes or None, payload, None at the end of stream
+    """
+
+    if message.startswith(_DATA):
+        return message[len(_DATA):]
+    if message.startswith(_END):
+        return None
+    if message.startswith(_ABORT):
+        raise Exception("stream aborted by peer")
+
+    raise Exception("broken stream message")
+
+
+def stream_reader(get, timeout=10):
+    """
+    yield payloads of the stream received in package buffer
+
+    :param get: callable(header, timeout), get() of package buffer
+    :param timeout: float, seconds to wait for each message
+    :return: generator of bytes, stream data
+    """
+
+    while True:
+        message = get(STREAM_HEAD, timeout=timeout)
+        if message is None:
+            raise Exception("stream timeout, no data received in {}s".format(timeout))
+        payload = stream_payload(message)
+        if payload is None:
+            return
+        yield payload
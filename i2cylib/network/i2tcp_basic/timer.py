@@ -0,0 +1,262 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Author: i2cy(i2cy@outlook.com)
+# Project: I2cylib
+# Filename: timer
+# Created on: 2026/10/17
+
+# Hierarchical timer wheel shared by all I2TCP connections of a process. One
+# thread advances the wheel, timers of level 0 expire in their slot, timers of
+# higher levels cascade down when the level below wraps around. Callbacks run
+# in the wheel thread and must not block, hand long work to a thread.
+
+import math
+import threading
+import time
+
+WHEEL_TICK = 0.1
+WHEEL_SLOTS = 64
+WHEEL_LEVELS = 4
+
+
+class WheelTimer:
+
+    def __init__(self, expire, callback, args):
+        """
+        timer scheduled on TimerWheel, created by TimerWheel.schedule()
+
+        :param expire: int, tick to expire at
+        :param callback: callable
+        :param args: tuple, arguments of callback
+        """
+
+        self.expire = expire
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        cancel this timer, O(1), it is dropped when its slot is reached
+
+        :return: None
+        """
+
+        self.cancelled = True
+
+
+class TimerWheel:
+
+    def __init__(self, tick=WHEEL_TICK, slots=WHEEL_SLOTS, levels=WHEEL_LEVELS):
+        """
+        hierarchical timer wheel, timers longer than the whole wheel wait in
+        the last slot of the top level and cascade again
+
+        :param tick: float, seconds of one tick (timer resolution)
+        :param slots: int, slots of each level
+        :param levels: int, number of levels
+        """
+
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+        self.current = 0
+        self.count = 0
+        self.started = time.time()
+        self.cond = threading.Condition()
+        self.thread = None
+        self.live = False
+
+    def _place(self, timer):
+        """
+        put timer into the slot it belongs to (call with lock held)
+
+        :param timer: WheelTimer
+        :return: None
+        """
+
+        delta = max(timer.expire - self.current, 1)
+        for level in range(self.levels):
+            if delta < self.slots ** (level + 1):
+                slot = (timer.expire // self.slots ** level) % self.slots
+                self.wheels[level][slot].append(timer)
+                return
+
+        # beyond the wheel, park in the slot cascading last
+        level = self.levels - 1
+        slot = (self.current // self.slots ** level - 1) % self.slots
+        self.wheels[level][slot].append(timer)
+
+    def _advance(self):
+        """
+        move the wheel one tick forward (call with lock held)
+
+        :return: List(WheelTimer), timers expired
+        """
+
+        self.current += 1
+        for level in range(self.levels - 1, 0, -1):
+            span = self.slots ** level
+            if self.current % span:
+                continue
+            slot = (self.current // span) % self.slots
+            timers = self.wheels[level][slot]
+            self.wheels[level][slot] = []
+            for timer in timers:
+                if timer.cancelled:
+                    self.count -= 1
+                else:
+                    self._place(timer)
+
+        slot = self.current % self.slots
+        timers = self.wheels[0][slot]
+        self.wheels[0][slot] = []
+        expired = []
+        for timer in timers:
+            if timer.cancelled:
+                self.count -= 1
+            elif timer.expire <= self.current:
+                self.count -= 1
+                expired.append(timer)
+            else:
+                self._place(timer)
+
+        return expired
+
+    def _run(self):
+        """
+        wheel thread, sleeps while no timer is scheduled
+
+        :return: None
+        """
+
+        while True:
+            with self.cond:
+                while not self.count:
+                    self.cond.wait()
+                    self.started = time.time() - self.current * self.tick
+                left = self.started + (self.current + 1) * self.tick - time.time()
+                if left > 0:
+                    self.cond.wait(left)
+                    continue
+                expired = self._advance()
+
+            for timer in expired:
+                if timer.cancelled:
+                    continue
+                try:
+                    timer.callback(*timer.args)
+                except Exception:
+                    pass
+
+    def schedule(self, delay, callback, *args):
+        """
+        call callback(*args) after delay seconds
+
+        :param delay: float, seconds
+        :param callback: callable
+        :return: WheelTimer
+        """
+
+        with self.cond:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="I2TCP-timer", daemon=True)
+                self.thread.start()
+            if not self.count:
+                self.started = time.time() - self.current * self.tick
+            ticks = max(int(math.ceil(delay / self.tick)), 1)
+            timer = WheelTimer(self.current + ticks, callback, args)
+            self._place(timer)
+            self.count += 1
+            self.cond.notify()
+
+        return timer
+
+
+_wheel = None
+_wheel_lock = threading.Lock()
+
+
+def timer_wheel():
+    """
+    timer wheel shared by the whole process
+
+    :return: TimerWheel
+    """
+
+    global _wheel
+
+    with _wheel_lock:
+        if _wheel is None:
+            _wheel = TimerWheel()
+
+    return _wheel
+
+
+class Deadline:
+
+    def __init__(self, timeout, callback, wheel=None):
+        """
+        deadline on the timer wheel, feed() only records the time, the
+        timer is moved when it fires early, so feeding costs O(1)
+
+        :param timeout: float, seconds without feeding before callback
+        :param callback: callable, called once in wheel thread on expiry,
+                         call start() again to re-arm
+        :param wheel: TimerWheel or None, None for the shared one
+        """
+
+        self.timeout = timeout
+        self.callback = callback
+        self.wheel = timer_wheel() if wheel is None else wheel
+        self.last = time.time()
+        self.timer = None
+        self.active = False
+
+    @property
+    def idle(self):
+        """
+        seconds since last feed
+
+        :return: float
+        """
+
+        return time.time() - self.last
+
+    def feed(self):
+        self.last = time.time()
+
+    def _check(self):
+        if not self.active:
+            return
+        left = self.last + self.timeout - time.time()
+        if left > 0:
+            self.timer = self.wheel.schedule(left, self._check)
+            return
+        self.active = False
+        self.callback()
+
+    def start(self):
+        """
+        feed and arm the deadline
+
+        :return: None
+        """
+
+        self.cancel()
+        self.last = time.time()
+        self.active = True
+        self.timer = self.wheel.schedule(self.timeout, self._check)
+
+    def cancel(self):
+        """
+        disarm the deadline
+
+        :return: None
+        """
+
+        self.active = False
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None